@@ -0,0 +1,299 @@
+# Importa os módulos usados pelo controle de admissão: 'asyncio' para
+# fazer as requisições aguardarem uma vaga, 'json' para o corpo das
+# respostas de recusa, 'math' para arredondar o 'Retry-After', 'time'
+# para reabastecer os baldes de fichas, 'deque' para as filas de espera
+# e 'OrderedDict' para descartar os baldes dos clientes inativos.
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict, defaultdict, deque
+
+# Prioridades das requisições. As interativas (ex: a interface gráfica
+# calculando uma operação) são atendidas antes das de lote (ex: lotes
+# grandes e fluxos), que também não podem ocupar todas as vagas.
+PRIORIDADE_INTERATIVA = "interativa"
+PRIORIDADE_LOTE = "lote"
+
+# Início dos caminhos das rotas tratadas como de lote quando o cliente
+# não informa a prioridade no cabeçalho 'X-Prioridade'.
+PREFIXOS_LOTE = ("/lote", "/fluxo", "/conjuntos", "/trabalhos")
+
+# Rotas que nunca são limitadas, para que o monitoramento e a
+# verificação de prontidão continuem funcionando justamente quando o
+# servidor está sobrecarregado.
+ROTAS_ISENTAS = frozenset({"/metrics", "/pronto"})
+
+# Final dos caminhos das rotas isentas que apenas acompanham o andamento
+# de um trabalho (ex: '/trabalhos/<id>/eventos'). Elas ficam abertas
+# enquanto o trabalho executa e ocupariam uma vaga durante todo esse tempo.
+SUFIXOS_ISENTOS = ("/eventos",)
+
+# Valores padrão da fila de espera: quantas requisições podem aguardar
+# uma vaga e por quanto tempo, em segundos, antes de serem recusadas.
+MAX_FILA = 100
+ESPERA_MAXIMA_FILA = 1.0
+
+# Fração das vagas reservada às requisições interativas.
+FRACAO_RESERVA_INTERATIVA = 0.25
+
+# Número máximo de clientes com balde de fichas guardado. Os baldes
+# dos clientes inativos há mais tempo são descartados primeiro.
+MAX_CLIENTES = 10_000
+
+
+# Define a classe 'BaldeFichas', que limita a taxa de requisições de um
+# cliente. O balde começa cheio com 'rajada' fichas e é reabastecido
+# continuamente com 'taxa' fichas por segundo; cada requisição gasta
+# uma ficha e, sem fichas, a requisição é recusada.
+class BaldeFichas:
+
+    def __init__(self, taxa, rajada, agora):
+
+        self.taxa = taxa
+        self.rajada = rajada
+        self.fichas = rajada
+        self.atualizado = agora
+
+    # Tenta gastar uma ficha. Retorna 0 se conseguiu, ou quantos
+    # segundos faltam para que uma nova ficha esteja disponível.
+    def consumir(self, agora):
+
+        self.fichas = min(self.rajada, self.fichas + (agora - self.atualizado) * self.taxa)
+        self.atualizado = agora
+
+        if self.fichas >= 1:
+            self.fichas -= 1
+            return 0
+
+        return (1 - self.fichas) / self.taxa
+
+
+# Define a classe 'ControleAdmissao', que decide quais requisições são
+# atendidas quando o servidor está sobrecarregado.
+# Até 'max_em_andamento' requisições são atendidas ao mesmo tempo; as
+# demais aguardam em uma fila por prioridade, limitada a 'max_fila'
+# requisições e a 'espera_maxima' segundos, e são recusadas com 503
+# quando a fila está cheia ou a espera se esgota. Recusar cedo mantém
+# a latência das requisições aceitas sob controle, em vez de todas
+# esperarem até estourar o tempo limite.
+# 'max_em_andamento' igual a 0 desativa o limite de vagas, e 'taxa_por_cliente'
+# (requisições por segundo) ativa o limite de taxa por cliente.
+# Assim como as métricas, todo o estado é alterado apenas pelo laço de
+# eventos do servidor, em uma única thread, por isso não há travas.
+class ControleAdmissao:
+
+    def __init__(self, max_em_andamento=0, max_fila=MAX_FILA, espera_maxima=ESPERA_MAXIMA_FILA,
+                 reserva_interativa=None, taxa_por_cliente=0, rajada_por_cliente=None):
+
+        self.max_em_andamento = max_em_andamento
+        self.max_fila = max_fila
+        self.espera_maxima = espera_maxima
+
+        # Vagas que as requisições de lote não podem ocupar, deixadas
+        # livres para as interativas.
+        if reserva_interativa is None:
+            reserva_interativa = int(max_em_andamento * FRACAO_RESERVA_INTERATIVA)
+        self.limites = {
+            PRIORIDADE_INTERATIVA: max_em_andamento,
+            PRIORIDADE_LOTE: max(max_em_andamento - reserva_interativa, 1),
+        }
+
+        # Limite de taxa por cliente. Sem rajada informada, o cliente
+        # pode acumular até um segundo de requisições.
+        self.taxa_por_cliente = taxa_por_cliente
+        self.rajada_por_cliente = rajada_por_cliente or max(taxa_por_cliente, 1)
+        self.baldes = OrderedDict()
+
+        # Requisições sendo atendidas e filas de espera de cada
+        # prioridade, com um 'Future' por requisição aguardando.
+        self.em_andamento = 0
+        self.filas = {PRIORIDADE_INTERATIVA: deque(), PRIORIDADE_LOTE: deque()}
+
+        # Requisições recusadas por (motivo, prioridade), expostas
+        # pela rota '/metrics'.
+        self.recusadas = defaultdict(int)
+
+    # Indica se a requisição deve ser recusada pelo limite de taxa do
+    # cliente. Retorna 0 se ela pode seguir, ou os segundos que o
+    # cliente deve aguardar antes de tentar novamente.
+    def limitar_taxa(self, cliente):
+
+        if not self.taxa_por_cliente:
+            return 0
+
+        agora = time.monotonic()
+        balde = self.baldes.get(cliente)
+        if balde is None:
+            balde = self.baldes[cliente] = BaldeFichas(self.taxa_por_cliente, self.rajada_por_cliente, agora)
+            if len(self.baldes) > MAX_CLIENTES:
+                self.baldes.popitem(last=False)
+        else:
+            self.baldes.move_to_end(cliente)
+
+        return balde.consumir(agora)
+
+    # Aguarda uma vaga para uma requisição da prioridade indicada.
+    # Retorna 'True' quando a vaga foi obtida (e deve ser devolvida com
+    # 'liberar') ou 'False' quando a requisição deve ser recusada.
+    async def admitir(self, prioridade):
+
+        if not self.max_em_andamento:
+            self.em_andamento += 1
+            return True
+
+        # Há vaga livre e ninguém da mesma prioridade esperando: entra direto.
+        fila = self.filas[prioridade]
+        if self.em_andamento < self.limites[prioridade] and not fila:
+            self.em_andamento += 1
+            return True
+
+        # Fila cheia: recusa imediatamente, sem fazer o cliente esperar.
+        if sum(map(len, self.filas.values())) >= self.max_fila:
+            return False
+
+        # Entra na fila e aguarda ser acordada por 'liberar'. Se a espera
+        # se esgotar, ou se a requisição for cancelada (ex: o cliente
+        # desconectou), o 'Future' é cancelado e sai da fila.
+        # 'liberar' pode ter entregue a vaga no mesmo instante: nesse
+        # caso o 'Future' já tem resultado e não pode mais ser cancelado,
+        # e a vaga é usada ou, na requisição cancelada, devolvida.
+        futuro = asyncio.get_running_loop().create_future()
+        fila.append(futuro)
+        try:
+            await asyncio.wait_for(futuro, self.espera_maxima)
+            return True
+        except asyncio.TimeoutError:
+            if futuro in fila:
+                fila.remove(futuro)
+            return futuro.done() and not futuro.cancelled()
+        except asyncio.CancelledError:
+            if futuro in fila:
+                fila.remove(futuro)
+            if futuro.done() and not futuro.cancelled():
+                self.liberar()
+            raise
+
+    # Devolve a vaga de uma requisição concluída e a passa para as
+    # requisições que aguardam, primeiro as interativas.
+    def liberar(self):
+
+        self.em_andamento -= 1
+
+        for prioridade, fila in self.filas.items():
+            while fila and self.em_andamento < self.limites[prioridade]:
+                futuro = fila.popleft()
+                if not futuro.done():
+                    self.em_andamento += 1
+                    futuro.set_result(True)
+
+    # Gera o texto das métricas de admissão no formato do Prometheus.
+    def exportar(self):
+
+        linhas = [
+            "# HELP api_operacoes_admissao_fila Requisições aguardando uma vaga, por prioridade.",
+            "# TYPE api_operacoes_admissao_fila gauge",
+        ]
+        for prioridade, fila in self.filas.items():
+            linhas.append(f'api_operacoes_admissao_fila{{prioridade="{prioridade}"}} {len(fila)}')
+
+        linhas += [
+            "# HELP api_operacoes_admissao_recusadas_total Requisições recusadas, por motivo e prioridade.",
+            "# TYPE api_operacoes_admissao_recusadas_total counter",
+        ]
+        for (motivo, prioridade), contagem in sorted(self.recusadas.items()):
+            linhas.append(f'api_operacoes_admissao_recusadas_total{{motivo="{motivo}",prioridade="{prioridade}"}} {contagem}')
+
+        return "\n".join(linhas) + "\n"
+
+
+# Envia uma resposta de recusa com o corpo no mesmo formato dos erros
+# da API ('{"detail": ...}') e o cabeçalho 'Retry-After', que informa
+# ao cliente quantos segundos aguardar antes de tentar novamente.
+async def recusar(send, status, detalhe, espera):
+
+    corpo = json.dumps({"detail": detalhe}, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-length", str(len(corpo)).encode()),
+            (b"content-type", b"application/json"),
+            (b"retry-after", str(max(math.ceil(espera), 1)).encode()),
+        ],
+    })
+    await send({"type": "http.response.body", "body": corpo})
+
+
+# Define a classe 'MiddlewareAdmissao', um middleware ASGI que aplica o
+# 'ControleAdmissao' a cada requisição HTTP antes que ela chegue às
+# rotas (e ao pool de threads das rotas síncronas).
+# Ele é adicionado com 'app.add_middleware(MiddlewareAdmissao, controle=...)'.
+# O cabeçalho 'X-Prioridade' é enviado pelo próprio cliente, e qualquer
+# um poderia marcar os seus lotes como interativos para passar na
+# frente. Por isso, ele só pode elevar a prioridade com
+# 'confiar_prioridade' (ex: quando um proxy de confiança define ou
+# remove o cabeçalho); sem isso, ele apenas rebaixa requisições para lote.
+# Pelo mesmo motivo, o cabeçalho 'X-Cliente' só identifica o cliente com
+# 'confiar_cliente': sem isso, um valor novo a cada requisição ganharia
+# um balde de fichas novo e escaparia do limite de taxa.
+class MiddlewareAdmissao:
+
+    def __init__(self, app, controle, confiar_prioridade=False, confiar_cliente=False):
+
+        self.app = app
+        self.controle = controle
+        self.confiar_prioridade = confiar_prioridade
+        self.confiar_cliente = confiar_cliente
+
+    # Identifica o cliente pelo endereço IP de origem ou, se permitido
+    # confiar nele, pelo cabeçalho 'X-Cliente', e a prioridade pela rota
+    # pedida ou pelo cabeçalho 'X-Prioridade', dentro do que é permitido
+    # confiar.
+    def identificar(self, scope):
+
+        cliente = None
+        prioridade = None
+        for nome, valor in scope["headers"]:
+            if nome == b"x-cliente" and self.confiar_cliente:
+                cliente = valor.decode("latin-1")
+            elif nome == b"x-prioridade":
+                prioridade = valor.decode("latin-1").strip().lower()
+
+        if cliente is None:
+            cliente = scope["client"][0] if scope.get("client") else ""
+
+        if prioridade == PRIORIDADE_INTERATIVA and not self.confiar_prioridade:
+            prioridade = None
+        if prioridade not in (PRIORIDADE_INTERATIVA, PRIORIDADE_LOTE):
+            prioridade = PRIORIDADE_LOTE if scope["path"].startswith(PREFIXOS_LOTE) else PRIORIDADE_INTERATIVA
+
+        return cliente, prioridade
+
+    async def __call__(self, scope, receive, send):
+
+        # Conexões WebSocket, eventos de ciclo de vida e rotas isentas
+        # seguem sem nenhum limite.
+        if scope["type"] != "http" or scope["path"] in ROTAS_ISENTAS or scope["path"].endswith(SUFIXOS_ISENTOS):
+            await self.app(scope, receive, send)
+            return
+
+        cliente, prioridade = self.identificar(scope)
+
+        # Limite de taxa do cliente: 429 (Too Many Requests).
+        espera = self.controle.limitar_taxa(cliente)
+        if espera:
+            self.controle.recusadas[("taxa", prioridade)] += 1
+            await recusar(send, 429, "Limite de requisições do cliente excedido", espera)
+            return
+
+        # Limite de vagas do servidor: 503 (Service Unavailable).
+        if not await self.controle.admitir(prioridade):
+            self.controle.recusadas[("sobrecarga", prioridade)] += 1
+            await recusar(send, 503, "Servidor sobrecarregado, tente novamente", self.controle.espera_maxima)
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controle.liberar()
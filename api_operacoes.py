@@ -1,133 +1,1100 @@
-# Importa a classe FastAPI e a classe HTTPException do módulo fastapi.
-# FastAPI é utilizado para criar a aplicação web com 
-#        funcionalidades de API.
-# HTTPException é usado para gerenciar exceções específicas 
-# de HTTP, permitindo retornar erros de estado HTTP específicos.
-from fastapi import FastAPI, HTTPException
-
-# Cria uma nova instância do objeto FastAPI.
-# Este objeto 'app' é o núcleo da nossa aplicação, sendo usado 
-# para criar rotas e lidar com solicitações HTTP.
-app = FastAPI()
-
-
-# O decorador '@app.get("/")' é usado para definir uma rota na aplicação.
-# Ele especifica que a função abaixo será chamada quando houver 
-# uma solicitação GET para a URL raiz '/'.
-@app.get("/")
-def boas_vindas():
-
-    # A função 'boas_vindas' é definida para responder às
-    # solicitações para a rota raiz.
-    # Ela não recebe nenhum parâmetro e retorna um dicionário Python.
-    # Este dicionário é automaticamente convertido pelo FastAPI 
-    # em uma resposta JSON.
-    # O dicionário contém uma chave 'mensagem' com uma saudação como valor.
-    return {"mensagem": "Bem-vindo(a) à API de Operações Matemáticas!"}
-
-
-# Decorador para a rota "/soma" que especifica uma operação GET.
-# Este decorador define que a função 'soma' será chamada 
-# quando a rota '/soma' for acessada via GET.
-# A função 'soma' aceita dois parâmetros float, 'numero1' e 'numero2', 
-# que devem ser fornecidos como parâmetros de consulta na URL.
-@app.get("/soma")
-def soma(numero1: float, numero2: float):
-
-    # Realiza a soma dos dois números fornecidos.
-    # Os valores 'numero1' e 'numero2' são convertidos para float 
-    # pelo FastAPI baseando-se na anotação de tipo e depois somados.
-    resultado = numero1 + numero2
-
-    # Retorna um dicionário contendo a descrição da operação, 
-    # os números usados e o resultado.
-    # Esse dicionário é automaticamente convertido em JSON 
-    # pelo FastAPI e enviado ao cliente como resposta.
-    return {"operacao": "soma", "numero1": numero1, "numero2": numero2, "resultado": resultado}
-
-
-# Decorador para a rota "/subtracao" que também especifica
-# uma operação GET.
-# Semelhante à rota de soma, esta função é chamada quando '/subtracao' é 
-# acessada com método GET.
-# Ela também requer dois parâmetros float 'numero1' e 'numero2', 
-# fornecidos via parâmetros de consulta.
-@app.get("/subtracao")
-def subtracao(numero1: float, numero2: float):
-
-    # Realiza a subtração de 'numero1' por 'numero2'.
-    # A subtração é feita diretamente aqui, e o resultado é 
-    # armazenado na variável 'resultado'.
-    resultado = numero1 - numero2
-
-    # Retorna um dicionário que inclui os detalhes da operação matemática.
-    # A resposta inclui tanto os números utilizados quanto o 
-    # resultado da operação de subtração.
-    return {"operacao": "subtração", "numero1": numero1, "numero2": numero2, "resultado": resultado}
-
-
-# Decorador para definir uma rota GET em "/multiplicacao".
-# Esta função é chamada quando a URL '/multiplicacao' é 
-# acessada com o método GET.
-# Os parâmetros 'numero1' e 'numero2' são esperados na URL 
-# como query parameters e devem ser do tipo float.
-@app.get("/multiplicacao")
-def multiplicacao(numero1: float, numero2: float):
-
-    # Multiplica os dois números fornecidos.
-    # 'numero1' e 'numero2' são multiplicados, e o resultado é 
-    # armazenado na variável 'resultado'.
-    resultado = numero1 * numero2
-
-    # Retorna um dicionário contendo a operação realizada, os 
-    # números envolvidos e o resultado.
-    # Este dicionário é automaticamente convertido em JSON 
-    # pelo FastAPI ao enviar a resposta ao cliente.
-    return {"operacao": "multiplicação", "numero1": numero1, "numero2": numero2, "resultado": resultado}
-
-
-# O decorador '@app.get("/divisao")' é usado para criar 
-# uma rota GET na URL '/divisao'.
-# FastAPI usará essa rota para encaminhar as requisições GET 
-# recebidas para a função 'divisao'.
-# Os parâmetros 'numero1' e 'numero2' são especificados como 
-# parte da URL de consulta e devem ser do tipo float.
-@app.get("/divisao")
-def divisao(numero1: float, numero2: float):
-
-    # Início do bloco de verificação do valor do divisor.
-    # Esta condição checa se o valor do 'numero2', que atua 
-    # como divisor na operação de divisão, é igual a zero.
-    # Dividir por zero é uma operação indefinida na matemática e
-    # pode causar erros de execução.
-    if numero2 == 0:
-
-        # Levanta uma exceção HTTP usando a classe HTTPException,
-        # que é parte do FastAPI.
-        # A exceção interrompe o fluxo normal da função e retorna uma 
-        # resposta HTTP com o código 400, que significa "Bad Request".
-        # O detalhe "Divisão por zero não é permitida" é uma mensagem 
-        # explicativa que acompanha o código de erro, informando o
-        # usuário sobre o problema.
-        raise HTTPException(status_code=400, detail="Divisão por zero não é permitida")
-
-    # Calcula o resultado da divisão de 'numero1' por 'numero2'.
-    # Esta linha é executada somente se a condição acima não for verdadeira,
-    # ou seja, se 'numero2' não for zero.
-    # O resultado da divisão é armazenado na variável 'resultado'.
-    resultado = numero1 / numero2
-
-    # Prepara a resposta para a requisição.
-    # Cria um dicionário que inclui a operação realizada ("divisão"), 
-    # os valores de 'numero1' e 'numero2', e o 'resultado' da divisão.
-    # Este dicionário é retornado pela função e o FastAPI cuida 
-    # de serializá-lo em JSON.
-    # O JSON é o formato de resposta que será enviado de volta ao
-    # cliente que fez a requisição HTTP.
-    return {"operacao": "divisão", "numero1": numero1, "numero2": numero2, "resultado": resultado}
-
-# uvicorn api_operacoes:app --reload
-
-# Acesse a Documentação Interativa:
-# Acesse: http://127.0.0.1:8000/docs
+# Importa a classe FastAPI e a classe HTTPException do módulo fastapi.
+# FastAPI é utilizado para criar a aplicação web com 
+#        funcionalidades de API.
+# HTTPException é usado para gerenciar exceções específicas 
+# de HTTP, permitindo retornar erros de estado HTTP específicos.
+from fastapi import FastAPI, HTTPException
+
+# Importa o NumPy, usado pela rota de lote para calcular
+# muitas operações de uma só vez em arrays vetorizados.
+import numpy as np
+
+# Importa a classe BaseModel do Pydantic, usada para descrever
+# o corpo JSON aceito pela rota de lote.
+from pydantic import BaseModel
+
+# Importa o necessário para o cache de resultados: 'APIRouter' e
+# 'APIRoute' para colocar o cache na frente das rotas de operação,
+# 'Request' e 'Response' para ler os cabeçalhos e responder
+# diretamente, 'OrderedDict' para a ordem de uso do LRU, 'hashlib'
+# para gerar os ETags e 'time' para a validade das entradas.
+from collections import OrderedDict
+import hashlib
+import time
+from fastapi import APIRouter, Request, Response
+from fastapi.routing import APIRoute
+
+# Importa o módulo 'ast', usado pela rota de expressões para analisar
+# o texto da expressão com segurança (sem executá-lo), e o 'lru_cache',
+# que guarda os planos já compilados de cada expressão.
+import ast
+from functools import lru_cache
+
+# Importa as classes usadas pela rota WebSocket: 'WebSocket' representa
+# a conexão persistente e 'WebSocketDisconnect' indica que o cliente
+# se desconectou. O módulo 'json' decodifica cada mensagem recebida.
+import json
+from fastapi import WebSocket, WebSocketDisconnect
+
+# Importa a função que executa código bloqueante no pool de threads
+# do servidor, usada para calcular lotes binários grandes sem travar
+# o laço de eventos.
+from fastapi.concurrency import run_in_threadpool
+
+# Importa a classe base das respostas em fluxo, usada pela rota
+# '/fluxo' para enviar os resultados à medida que são calculados.
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# Importa o 'threading', cujo 'Event' indica à rota de prontidão que o
+# processo está encerrando.
+import threading
+
+# O MessagePack e o Apache Arrow são formatos de resposta opcionais da
+# rota de lote binário, disponíveis apenas se as bibliotecas 'msgpack'
+# e 'pyarrow' estiverem instaladas.
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import pyarrow
+except ImportError:
+    pyarrow = None
+
+# Importa os módulos usados pelo caminho rápido: 'os' para ler a
+# variável de ambiente que o ativa, 're' para reconhecer os números
+# na query string e 'math' para verificar se o resultado é finito.
+import math
+import os
+import re
+
+# Importa o registro das operações, a partir do qual são geradas as
+# rotas de operação, os cálculos em lote e o caminho rápido.
+from registro_api_operacoes import (
+    MENSAGEM_NAO_FINITO, REGISTRO_OPERACOES, calcular_vetorizado, mensagem_erro, separar_erros,
+)
+
+# Importa o registro de métricas e o middleware que mede cada
+# requisição, definidos no módulo 'metricas_api_operacoes'.
+from metricas_api_operacoes import TIPO_CONTEUDO_PROMETHEUS, MetricasRequisicoes, MiddlewareMetricas
+
+# Importa o controle de admissão, que recusa cedo as requisições
+# excedentes quando o servidor está sobrecarregado.
+from admissao_api_operacoes import MAX_FILA, ESPERA_MAXIMA_FILA, ControleAdmissao, MiddlewareAdmissao
+
+# Importa o tipo de rota que mede as fases de cada requisição e as
+# informa no cabeçalho 'Server-Timing', e os tratadores que incluem o
+# cabeçalho também nas respostas de erros de validação e inesperados.
+from fastapi.exceptions import RequestValidationError
+from tempos_api_operacoes import RotaComTempos, tratar_erro_interno, tratar_erro_validacao
+
+# Importa o roteador do registro de conjuntos de dados ('/conjuntos').
+from conjuntos_api_operacoes import rotas_conjuntos
+from trabalhos_api_operacoes import rotas_trabalhos
+
+# Ativa o caminho rápido das rotas de operação quando a variável de
+# ambiente 'API_OPERACOES_CAMINHO_RAPIDO' vale "1" ao iniciar o servidor.
+# Ex: API_OPERACOES_CAMINHO_RAPIDO=1 uvicorn api_operacoes:app
+CAMINHO_RAPIDO = os.environ.get("API_OPERACOES_CAMINHO_RAPIDO") == "1"
+
+# Configuração do controle de admissão, também lida de variáveis de
+# ambiente. Por padrão não há limites; ex:
+#   API_OPERACOES_MAX_EM_ANDAMENTO=32 API_OPERACOES_TAXA_POR_CLIENTE=50 uvicorn api_operacoes:app
+# - MAX_EM_ANDAMENTO: requisições atendidas ao mesmo tempo (0 = sem limite).
+#   Um valor próximo do número de threads do pool (40 por padrão)
+#   evita que as rotas síncronas acumulem uma fila invisível.
+# - MAX_FILA e ESPERA_MAXIMA_FILA: requisições que podem aguardar uma
+#   vaga e por quantos segundos, antes de receberem 503.
+# - TAXA_POR_CLIENTE e RAJADA_POR_CLIENTE: requisições por segundo e
+#   rajada máxima de cada cliente (0 = sem limite), acima das quais
+#   o cliente recebe 429.
+# - CONFIAR_PRIORIDADE: com "1", o cabeçalho 'X-Prioridade: interativa'
+#   enviado pelo cliente eleva a prioridade da requisição. Só deve ser
+#   ativado quando os clientes são confiáveis ou um proxy controla o
+#   cabeçalho; por padrão, a prioridade vem apenas da rota pedida.
+# - CONFIAR_CLIENTE: com "1", o cabeçalho 'X-Cliente' identifica o
+#   cliente no limite de taxa. Assim como a prioridade, só deve ser
+#   ativado atrás de um proxy que controle o cabeçalho; por padrão, o
+#   cliente é identificado pelo endereço IP de origem.
+MAX_EM_ANDAMENTO = int(os.environ.get("API_OPERACOES_MAX_EM_ANDAMENTO", "0"))
+MAX_FILA_ADMISSAO = int(os.environ.get("API_OPERACOES_MAX_FILA", str(MAX_FILA)))
+ESPERA_MAXIMA_ADMISSAO = float(os.environ.get("API_OPERACOES_ESPERA_MAXIMA_FILA", str(ESPERA_MAXIMA_FILA)))
+TAXA_POR_CLIENTE = float(os.environ.get("API_OPERACOES_TAXA_POR_CLIENTE", "0"))
+RAJADA_POR_CLIENTE = float(os.environ.get("API_OPERACOES_RAJADA_POR_CLIENTE", "0"))
+CONFIAR_PRIORIDADE = os.environ.get("API_OPERACOES_CONFIAR_PRIORIDADE") == "1"
+CONFIAR_CLIENTE = os.environ.get("API_OPERACOES_CONFIAR_CLIENTE") == "1"
+
+# Versão da API. Ela faz parte dos ETags, de modo que respostas
+# guardadas por clientes e proxies deixam de valer quando a API muda.
+VERSAO_API = "1.0.0"
+
+# Número máximo de respostas guardadas no cache de resultados.
+TAMANHO_CACHE = 10_000
+
+# Tempo, em segundos, durante o qual uma resposta guardada
+# (no servidor, em proxies ou nos clientes) continua válida.
+TEMPO_VIDA_CACHE = 3600
+
+# Cabeçalho 'Cache-Control' enviado pelas rotas de operação.
+# Como cada resposta depende apenas da operação e dos números,
+# ela pode ser guardada por qualquer proxy ('public').
+CACHE_CONTROL = f"public, max-age={TEMPO_VIDA_CACHE}"
+
+# Cria uma nova instância do objeto FastAPI.
+# Este objeto 'app' é o núcleo da nossa aplicação, sendo usado 
+# para criar rotas e lidar com solicitações HTTP.
+app = FastAPI(version=VERSAO_API)
+
+# As rotas definidas diretamente na aplicação medem as fases de cada
+# requisição (cabeçalho 'Server-Timing').
+app.router.route_class = RotaComTempos
+app.add_exception_handler(RequestValidationError, tratar_erro_validacao)
+app.add_exception_handler(Exception, tratar_erro_interno)
+
+# Cria o registro de métricas deste processo. O middleware que o
+# alimenta é adicionado ao final do arquivo, junto com os demais.
+metricas = MetricasRequisicoes()
+
+# Cria o controle de admissão deste processo, aplicado pelo middleware
+# adicionado ao final do arquivo.
+controle_admissao = ControleAdmissao(
+    max_em_andamento=MAX_EM_ANDAMENTO,
+    max_fila=MAX_FILA_ADMISSAO,
+    espera_maxima=ESPERA_MAXIMA_ADMISSAO,
+    taxa_por_cliente=TAXA_POR_CLIENTE,
+    rajada_por_cliente=RAJADA_POR_CLIENTE,
+)
+
+
+# Define a classe 'CacheResultados', um cache LRU (o item menos
+# usado recentemente é removido primeiro) com tempo de vida.
+# Ele guarda o corpo JSON já serializado de cada resposta, evitando
+# recalcular e re-serializar respostas idênticas.
+# Todos os acessos acontecem no laço de eventos do servidor, em uma
+# única thread, por isso não é necessária uma trava.
+class CacheResultados:
+
+    # O construtor recebe o número máximo de entradas e o tempo
+    # de vida de cada uma, em segundos.
+    def __init__(self, tamanho_maximo=TAMANHO_CACHE, tempo_vida=TEMPO_VIDA_CACHE):
+
+        self.tamanho_maximo = tamanho_maximo
+        self.tempo_vida = tempo_vida
+
+        # O 'OrderedDict' mantém as entradas na ordem de uso: as mais
+        # recentes ficam no final e as candidatas à remoção no início.
+        self.itens = OrderedDict()
+
+        # Contadores de acertos, falhas e remoções, expostos pela rota '/cache'.
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    # Retorna o corpo guardado para a chave, ou 'None' se ele não
+    # existir ou já tiver expirado.
+    def obter(self, chave):
+
+        item = self.itens.get(chave)
+        if item is None:
+            self.falhas += 1
+            return None
+
+        # Descarta a entrada se o seu tempo de vida já passou.
+        corpo, expiracao = item
+        if expiracao < time.monotonic():
+            del self.itens[chave]
+            self.remocoes += 1
+            self.falhas += 1
+            return None
+
+        # Marca a entrada como a mais recentemente usada.
+        self.itens.move_to_end(chave)
+        self.acertos += 1
+        return corpo
+
+    # Guarda o corpo de uma resposta, removendo as entradas menos
+    # usadas recentemente quando o limite de tamanho é ultrapassado.
+    def guardar(self, chave, corpo):
+
+        self.itens[chave] = (corpo, time.monotonic() + self.tempo_vida)
+        self.itens.move_to_end(chave)
+
+        while len(self.itens) > self.tamanho_maximo:
+            self.itens.popitem(last=False)
+            self.remocoes += 1
+
+    # Retorna os contadores e a taxa de acerto do cache.
+    def estatisticas(self):
+
+        consultas = self.acertos + self.falhas
+        return {
+            "tamanho": len(self.itens),
+            "tamanho_maximo": self.tamanho_maximo,
+            "acertos": self.acertos,
+            "falhas": self.falhas,
+            "remocoes": self.remocoes,
+            "taxa_acerto": self.acertos / consultas if consultas else 0.0,
+        }
+
+
+# Cache compartilhado por todas as rotas de operação deste processo.
+cache_resultados = CacheResultados()
+
+
+# Gera o ETag de uma resposta a partir da versão da API, do caminho e
+# da query string, que juntos determinam o conteúdo da resposta.
+def gerar_etag(caminho, consulta):
+
+    resumo = hashlib.blake2b(f"{VERSAO_API}|{caminho}?{consulta}".encode(), digest_size=12).hexdigest()
+    return f'"{resumo}"'
+
+
+# Verifica se o ETag atual aparece no cabeçalho 'If-None-Match'
+# enviado pelo cliente, que pode listar vários ETags, usar o
+# prefixo 'W/' (ETag fraco) ou o valor especial '*'.
+def etag_corresponde(if_none_match, etag):
+
+    for candidato in if_none_match.split(","):
+        candidato = candidato.strip().removeprefix("W/")
+        if candidato == etag or candidato == "*":
+            return True
+
+    return False
+
+
+# Define a classe 'RotaComCache', um tipo de rota do FastAPI que
+# coloca o cache de resultados e os cabeçalhos de cache HTTP na
+# frente das funções de operação, sem que elas precisem mudar.
+class RotaComCache(APIRoute):
+
+    def get_route_handler(self):
+
+        # Obtém o manipulador normal da rota, que valida os parâmetros,
+        # chama a função da operação e serializa a resposta em JSON.
+        manipulador_original = super().get_route_handler()
+
+        async def manipulador_com_cache(request: Request):
+
+            # O caminho e a query string identificam a resposta.
+            caminho = request.url.path
+            consulta = request.url.query
+            etag = gerar_etag(caminho, consulta)
+            cabecalhos = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+
+            # Procura o corpo no cache. Se não estiver lá, executa a rota
+            # normalmente e guarda o corpo apenas se ela teve sucesso;
+            # erros (400, 422) são retornados sem passar pelo cache.
+            chave = (caminho, consulta)
+            corpo = cache_resultados.obter(chave)
+            if corpo is None:
+                resposta = await manipulador_original(request)
+                if resposta.status_code != 200:
+                    return resposta
+                corpo = resposta.body
+                cache_resultados.guardar(chave, corpo)
+
+            # Se o cliente já tem esta resposta, responde 304 (Not
+            # Modified) sem corpo, e ele reutiliza a cópia que possui.
+            # A verificação vem depois do cálculo: só há o que reutilizar
+            # quando a requisição tem uma resposta 200, e as que falhariam
+            # (ex: divisão por zero) recebem o erro mesmo com '*'.
+            if etag_corresponde(request.headers.get("if-none-match", ""), etag):
+                return Response(status_code=304, headers=cabecalhos)
+
+            return Response(content=corpo, media_type="application/json", headers=cabecalhos)
+
+        return manipulador_com_cache
+
+
+# Tipo das rotas de operação: mede as fases de cada requisição e aplica
+# o cache. 'RotaComTempos' vem primeiro para envolver o cache, de modo
+# que as respostas vindas dele também tenham o cabeçalho 'Server-Timing'.
+class RotaOperacao(RotaComTempos, RotaComCache):
+    pass
+
+
+# Cria o roteador das rotas de operação, cujas rotas usam a classe
+# 'RotaOperacao'. Ele é incluído na aplicação logo após a criação
+# das rotas de operação.
+rotas_operacoes = APIRouter(route_class=RotaOperacao)
+
+
+# O decorador '@app.get("/")' é usado para definir uma rota na aplicação.
+# Ele especifica que a função abaixo será chamada quando houver 
+# uma solicitação GET para a URL raiz '/'.
+@app.get("/")
+def boas_vindas():
+
+    # A função 'boas_vindas' é definida para responder às
+    # solicitações para a rota raiz.
+    # Ela não recebe nenhum parâmetro e retorna um dicionário Python.
+    # Este dicionário é automaticamente convertido pelo FastAPI 
+    # em uma resposta JSON.
+    # O dicionário contém uma chave 'mensagem' com uma saudação como valor.
+    return {"mensagem": "Bem-vindo(a) à API de Operações Matemáticas!"}
+
+
+# Calcula uma operação do registro sobre dois números e retorna o
+# dicionário de resposta das rotas de operação, com a descrição da
+# operação, os números usados e o resultado.
+# Se a validação da operação recusar os números (ex: divisão por zero),
+# levanta uma exceção HTTP com o código 400, que significa "Bad Request",
+# e a mensagem explicativa da operação. O mesmo acontece quando o
+# resultado estoura (ex: 10 ** 400) ou é infinito ou NaN, que não
+# podem ser representados em JSON.
+def calcular_operacao(operacao, numero1, numero2):
+
+    if operacao.invalidos is not None and operacao.invalidos(numero1, numero2):
+        raise HTTPException(status_code=400, detail=operacao.mensagem_erro)
+
+    try:
+        resultado = operacao.escalar(numero1, numero2)
+    except OverflowError:
+        resultado = math.inf
+    if not math.isfinite(resultado):
+        raise HTTPException(status_code=400, detail=MENSAGEM_NAO_FINITO)
+
+    return {"operacao": operacao.descricao, "numero1": numero1, "numero2": numero2, "resultado": resultado}
+
+
+# Cria a função da rota GET de uma operação do registro.
+# A função aceita dois parâmetros float, 'numero1' e 'numero2', que
+# devem ser fornecidos como parâmetros de consulta na URL e são
+# convertidos pelo FastAPI baseando-se na anotação de tipo.
+def criar_rota_operacao(operacao):
+
+    def rota(numero1: float, numero2: float):
+        return calcular_operacao(operacao, numero1, numero2)
+
+    # O nome da função aparece na documentação interativa.
+    rota.__name__ = operacao.nome
+    return rota
+
+
+# Cria uma rota GET para cada operação registrada, no caminho com o
+# nome da operação ('/soma', '/subtracao', '/multiplicacao', ...).
+for operacao in REGISTRO_OPERACOES.values():
+    rotas_operacoes.add_api_route(f"/{operacao.nome}", criar_rota_operacao(operacao), methods=["GET"])
+
+# Inclui na aplicação as rotas de operação geradas no roteador
+# 'rotas_operacoes', com o cache na frente delas.
+app.include_router(rotas_operacoes)
+
+
+# Rota de descoberta: informa a versão da API e as operações
+# disponíveis, para que os clientes montem as suas listas de operações
+# a partir do servidor em vez de mantê-las fixas no código.
+@app.get("/operacoes")
+def listar_operacoes():
+
+    operacoes = [
+        {"nome": operacao.nome, "descricao": operacao.descricao, "rota": f"/{operacao.nome}"}
+        for operacao in REGISTRO_OPERACOES.values()
+    ]
+    return {"versao": VERSAO_API, "operacoes": operacoes}
+
+
+# Rota que expõe as estatísticas do cache de resultados
+# (tamanho, acertos, falhas, remoções e taxa de acerto).
+@app.get("/cache")
+def estatisticas_cache():
+    return cache_resultados.estatisticas()
+
+
+# Rota que exporta as métricas das requisições e do cache no formato
+# de texto do Prometheus, para serem coletadas periodicamente.
+@app.get("/metrics")
+def exportar_metricas():
+
+    # Acrescenta às métricas das requisições os contadores do cache
+    # e as métricas do controle de admissão.
+    estatisticas = cache_resultados.estatisticas()
+    linhas = [metricas.exportar()]
+    for nome in ("acertos", "falhas", "remocoes"):
+        linhas.append(f"# TYPE api_operacoes_cache_{nome}_total counter\n")
+        linhas.append(f"api_operacoes_cache_{nome}_total {estatisticas[nome]}\n")
+    linhas.append("# TYPE api_operacoes_cache_tamanho gauge\n")
+    linhas.append(f"api_operacoes_cache_tamanho {estatisticas['tamanho']}\n")
+    linhas.append(controle_admissao.exportar())
+
+    return Response(content="".join(linhas), media_type=TIPO_CONTEUDO_PROMETHEUS)
+
+
+# Indica se o processo está encerrando. O lançador 'servidor_api_operacoes'
+# o substitui por um evento compartilhado entre os seus processos, que
+# é marcado ao receber SIGTERM, antes de os processos pararem de aceitar
+# conexões.
+app.state.encerrando = threading.Event()
+
+
+# Rota de prontidão, consultada por balanceadores de carga e
+# orquestradores: responde 200 enquanto o processo aceita requisições e
+# 503 durante o encerramento, para que deixem de enviar tráfego a ele
+# antes que as conexões sejam recusadas.
+@app.get("/pronto")
+async def verificar_prontidao():
+
+    if app.state.encerrando.is_set():
+        return JSONResponse(status_code=503, content={"pronto": False})
+    return {"pronto": True}
+
+
+# Modelo do corpo JSON aceito pela rota '/lote'.
+# 'operacao' pode ser o nome de uma única operação, aplicada a todos
+# os pares, ou uma lista com uma operação por par (lote misto).
+# 'numero1' e 'numero2' são listas de mesmo tamanho com os operandos.
+class LoteOperacoes(BaseModel):
+    operacao: str | list[str]
+    numero1: list[float]
+    numero2: list[float]
+
+
+# O decorador '@app.post("/lote")' cria uma rota POST que recebe
+# muitas operações em uma única requisição, evitando uma ida e volta
+# HTTP, uma análise de parâmetros e uma serialização JSON por operação.
+@app.post("/lote")
+def calcular_lote(lote: LoteOperacoes):
+
+    # Verifica se as listas de operandos têm o mesmo tamanho,
+    # pois cada posição de 'numero1' é combinada com a mesma
+    # posição de 'numero2'.
+    if len(lote.numero1) != len(lote.numero2):
+        raise HTTPException(status_code=400, detail="As listas 'numero1' e 'numero2' devem ter o mesmo tamanho")
+
+    # Converte a operação para um array NumPy quando o lote é misto,
+    # conferindo se há exatamente uma operação por par.
+    if isinstance(lote.operacao, list):
+        if len(lote.operacao) != len(lote.numero1):
+            raise HTTPException(status_code=400, detail="A lista 'operacao' deve ter o mesmo tamanho das listas de números")
+        operacoes = np.asarray(lote.operacao)
+        nomes = set(lote.operacao)
+    else:
+        operacoes = lote.operacao
+        nomes = {lote.operacao}
+
+    # Rejeita o lote se alguma operação pedida não existir.
+    desconhecidas = nomes - REGISTRO_OPERACOES.keys()
+    if desconhecidas:
+        raise HTTPException(status_code=400, detail=f"Operação desconhecida: {', '.join(sorted(desconhecidas))}")
+
+    # Converte as listas de números em arrays NumPy de float64 e
+    # calcula todo o lote em uma única passada vetorizada.
+    numero1 = np.asarray(lote.numero1, dtype=np.float64)
+    numero2 = np.asarray(lote.numero2, dtype=np.float64)
+    resultados, erros = calcular_vetorizado(operacoes, numero1, numero2)
+
+    # Converte os resultados para uma lista Python e substitui por
+    # 'None' (null no JSON) as posições recusadas pela validação
+    # (ex: divisões por zero) e as de resultado infinito, registrando o
+    # índice e o motivo de cada erro.
+    lista_resultados, erros = separar_erros(resultados, erros)
+
+    # Retorna os resultados na mesma ordem dos pares enviados,
+    # junto com a lista de erros por elemento.
+    return {"resultados": lista_resultados, "erros": erros}
+
+
+# Tipos de conteúdo aceitos e produzidos pela rota de lote binário.
+TIPO_BINARIO = "application/octet-stream"
+TIPO_JSON = "application/json"
+TIPO_MSGPACK = "application/msgpack"
+TIPO_ARROW = "application/vnd.apache.arrow.stream"
+
+# Formatos de resposta disponíveis, indexados pelos tipos que podem
+# aparecer no cabeçalho 'Accept'. Os formatos opcionais só entram na
+# lista se a biblioteca correspondente estiver instalada.
+FORMATOS_RESPOSTA = {TIPO_BINARIO: TIPO_BINARIO, TIPO_JSON: TIPO_JSON}
+if msgpack is not None:
+    FORMATOS_RESPOSTA[TIPO_MSGPACK] = TIPO_MSGPACK
+    FORMATOS_RESPOSTA["application/x-msgpack"] = TIPO_MSGPACK
+if pyarrow is not None:
+    FORMATOS_RESPOSTA[TIPO_ARROW] = TIPO_ARROW
+
+
+# Escolhe o formato da resposta a partir do cabeçalho 'Accept',
+# respeitando a ordem de preferência indicada pelos valores 'q'.
+# Sem cabeçalho, ou aceitando qualquer tipo, a resposta é binária.
+# Retorna 'None' se nenhum dos tipos aceitos pelo cliente for suportado.
+def negociar_formato(accept):
+
+    if not accept:
+        return TIPO_BINARIO
+
+    # Lê cada tipo aceito com a sua preferência 'q' (1 por padrão).
+    candidatos = []
+    for posicao, item in enumerate(accept.split(",")):
+        tipo, *parametros = [parte.strip() for parte in item.split(";")]
+        preferencia = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    preferencia = float(parametro[2:])
+                except ValueError:
+                    preferencia = 0.0
+        candidatos.append((-preferencia, posicao, tipo.lower()))
+
+    # Percorre os tipos do mais preferido para o menos preferido,
+    # ignorando os recusados explicitamente com 'q=0'.
+    for preferencia, _, tipo in sorted(candidatos):
+        if preferencia == 0:
+            break
+        if tipo in ("*/*", "application/*"):
+            return TIPO_BINARIO
+        if tipo in FORMATOS_RESPOSTA:
+            return FORMATOS_RESPOSTA[tipo]
+
+    return None
+
+
+# Codifica os resultados de um lote no formato escolhido.
+# 'resultados' é o array de float64 e 'erros' o array com o código de
+# erro de cada elemento (0 para os elementos com resultado).
+def codificar_resultados(formato, resultados, erros):
+
+    invalidos = erros != 0
+
+    # Binário: os resultados empacotados como float64 little-endian,
+    # com NaN nas posições inválidas.
+    if formato == TIPO_BINARIO:
+        resultados[invalidos] = np.nan
+        return resultados.astype("<f8", copy=False).tobytes()
+
+    # Arrow: uma coluna 'resultado' de float64 com valores nulos nas
+    # posições inválidas, no formato de fluxo IPC do Arrow.
+    if formato == TIPO_ARROW:
+        coluna = pyarrow.array(resultados, mask=invalidos)
+        tabela = pyarrow.record_batch([coluna], names=["resultado"])
+        saida = pyarrow.BufferOutputStream()
+        with pyarrow.ipc.new_stream(saida, tabela.schema) as escritor:
+            escritor.write_batch(tabela)
+        return saida.getvalue().to_pybytes()
+
+    # MessagePack: os resultados como um único bloco binário de float64
+    # little-endian (sem um objeto por elemento) e a lista de índices
+    # das posições inválidas.
+    if formato == TIPO_MSGPACK:
+        indices = np.flatnonzero(invalidos).tolist()
+        resultados[invalidos] = np.nan
+        return msgpack.packb({"resultados": resultados.astype("<f8", copy=False).tobytes(), "erros": indices})
+
+    # JSON: o mesmo formato da rota '/lote'.
+    lista_resultados, lista_erros = separar_erros(resultados, erros)
+    corpo = {"resultados": lista_resultados, "erros": lista_erros}
+    return json.dumps(corpo, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+# O decorador '@app.post("/lote/binario")' cria uma rota de lote que
+# recebe os números como um bloco binário em vez de texto JSON.
+# O corpo ('application/octet-stream') contém os N valores de 'numero1'
+# seguidos dos N valores de 'numero2', todos float64 little-endian, e é
+# interpretado sem cópia com 'np.frombuffer'. A operação é informada no
+# parâmetro de consulta 'operacao'. O formato da resposta é escolhido
+# pelo cabeçalho 'Accept': binário (padrão), JSON, MessagePack ou Arrow.
+@app.post("/lote/binario")
+async def calcular_lote_binario(operacao: str, request: Request):
+
+    # Verifica a operação, o tipo do corpo e o formato da resposta.
+    if operacao not in REGISTRO_OPERACOES:
+        raise HTTPException(status_code=400, detail=f"Operação desconhecida: {operacao}")
+
+    if request.headers.get("content-type", "").split(";")[0].strip() != TIPO_BINARIO:
+        raise HTTPException(status_code=415, detail=f"O corpo deve ser do tipo '{TIPO_BINARIO}'")
+
+    formato = negociar_formato(request.headers.get("accept"))
+    if formato is None:
+        raise HTTPException(status_code=406, detail=f"Formatos de resposta disponíveis: {', '.join(FORMATOS_RESPOSTA)}")
+
+    # Interpreta o corpo como um array de float64 little-endian sem
+    # copiá-lo e o divide ao meio, em 'numero1' e 'numero2'.
+    corpo = await request.body()
+    if len(corpo) % 16:
+        raise HTTPException(status_code=400, detail="O corpo deve conter dois arrays de float64 de mesmo tamanho")
+
+    valores = np.frombuffer(corpo, dtype="<f8")
+    metade = len(valores) // 2
+
+    # Calcula e codifica o lote no pool de threads, para que lotes
+    # grandes não bloqueiem as demais requisições.
+    def calcular():
+        resultados, erros = calcular_vetorizado(operacao, valores[:metade], valores[metade:])
+        return codificar_resultados(formato, resultados, erros), int(np.count_nonzero(erros))
+
+    conteudo, quantidade_erros = await run_in_threadpool(calcular)
+
+    # O cabeçalho 'X-Quantidade-Erros' informa quantos elementos não
+    # têm resultado, o que é útil principalmente na resposta binária.
+    return Response(content=conteudo, media_type=formato, headers={"X-Quantidade-Erros": str(quantidade_erros)})
+
+
+# Tamanho máximo, em caracteres, de uma expressão aceita pela rota
+# '/expressao', quantos planos compilados são mantidos em cache e a
+# profundidade máxima da árvore da expressão. A compilação e a
+# avaliação percorrem a árvore recursivamente, então expressões muito
+# aninhadas (ex: mil sinais de menos seguidos) são recusadas antes de
+# esgotarem a pilha.
+TAMANHO_MAXIMO_EXPRESSAO = 1000
+TAMANHO_CACHE_EXPRESSOES = 1024
+PROFUNDIDADE_MAXIMA_EXPRESSAO = 200
+
+# Operadores permitidos nas expressões, associados ao nome da
+# operação do registro correspondente.
+OPERADORES_EXPRESSAO = {
+    ast.Add: "soma",
+    ast.Sub: "subtracao",
+    ast.Mult: "multiplicacao",
+    ast.Div: "divisao",
+    ast.Pow: "potencia",
+    ast.Mod: "modulo",
+}
+
+
+# Modelo do corpo JSON aceito pela rota '/expressao'.
+# 'expressao' é o texto da expressão, como "(a + b) * c / d".
+# 'variaveis' associa cada variável a um número ou a uma lista de
+# números; com listas, a expressão é avaliada para cada posição.
+class Expressao(BaseModel):
+    expressao: str
+    variaveis: dict[str, float | list[float]] = {}
+
+
+# Converte um nó da árvore sintática da expressão em uma função que o
+# avalia. Cada função recebe o dicionário de variáveis (arrays NumPy)
+# e retorna os valores calculados e os códigos de erro dos elementos
+# (0 quando não há erro), no mesmo formato de 'calcular_vetorizado'.
+# Os nomes das variáveis usadas são acumulados no conjunto 'variaveis'
+# e 'profundidade' é a distância do nó até a raiz da árvore.
+def compilar_no(no, variaveis, profundidade=0):
+
+    if profundidade > PROFUNDIDADE_MAXIMA_EXPRESSAO:
+        raise ValueError(f"A expressão deve ter no máximo {PROFUNDIDADE_MAXIMA_EXPRESSAO} níveis de aninhamento")
+
+    # Números literais são convertidos uma única vez, na compilação.
+    # 'bool' é excluído porque, em Python, True e False também são int.
+    # Literais que não cabem em um float (ex: 1e999, que o Python lê
+    # como infinito, ou um inteiro enorme) são recusados.
+    if isinstance(no, ast.Constant) and type(no.value) in (int, float):
+        try:
+            valor = np.float64(no.value)
+        except OverflowError:
+            valor = np.float64(np.inf)
+        if not np.isfinite(valor):
+            raise ValueError(f"Número não representável na expressão: {ast.unparse(no)}")
+        return lambda ambiente: (valor, 0)
+
+    # Variáveis são lidas do dicionário recebido na avaliação.
+    if isinstance(no, ast.Name):
+        nome = no.id
+        variaveis.add(nome)
+        return lambda ambiente: (ambiente[nome], 0)
+
+    # Sinais de mais e de menos na frente de um valor (ex: -a).
+    if isinstance(no, ast.UnaryOp) and isinstance(no.op, (ast.UAdd, ast.USub)):
+        operando = compilar_no(no.operand, variaveis, profundidade + 1)
+        if isinstance(no.op, ast.UAdd):
+            return operando
+
+        def negar(ambiente):
+            valores, erros = operando(ambiente)
+            return -valores, erros
+
+        return negar
+
+    # Operações binárias, restritas às operações registradas na API.
+    if isinstance(no, ast.BinOp) and OPERADORES_EXPRESSAO.get(type(no.op)) in REGISTRO_OPERACOES:
+        esquerda = compilar_no(no.left, variaveis, profundidade + 1)
+        direita = compilar_no(no.right, variaveis, profundidade + 1)
+        operacao = REGISTRO_OPERACOES[OPERADORES_EXPRESSAO[type(no.op)]]
+
+        def aplicar(ambiente):
+            valores_esquerda, erros_esquerda = esquerda(ambiente)
+            valores_direita, erros_direita = direita(ambiente)
+
+            # Um elemento com erro em um dos operandos mantém o primeiro
+            # erro encontrado, da esquerda para a direita.
+            erros = np.where(erros_esquerda != 0, erros_esquerda, erros_direita)
+
+            # Os pares recusados pela validação da operação (ex: divisores
+            # iguais a zero) são marcados com o código da operação e o
+            # segundo operando é substituído por 1 apenas para que o
+            # cálculo continue; esses elementos não terão resultado.
+            if operacao.invalidos is not None:
+                invalidos = operacao.invalidos(valores_esquerda, valores_direita)
+                erros = np.where(invalidos & (erros == 0), operacao.codigo, erros)
+                valores_direita = np.where(invalidos, 1.0, valores_direita)
+
+            # Os resultados que estouram viram infinito sem aviso e são
+            # recusados ao final da avaliação.
+            with np.errstate(over="ignore", invalid="ignore"):
+                return operacao.vetorizada(valores_esquerda, valores_direita), erros
+
+        return aplicar
+
+    # Qualquer outro elemento (chamadas de função, atributos,
+    # comparações...) é recusado, o que torna a avaliação segura.
+    raise ValueError(f"Elemento não permitido na expressão: {ast.unparse(no)}")
+
+
+# Analisa e compila o texto de uma expressão em um plano de avaliação.
+# O 'lru_cache' guarda o plano de cada texto, de modo que expressões
+# repetidas não são analisadas novamente.
+# Retorna a função de avaliação e o conjunto de variáveis usadas.
+@lru_cache(maxsize=TAMANHO_CACHE_EXPRESSOES)
+def compilar_expressao(texto):
+
+    if len(texto) > TAMANHO_MAXIMO_EXPRESSAO:
+        raise ValueError(f"A expressão deve ter no máximo {TAMANHO_MAXIMO_EXPRESSAO} caracteres")
+
+    # O próprio analisador do Python pode esgotar a pilha ou a memória
+    # com expressões muito aninhadas; elas também são recusadas.
+    try:
+        arvore = ast.parse(texto, mode="eval")
+    except SyntaxError:
+        raise ValueError("Expressão inválida")
+    except (RecursionError, MemoryError):
+        raise ValueError("Expressão aninhada demais")
+
+    variaveis = set()
+    try:
+        plano = compilar_no(arvore.body, variaveis)
+    except (RecursionError, MemoryError):
+        raise ValueError("Expressão aninhada demais")
+    return plano, frozenset(variaveis)
+
+
+# O decorador '@app.post("/expressao")' cria uma rota POST que avalia
+# uma expressão aritmética inteira no servidor, evitando uma requisição
+# (e uma espera) para cada operação encadeada.
+@app.post("/expressao")
+def calcular_expressao(expressao: Expressao):
+
+    # Obtém o plano compilado da expressão, vindo do cache quando
+    # a mesma expressão já foi usada antes.
+    try:
+        plano, nomes = compilar_expressao(expressao.expressao)
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+
+    # Verifica se todas as variáveis usadas na expressão foram informadas.
+    faltando = nomes - expressao.variaveis.keys()
+    if faltando:
+        raise HTTPException(status_code=400, detail=f"Variável não informada: {', '.join(sorted(faltando))}")
+
+    # Converte os valores das variáveis em arrays NumPy e descobre o
+    # tamanho do lote, se alguma variável foi informada como lista.
+    ambiente = {nome: np.asarray(expressao.variaveis[nome], dtype=np.float64) for nome in nomes}
+    tamanhos = {len(valores) for valores in ambiente.values() if valores.ndim}
+    if len(tamanhos) > 1:
+        raise HTTPException(status_code=400, detail="As listas de valores das variáveis devem ter o mesmo tamanho")
+
+    # Avalia o plano uma única vez; com listas, todos os elementos são
+    # calculados juntos pelas operações vetorizadas do NumPy.
+    valores, erros = plano(ambiente)
+
+    # Sem listas, a resposta tem um único resultado e os números
+    # recusados (ex: divisão por zero) e os resultados infinitos ou NaN
+    # (ex: 1e300 * 1e300) são tratados como nas rotas individuais.
+    if not tamanhos:
+        if erros:
+            raise HTTPException(status_code=400, detail=mensagem_erro(int(erros)))
+        if not np.isfinite(valores):
+            raise HTTPException(status_code=400, detail=MENSAGEM_NAO_FINITO)
+        return {"expressao": expressao.expressao, "resultado": float(valores)}
+
+    # Com listas, a resposta segue o formato da rota '/lote': um resultado
+    # por posição e 'None' com um erro para cada elemento recusado ou
+    # cujo resultado não é finito.
+    tamanho = tamanhos.pop()
+    resultados, erros = separar_erros(np.broadcast_to(valores, (tamanho,)), np.broadcast_to(erros, (tamanho,)))
+
+    return {"expressao": expressao.expressao, "resultados": resultados, "erros": erros}
+
+
+# Calcula a operação pedida em um registro {operacao, numero1, numero2},
+# recebido pelo WebSocket ou pela rota de fluxo, exatamente como as
+# rotas HTTP individuais. Erros são retornados com o código HTTP
+# equivalente em 'erro' e a descrição em 'detail'.
+def calcular_registro(registro):
+
+    # Procura a operação pedida no registro.
+    operacao = REGISTRO_OPERACOES.get(registro.get("operacao"))
+    if operacao is None:
+        return {"erro": 404, "detail": f"Operação desconhecida: {registro.get('operacao')}"}
+
+    # Converte os operandos para float, como o FastAPI faz com
+    # os parâmetros de consulta das rotas HTTP.
+    try:
+        numero1 = float(registro["numero1"])
+        numero2 = float(registro["numero2"])
+    except (KeyError, TypeError, ValueError):
+        return {"erro": 422, "detail": "Os campos 'numero1' e 'numero2' devem ser números"}
+
+    # Executa a operação; os números recusados pela validação (ex:
+    # divisão por zero) levantam a mesma HTTPException das rotas HTTP.
+    try:
+        return calcular_operacao(operacao, numero1, numero2)
+    except HTTPException as erro:
+        return {"erro": erro.status_code, "detail": erro.detail}
+
+
+# Calcula a operação pedida em uma mensagem do WebSocket e retorna a
+# resposta marcada com o mesmo 'id' da mensagem.
+def processar_mensagem(mensagem):
+    return {"id": mensagem.get("id"), **calcular_registro(mensagem)}
+
+
+# O decorador '@app.websocket("/ws")' cria uma rota WebSocket: uma
+# conexão persistente pela qual o cliente envia um fluxo de mensagens
+# {id, operacao, numero1, numero2} sem esperar pelas respostas, e
+# recebe cada resultado marcado com o 'id' da mensagem correspondente.
+# Isso elimina o custo de uma requisição HTTP inteira por operação.
+@app.websocket("/ws")
+async def fluxo_websocket(websocket: WebSocket):
+
+    # Aceita a conexão pedida pelo cliente.
+    await websocket.accept()
+
+    try:
+        while True:
+
+            # Recebe a próxima mensagem. Uma mensagem que não é um objeto
+            # JSON válido recebe um erro, mas a conexão continua aberta.
+            texto = await websocket.receive_text()
+            try:
+                mensagem = json.loads(texto)
+            except ValueError:
+                mensagem = None
+            if not isinstance(mensagem, dict):
+                await websocket.send_json({"id": None, "erro": 422, "detail": "A mensagem deve ser um objeto JSON"})
+                continue
+
+            # Calcula a operação e envia a resposta imediatamente.
+            await websocket.send_json(processar_mensagem(mensagem))
+
+    except WebSocketDisconnect:
+
+        # O cliente fechou a conexão; não há mais nada a fazer.
+        pass
+
+
+# Tamanho máximo, em bytes, de uma linha do fluxo NDJSON. Limita a
+# memória usada por uma linha que nunca termina.
+TAMANHO_MAXIMO_LINHA = 64 * 1024
+
+
+# Define a classe 'RespostaFluxo', uma resposta em fluxo que não fica
+# escutando a desconexão do cliente enquanto envia o corpo. A classe
+# original consome as mensagens recebidas para detectar a desconexão,
+# o que roubaria os pedaços do corpo da requisição que a rota '/fluxo'
+# ainda está lendo enquanto responde.
+class RespostaFluxo(StreamingResponse):
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+# Codifica um objeto como uma linha de JSON terminada em '\n'.
+# Resultados infinitos ou NaN, que não podem ser representados em
+# JSON, são substituídos por um erro.
+def codificar_linha(objeto):
+
+    try:
+        return json.dumps(objeto, ensure_ascii=False, allow_nan=False, separators=(",", ":")) + "\n"
+    except ValueError:
+        return codificar_linha({"erro": 500, "detail": "Resultado não representável em JSON"})
+
+
+# Calcula um registro do fluxo, recebido como uma linha de JSON, e
+# retorna a linha de resposta correspondente, também em JSON.
+def processar_linha(linha):
+
+    try:
+        registro = json.loads(linha)
+    except ValueError:
+        registro = None
+
+    if isinstance(registro, dict):
+        resposta = calcular_registro(registro)
+    else:
+        resposta = {"erro": 422, "detail": "Cada linha deve ser um objeto JSON"}
+
+    return codificar_linha(resposta)
+
+
+# O decorador '@app.post("/fluxo")' cria uma rota para fluxos contínuos
+# de operações no formato NDJSON (um objeto JSON por linha).
+# O corpo da requisição é lido pedaço por pedaço e os resultados são
+# enviados de volta, também em NDJSON e na mesma ordem, à medida que
+# são calculados. Como um novo pedaço só é lido depois que as respostas
+# do anterior foram enviadas, a memória usada é constante e um cliente
+# lento automaticamente desacelera a leitura (contrapressão).
+@app.post("/fluxo")
+async def calcular_fluxo(request: Request):
+
+    async def gerar_respostas():
+
+        # Guarda o final incompleto do pedaço anterior, que é completado
+        # pelo início do pedaço seguinte.
+        restante = b""
+        async for pedaco in request.stream():
+            linhas = (restante + pedaco).split(b"\n")
+            restante = linhas.pop()
+
+            if len(restante) > TAMANHO_MAXIMO_LINHA:
+                yield codificar_linha({"erro": 413, "detail": f"Linha maior que {TAMANHO_MAXIMO_LINHA} bytes"})
+                return
+
+            respostas = [processar_linha(linha) for linha in linhas if linha.strip()]
+            if respostas:
+                yield "".join(respostas)
+
+        # Processa a última linha, caso o corpo não termine com '\n'.
+        if restante.strip():
+            yield processar_linha(restante)
+
+    return RespostaFluxo(gerar_respostas(), media_type="application/x-ndjson")
+
+
+# Inclui na aplicação as rotas do registro de conjuntos de dados, que
+# guardam colunas de números no servidor para operações repetidas sem
+# reenviá-las a cada vez.
+app.include_router(rotas_conjuntos)
+
+# Inclui na aplicação as rotas dos trabalhos assíncronos, que calculam
+# lotes muito grandes em um pool de processos sem prender a requisição.
+app.include_router(rotas_trabalhos)
+
+
+# Operações atendidas pelo caminho rápido, indexadas pelo caminho da
+# rota: o início já codificado da resposta JSON (que só depende da
+# operação) e a operação do registro que calcula o resultado.
+OPERACOES_RAPIDAS = {
+    f"/{operacao.nome}": (
+        ('{"operacao":' + json.dumps(operacao.descricao, ensure_ascii=False) + ',"numero1":').encode(),
+        operacao,
+    )
+    for operacao in REGISTRO_OPERACOES.values()
+}
+
+# Números aceitos pelo caminho rápido na query string: apenas a
+# notação decimal simples (ex: 10, -2.5, 1e3). Qualquer outra forma
+# é deixada para as rotas normais, que a validam como sempre.
+NUMERO_SIMPLES = re.compile(rb"-?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?")
+
+# Cabeçalhos fixos das respostas do caminho rápido, iguais aos
+# enviados pelas rotas normais com cache.
+CABECALHO_CACHE_CONTROL = (b"cache-control", CACHE_CONTROL.encode())
+CABECALHO_TIPO_JSON = (b"content-type", b"application/json")
+
+
+# Define a classe 'CaminhoRapido', um middleware ASGI que atende as
+# requisições GET das rotas de operação ('/soma', '/subtracao', ...)
+# sem passar pelo FastAPI: a query string é lida à mão, a resposta é
+# montada a partir de pedaços já codificados e o resultado é calculado
+# na própria thread do laço de eventos, sem o salto para o pool de threads.
+# As respostas são idênticas, byte a byte, às das rotas normais. Tudo o
+# que foge do caso simples (parâmetros ausentes ou em outro formato,
+# divisão por zero, resultados não finitos, 'If-None-Match') é repassado
+# às rotas normais, que produzem os mesmos erros 400 e 422 de sempre.
+class CaminhoRapido:
+
+    def __init__(self, aplicacao):
+
+        self.aplicacao = aplicacao
+
+        # Rotas normais de cada operação, guardadas para que o middleware
+        # de métricas identifique as requisições atendidas por aqui.
+        self.rotas = {rota.path: rota for rota in rotas_operacoes.routes}
+
+    async def __call__(self, scope, receive, send):
+
+        if scope["type"] == "http" and scope["method"] == "GET" and scope["path"] in OPERACOES_RAPIDAS:
+            corpo = self.montar_corpo(scope)
+            if corpo is not None:
+                scope["route"] = self.rotas.get(scope["path"])
+                etag = gerar_etag(scope["path"], scope["query_string"].decode())
+                await send({
+                    "type": "http.response.start",
+                    "status": 200,
+                    "headers": [
+                        (b"etag", etag.encode()),
+                        CABECALHO_CACHE_CONTROL,
+                        (b"content-length", str(len(corpo)).encode()),
+                        CABECALHO_TIPO_JSON,
+                    ],
+                })
+                await send({"type": "http.response.body", "body": corpo})
+                return
+
+        await self.aplicacao(scope, receive, send)
+
+    # Monta o corpo da resposta de uma requisição simples, ou retorna
+    # 'None' se ela deve seguir para as rotas normais.
+    def montar_corpo(self, scope):
+
+        # Requisições condicionais seguem para as rotas com cache,
+        # que sabem responder 304.
+        for nome, _ in scope["headers"]:
+            if nome == b"if-none-match":
+                return None
+
+        # Lê 'numero1' e 'numero2' da query string. Outros parâmetros,
+        # parâmetros repetidos ou números em outro formato fazem a
+        # requisição seguir para as rotas normais.
+        numeros = {}
+        for parametro in scope["query_string"].split(b"&"):
+            nome, _, valor = parametro.partition(b"=")
+            if nome not in (b"numero1", b"numero2") or nome in numeros or not NUMERO_SIMPLES.fullmatch(valor):
+                return None
+            numeros[nome] = float(valor)
+
+        if len(numeros) != 2:
+            return None
+
+        # Calcula o resultado. Números recusados pela validação da
+        # operação (ex: divisão por zero) e resultados que estouram seguem
+        # para as rotas normais, que produzem o erro adequado.
+        prefixo, operacao = OPERACOES_RAPIDAS[scope["path"]]
+        numero1 = numeros[b"numero1"]
+        numero2 = numeros[b"numero2"]
+        if operacao.invalidos is not None and operacao.invalidos(numero1, numero2):
+            return None
+        try:
+            resultado = operacao.escalar(numero1, numero2)
+        except OverflowError:
+            return None
+        if not (math.isfinite(numero1) and math.isfinite(numero2) and math.isfinite(resultado)):
+            return None
+
+        # 'repr' produz exatamente o mesmo texto que o módulo 'json'
+        # usa para números float.
+        return b"".join((
+            prefixo, repr(numero1).encode(),
+            b',"numero2":', repr(numero2).encode(),
+            b',"resultado":', repr(resultado).encode(), b"}",
+        ))
+
+
+# Adiciona os middlewares da aplicação. O último adicionado é o mais
+# externo, ou seja, o primeiro a receber cada requisição: as métricas
+# envolvem todos os demais, para que as requisições recusadas pelo
+# controle de admissão e as atendidas pelo caminho rápido também sejam
+# medidas, e o controle de admissão envolve o caminho rápido, que
+# também respeita os limites.
+if CAMINHO_RAPIDO:
+    app.add_middleware(CaminhoRapido)
+app.add_middleware(
+    MiddlewareAdmissao, controle=controle_admissao,
+    confiar_prioridade=CONFIAR_PRIORIDADE, confiar_cliente=CONFIAR_CLIENTE,
+)
+app.add_middleware(MiddlewareMetricas, metricas=metricas)
+
+# Em desenvolvimento, um único processo que recarrega ao alterar o código:
+# uvicorn api_operacoes:app --reload
+#
+# Em produção, um processo por núcleo (veja 'servidor_api_operacoes'):
+# python -m servidor_api_operacoes --host 0.0.0.0 --porta 8000
+
+# Acesse a Documentação Interativa:
+# Acesse: http://127.0.0.1:8000/docs
 # http://127.0.0.1:8000/redoc
\ No newline at end of file
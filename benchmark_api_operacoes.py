@@ -0,0 +1,519 @@
+# Suíte de benchmark da API de Operações Matemáticas.
+#
+# Mede a vazão (requisições por segundo) e a latência (p50, p95 e p99)
+# de cada rota, tanto dentro do próprio processo, chamando a aplicação
+# diretamente via ASGI, quanto por HTTP real em loopback, com o servidor
+# uvicorn rodando em outro processo. O WebSocket '/ws' é medido apenas
+# por HTTP real, pois o transporte ASGI do 'httpx' não o suporta. Os
+# resultados podem ser gravados em um arquivo JSON de referência e
+# comparados com execuções futuras; qualquer requisição com erro
+# também faz a comparação falhar.
+#
+# Exemplos:
+#   python benchmark_api_operacoes.py
+#   python benchmark_api_operacoes.py --modos http --concorrencia 64 --salvar-base base.json
+#   python benchmark_api_operacoes.py --comparar-base base.json --tolerancia 0.1
+
+# Importa os módulos da biblioteca padrão usados pela suíte:
+# 'argparse' para a linha de comando, 'asyncio' para manter várias
+# requisições em andamento, 'contextlib' para o ciclo de vida da
+# aplicação no modo 'asgi', 'json' para o arquivo de referência,
+# 'math' para os percentis, 'os', 'socket', 'subprocess' e 'sys' para
+# iniciar o servidor em outro processo e 'time' para medir as durações.
+import argparse
+import asyncio
+import contextlib
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import time
+from array import array
+
+# Importa o 'httpx', cliente HTTP assíncrono capaz de enviar requisições
+# tanto pela rede quanto diretamente para uma aplicação ASGI.
+import httpx
+
+# Número padrão de requisições medidas por cenário, de requisições de
+# aquecimento (descartadas) e de requisições simultâneas.
+REQUISICOES = 2000
+AQUECIMENTO = 100
+CONCORRENCIA = 32
+
+# Quantidade de pares enviados em cada requisição dos cenários de lote
+# e de trabalhos, e de números do conjunto usado no cenário de conjuntos.
+TAMANHO_LOTE = 1000
+TAMANHO_CONJUNTO = 100_000
+
+# Modos de execução: 'asgi' (no próprio processo) e 'http' (loopback).
+MODOS = ("asgi", "http")
+
+# Tolerância padrão na comparação com a referência: uma queda de vazão
+# ou um aumento do p99 acima de 10% é considerado uma regressão.
+TOLERANCIA = 0.10
+
+# Tempo máximo, em segundos, para o servidor uvicorn ficar pronto.
+TEMPO_INICIO_SERVIDOR = 15
+
+# Diretório deste arquivo, onde está o módulo 'api_operacoes'.
+DIRETORIO = os.path.dirname(os.path.abspath(__file__))
+
+
+# Cada cenário é uma função que recebe o número da requisição e
+# retorna o método, o caminho e os argumentos da requisição a enviar
+# (nos cenários WebSocket, a mensagem a enviar).
+# Os números variam a cada requisição para que o cache de resultados
+# do servidor não transforme a medição em uma medição do cache.
+def cenario_operacao(operacao):
+
+    def montar(indice):
+        return "GET", f"/{operacao}", {"params": {"numero1": indice, "numero2": indice % 97 + 1}}
+
+    return montar
+
+
+# Na potência, a base fica próxima de 1 e o expoente é pequeno, para
+# que nenhum resultado estoure e vire um erro 400.
+def montar_potencia(indice):
+    return "GET", "/potencia", {"params": {"numero1": 1 + indice / 1e6, "numero2": indice % 50}}
+
+
+def montar_lote(indice):
+
+    corpo = {
+        "operacao": "divisao",
+        "numero1": [float(indice + i) for i in range(TAMANHO_LOTE)],
+        "numero2": [float(i % 10) for i in range(TAMANHO_LOTE)],
+    }
+    return "POST", "/lote", {"json": corpo}
+
+
+# Corpo do cenário de lote binário: 'numero1' seguido de 'numero2',
+# em float64, montado uma única vez para não medir a sua construção.
+CORPO_LOTE_BINARIO = array("d", [float(i) for i in range(TAMANHO_LOTE)] + [float(i % 10) for i in range(TAMANHO_LOTE)]).tobytes()
+
+
+def montar_lote_binario(indice):
+
+    argumentos = {
+        "params": {"operacao": "divisao"},
+        "content": CORPO_LOTE_BINARIO,
+        "headers": {"Content-Type": "application/octet-stream", "Accept": "application/octet-stream"},
+    }
+    return "POST", "/lote/binario", argumentos
+
+
+def montar_expressao(indice):
+
+    corpo = {"expressao": "(a + b) * c / d", "variaveis": {"a": indice, "b": 2, "c": 3, "d": 4}}
+    return "POST", "/expressao", {"json": corpo}
+
+
+# Corpo do cenário de fluxo: os mesmos pares do lote binário, uma
+# operação por linha em NDJSON, montado uma única vez. A rota '/fluxo'
+# não usa o cache de resultados, então o corpo pode se repetir.
+CORPO_FLUXO = "".join(
+    json.dumps({"operacao": "divisao", "numero1": float(i), "numero2": float(i % 10)}) + "\n"
+    for i in range(TAMANHO_LOTE)
+).encode()
+
+
+def montar_fluxo(indice):
+    return "POST", "/fluxo", {"content": CORPO_FLUXO, "headers": {"Content-Type": "application/x-ndjson"}}
+
+
+# Operação entre o conjunto preparado pelo cenário e um número. O
+# caminho é relativo ao conjunto, enviado por 'medir_conjunto'.
+def montar_operacao_conjunto(indice):
+    return "POST", "/operacoes", {"json": {"operacao": "multiplicacao", "escalar": indice + 1}}
+
+
+# Trabalho assíncrono com os mesmos pares do cenário de lote. A medição
+# vai do envio até o fim do trabalho, acompanhado por '/eventos'.
+def montar_trabalho(indice):
+
+    corpo = {
+        "operacao": "divisao",
+        "numero1": [float(indice + i) for i in range(TAMANHO_LOTE)],
+        "numero2": [float(i % 10) for i in range(TAMANHO_LOTE)],
+    }
+    return "POST", "/trabalhos", {"json": corpo}
+
+
+# Mensagem do cenário WebSocket: uma operação por mensagem, com
+# resposta aguardada antes da próxima mensagem da mesma conexão.
+def montar_mensagem_ws(indice):
+    return {"id": indice, "operacao": "soma", "numero1": indice, "numero2": indice % 97 + 1}
+
+
+# Cenários disponíveis, na ordem em que são executados.
+CENARIOS = {
+    "soma": cenario_operacao("soma"),
+    "subtracao": cenario_operacao("subtracao"),
+    "multiplicacao": cenario_operacao("multiplicacao"),
+    "divisao": cenario_operacao("divisao"),
+    "potencia": montar_potencia,
+    "modulo": cenario_operacao("modulo"),
+    "lote": montar_lote,
+    "lote_binario": montar_lote_binario,
+    "fluxo": montar_fluxo,
+    "expressao": montar_expressao,
+    "conjunto": montar_operacao_conjunto,
+    "trabalho": montar_trabalho,
+    "ws": montar_mensagem_ws,
+}
+
+# Cenários enviados pela rota WebSocket '/ws' em vez de HTTP.
+CENARIOS_WEBSOCKET = {"ws"}
+
+
+# Calcula o percentil 'p' (entre 0 e 1) de uma lista já ordenada.
+def percentil(valores_ordenados, p):
+
+    if not valores_ordenados:
+        return 0.0
+
+    indice = max(math.ceil(p * len(valores_ordenados)) - 1, 0)
+    return valores_ordenados[indice]
+
+
+# Executa um cenário e retorna as medições. 'enviar' recebe o que o
+# cenário montou e retorna se a requisição teve sucesso.
+# 'concorrencia' tarefas retiram números de requisição de um contador
+# compartilhado até que todas as requisições tenham sido enviadas.
+async def medir(enviar, montar, requisicoes, concorrencia, aquecimento):
+
+    # Envia as requisições de aquecimento, cujos tempos são descartados,
+    # para que conexões e caches internos já estejam prontos. Elas usam
+    # números depois dos medidos, para que as requisições medidas não
+    # encontrem os seus resultados já no cache do servidor.
+    for indice in range(requisicoes, requisicoes + aquecimento):
+        await enviar(montar(indice))
+
+    latencias = []
+    erros = 0
+    proximo = iter(range(requisicoes))
+
+    async def trabalhador():
+        nonlocal erros
+        for indice in proximo:
+            requisicao = montar(indice)
+            inicio = time.perf_counter()
+            if not await enviar(requisicao):
+                erros += 1
+            latencias.append(time.perf_counter() - inicio)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(trabalhador() for _ in range(concorrencia)))
+    duracao = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        "requisicoes": requisicoes,
+        "concorrencia": concorrencia,
+        "erros": erros,
+        "req_s": requisicoes / duracao,
+        "p50_ms": percentil(latencias, 0.50) * 1000,
+        "p95_ms": percentil(latencias, 0.95) * 1000,
+        "p99_ms": percentil(latencias, 0.99) * 1000,
+    }
+
+
+# Retorna a função de envio das requisições HTTP pelo cliente 'httpx'.
+# Só as respostas 200 contam como sucesso.
+def enviador_http(cliente):
+
+    async def enviar(requisicao):
+        metodo, caminho, argumentos = requisicao
+        try:
+            resposta = await cliente.request(metodo, caminho, **argumentos)
+        except httpx.HTTPError:
+            return False
+        return resposta.status_code == 200
+
+    return enviar
+
+
+# Executa o cenário de conjuntos: envia um conjunto de
+# 'TAMANHO_CONJUNTO' números e mede as operações sobre ele. Os conjuntos
+# de resultado e o conjunto enviado são apagados ao final.
+async def medir_conjunto(cliente, url_base, montar, requisicoes, concorrencia, aquecimento):
+
+    corpo = array("d", [float(i) for i in range(TAMANHO_CONJUNTO)])
+    if sys.byteorder == "big":
+        corpo.byteswap()
+    resposta = await cliente.post("/conjuntos", content=corpo.tobytes(),
+                                  headers={"Content-Type": "application/octet-stream"})
+    resposta.raise_for_status()
+    prefixo = f"/conjuntos/{resposta.json()['id']}"
+    criados = [prefixo]
+
+    async def enviar(requisicao):
+        metodo, caminho, argumentos = requisicao
+        try:
+            resposta = await cliente.request(metodo, prefixo + caminho, **argumentos)
+        except httpx.HTTPError:
+            return False
+        if resposta.status_code != 201:
+            return False
+        criados.append(f"/conjuntos/{resposta.json()['id']}")
+        return True
+
+    try:
+        return await medir(enviar, montar, requisicoes, concorrencia, aquecimento)
+    finally:
+        for caminho in criados:
+            await cliente.delete(caminho)
+
+
+# Executa o cenário de trabalhos: cada envio cria um trabalho e
+# acompanha os seus eventos até o fim; apenas os trabalhos concluídos
+# contam como sucesso. Os trabalhos são descartados ao final.
+async def medir_trabalho(cliente, url_base, montar, requisicoes, concorrencia, aquecimento):
+
+    criados = []
+
+    async def enviar(requisicao):
+        metodo, caminho, argumentos = requisicao
+        try:
+            resposta = await cliente.request(metodo, caminho, **argumentos)
+            if resposta.status_code != 202:
+                return False
+            criados.append(resposta.headers["Location"])
+
+            estado = None
+            async with cliente.stream("GET", resposta.headers["Location"] + "/eventos") as eventos:
+                fim = False
+                async for linha in eventos.aiter_lines():
+                    if linha == "event: fim":
+                        fim = True
+                    elif fim and linha.startswith("data: "):
+                        estado = json.loads(linha[len("data: "):])["estado"]
+                        break
+        except httpx.HTTPError:
+            return False
+        return estado == "concluido"
+
+    try:
+        return await medir(enviar, montar, requisicoes, concorrencia, aquecimento)
+    finally:
+        for caminho in criados:
+            await cliente.delete(caminho)
+
+
+# Executa um cenário pela rota WebSocket '/ws', com uma conexão por
+# requisição simultânea. Cada envio usa uma conexão livre, manda uma
+# mensagem e aguarda a resposta; respostas com 'erro' contam como erros.
+# O 'websockets' só é necessário para este cenário.
+async def medir_websocket(cliente, url_base, montar, requisicoes, concorrencia, aquecimento):
+
+    from websockets import connect
+    from websockets.exceptions import ConnectionClosed
+
+    url = url_base.replace("http", "ws", 1) + "/ws"
+    conexoes = [await connect(url) for _ in range(concorrencia)]
+    livres = asyncio.Queue()
+    for conexao in conexoes:
+        livres.put_nowait(conexao)
+
+    async def enviar(mensagem):
+        conexao = await livres.get()
+        try:
+            await conexao.send(json.dumps(mensagem))
+            resposta = json.loads(await conexao.recv())
+        except (ConnectionClosed, OSError):
+            return False
+        finally:
+            livres.put_nowait(conexao)
+        return "erro" not in resposta
+
+    try:
+        return await medir(enviar, montar, requisicoes, concorrencia, aquecimento)
+    finally:
+        for conexao in conexoes:
+            await conexao.close()
+
+
+# Cenários medidos por funções próprias, por precisarem de preparação
+# ou de outro protocolo. Os demais são medidos por 'medir' com o
+# 'enviador_http'.
+MEDICOES_PROPRIAS = {
+    "conjunto": medir_conjunto,
+    "trabalho": medir_trabalho,
+    "ws": medir_websocket,
+}
+
+
+# Encontra uma porta TCP livre no computador para o servidor de teste.
+def porta_livre():
+
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Inicia o servidor uvicorn em outro processo e aguarda até que ele
+# responda na rota raiz. Retorna o processo e a URL base do servidor.
+def iniciar_servidor():
+
+    porta = porta_livre()
+    processo = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api_operacoes:app", "--port", str(porta), "--log-level", "warning"],
+        cwd=DIRETORIO,
+    )
+    url_base = f"http://127.0.0.1:{porta}"
+
+    prazo = time.monotonic() + TEMPO_INICIO_SERVIDOR
+    while time.monotonic() < prazo:
+        try:
+            if httpx.get(url_base + "/").status_code == 200:
+                return processo, url_base
+        except httpx.HTTPError:
+            time.sleep(0.1)
+
+    processo.terminate()
+    raise RuntimeError("O servidor uvicorn não ficou pronto a tempo")
+
+
+# Executa os cenários escolhidos em um modo ('asgi' ou 'http') e
+# retorna as medições indexadas por "modo/cenário".
+async def executar_modo(modo, cenarios, requisicoes, concorrencia, aquecimento, url_base):
+
+    # No modo 'asgi', as requisições vão direto para a aplicação,
+    # sem rede, medindo apenas o custo do próprio servidor. O ciclo de
+    # vida da aplicação é executado aqui, como o uvicorn faria, para
+    # que o pool de processos dos trabalhos seja encerrado ao final.
+    ciclo_de_vida = contextlib.nullcontext()
+    if modo == "asgi":
+        from api_operacoes import app
+        transporte = httpx.ASGITransport(app=app)
+        ciclo_de_vida = app.router.lifespan_context(app)
+        url_base = "http://asgi"
+    else:
+        transporte = None
+
+    limites = httpx.Limits(max_connections=concorrencia, max_keepalive_connections=concorrencia)
+    resultados = {}
+    async with ciclo_de_vida, httpx.AsyncClient(base_url=url_base, transport=transporte, limits=limites) as cliente:
+        for nome in cenarios:
+            if nome in CENARIOS_WEBSOCKET and modo == "asgi":
+                print(f"{modo}/{nome:<19} ignorado: o transporte ASGI do 'httpx' não suporta WebSocket")
+                continue
+            if nome in MEDICOES_PROPRIAS:
+                medicao = await MEDICOES_PROPRIAS[nome](
+                    cliente, url_base, CENARIOS[nome], requisicoes, concorrencia, aquecimento,
+                )
+            else:
+                medicao = await medir(enviador_http(cliente), CENARIOS[nome], requisicoes, concorrencia, aquecimento)
+            resultados[f"{modo}/{nome}"] = medicao
+            imprimir_medicao(f"{modo}/{nome}", medicao)
+
+    return resultados
+
+
+# Imprime uma linha com as medições de um cenário.
+def imprimir_medicao(nome, medicao):
+
+    print(
+        f"{nome:<24} {medicao['req_s']:>10.1f} req/s"
+        f"   p50 {medicao['p50_ms']:>8.2f} ms"
+        f"   p95 {medicao['p95_ms']:>8.2f} ms"
+        f"   p99 {medicao['p99_ms']:>8.2f} ms"
+        f"   erros {medicao['erros']}"
+    )
+
+
+# Compara as medições atuais com as da referência e retorna a lista de
+# regressões: requisições com erro, mesmo em cenários sem referência,
+# e vazão menor ou p99 maior que a referência além da tolerância.
+def comparar(resultados, referencia, tolerancia):
+
+    regressoes = []
+    for nome, medicao in resultados.items():
+        if medicao["erros"]:
+            regressoes.append(f"{nome}: {medicao['erros']} de {medicao['requisicoes']} requisições com erro")
+
+        base = referencia.get(nome)
+        if base is None:
+            continue
+
+        if medicao["req_s"] < base["req_s"] * (1 - tolerancia):
+            regressoes.append(f"{nome}: vazão caiu de {base['req_s']:.1f} para {medicao['req_s']:.1f} req/s")
+
+        if medicao["p99_ms"] > base["p99_ms"] * (1 + tolerancia):
+            regressoes.append(f"{nome}: p99 subiu de {base['p99_ms']:.2f} para {medicao['p99_ms']:.2f} ms")
+
+    return regressoes
+
+
+# Lê os argumentos da linha de comando.
+def ler_argumentos():
+
+    parser = argparse.ArgumentParser(description="Benchmark da API de Operações Matemáticas")
+    parser.add_argument("--modos", nargs="+", choices=MODOS, default=list(MODOS),
+                        help="modos de execução: 'asgi' (no próprio processo) e 'http' (loopback)")
+    parser.add_argument("--cenarios", default=",".join(CENARIOS),
+                        help=f"cenários separados por vírgula (disponíveis: {', '.join(CENARIOS)})")
+    parser.add_argument("--requisicoes", type=int, default=REQUISICOES, help="requisições medidas por cenário")
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA, help="requisições simultâneas")
+    parser.add_argument("--aquecimento", type=int, default=AQUECIMENTO, help="requisições de aquecimento por cenário")
+    parser.add_argument("--url", help="URL de um servidor já em execução para o modo 'http'")
+    parser.add_argument("--salvar-base", metavar="ARQUIVO", help="grava as medições como referência neste arquivo JSON")
+    parser.add_argument("--comparar-base", metavar="ARQUIVO", help="compara as medições com a referência deste arquivo JSON")
+    parser.add_argument("--tolerancia", type=float, default=TOLERANCIA, help="piora máxima aceita na comparação (0.1 = 10%%)")
+    return parser.parse_args()
+
+
+def main():
+
+    argumentos = ler_argumentos()
+    modos = argumentos.modos
+    cenarios = argumentos.cenarios.split(",")
+
+    desconhecidos = set(cenarios) - CENARIOS.keys()
+    if desconhecidos:
+        sys.exit(f"Cenário desconhecido: {', '.join(sorted(desconhecidos))}")
+
+    resultados = {}
+    for modo in modos:
+
+        # No modo 'http', usa o servidor informado em '--url' ou inicia
+        # um servidor uvicorn próprio, encerrado ao final do modo.
+        processo = None
+        url_base = argumentos.url
+        if modo == "http" and url_base is None:
+            processo, url_base = iniciar_servidor()
+
+        try:
+            resultados.update(asyncio.run(executar_modo(
+                modo, cenarios, argumentos.requisicoes, argumentos.concorrencia, argumentos.aquecimento, url_base,
+            )))
+        finally:
+            if processo is not None:
+                processo.terminate()
+                processo.wait()
+
+    # Grava as medições como nova referência, se pedido.
+    if argumentos.salvar_base:
+        with open(argumentos.salvar_base, "w", encoding="utf-8") as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+
+    # Compara com a referência, se pedido, e termina com código de
+    # saída 1 quando houver regressões, para falhar pipelines de CI.
+    if argumentos.comparar_base:
+        with open(argumentos.comparar_base, encoding="utf-8") as arquivo:
+            referencia = json.load(arquivo)
+
+        regressoes = comparar(resultados, referencia, argumentos.tolerancia)
+        for regressao in regressoes:
+            print("REGRESSÃO:", regressao)
+        if regressoes:
+            sys.exit(1)
+        print("Nenhuma regressão em relação à referência.")
+
+
+# Executa a suíte apenas quando o arquivo é executado diretamente.
+if __name__ == "__main__":
+    main()
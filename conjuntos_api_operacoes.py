@@ -0,0 +1,309 @@
+# Registro de conjuntos de dados da API de Operações Matemáticas.
+#
+# Um conjunto é uma coluna de números enviada uma única vez e guardada
+# no servidor como um arquivo de float64 little-endian ('<id>.f64'),
+# lido por mapeamento em memória. As operações entre conjuntos (ou
+# entre um conjunto e um número) e as reduções (soma, média, ...) são
+# calculadas em blocos sobre os arquivos mapeados, de modo que conjuntos
+# maiores que a memória funcionam e nada é copiado sem necessidade.
+# As rotas ficam no roteador 'rotas_conjuntos', incluído pela aplicação
+# em 'api_operacoes'.
+
+# Importa os módulos usados pelo registro: 'os' e 'tempfile' para o
+# diretório dos arquivos, 're' para validar os identificadores e
+# 'uuid' para gerá-los.
+import os
+import re
+import tempfile
+import uuid
+
+# Importa o NumPy, que mapeia os arquivos em memória e faz os cálculos.
+import numpy as np
+
+# Importa as classes do FastAPI usadas pelas rotas e o modelo do
+# corpo JSON das operações.
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+
+# Importa o registro das operações e o cálculo vetorizado, os mesmos
+# usados pelas rotas de lote.
+from registro_api_operacoes import REGISTRO_OPERACOES, calcular_vetorizado
+
+# Importa o tipo de rota que informa as fases de cada requisição no
+# cabeçalho 'Server-Timing'.
+from tempos_api_operacoes import RotaComTempos
+
+# Diretório onde os conjuntos são guardados, configurável pela variável
+# de ambiente 'API_OPERACOES_DIRETORIO_CONJUNTOS'. Vários processos do
+# servidor podem compartilhar o mesmo diretório.
+DIRETORIO_CONJUNTOS = os.environ.get(
+    "API_OPERACOES_DIRETORIO_CONJUNTOS", os.path.join(tempfile.gettempdir(), "api_operacoes_conjuntos"),
+)
+
+# Número de elementos calculados de cada vez (8 MiB de float64 por bloco).
+# Só os blocos em uso ficam na memória, não o conjunto inteiro.
+ELEMENTOS_POR_BLOCO = 1 << 20
+
+# Tamanho, em bytes, de cada elemento de um conjunto (float64).
+TAMANHO_ELEMENTO = 8
+
+# Tamanho máximo, em bytes, do corpo de um conjunto enviado, configurável
+# pela variável de ambiente 'API_OPERACOES_TAMANHO_MAXIMO_CONJUNTO'
+# (1 GiB por padrão). Corpos maiores recebem 413, e o arquivo parcial
+# é apagado, para que uma requisição não encha o disco.
+TAMANHO_MAXIMO_CONJUNTO = int(os.environ.get("API_OPERACOES_TAMANHO_MAXIMO_CONJUNTO", 1 << 30))
+
+# Formato dos identificadores dos conjuntos (um UUID em hexadecimal).
+# Validá-los impede que um identificador aponte para fora do diretório.
+FORMATO_ID = re.compile(r"[0-9a-f]{32}")
+
+# Cria o roteador das rotas de conjuntos.
+rotas_conjuntos = APIRouter(prefix="/conjuntos", route_class=RotaComTempos)
+
+
+# Modelo do corpo JSON da rota de operações entre conjuntos.
+# 'operacao' é o nome de uma operação registrada, e o segundo operando
+# é outro conjunto ('conjunto') ou um número ('escalar').
+class OperacaoConjunto(BaseModel):
+    operacao: str
+    conjunto: str | None = None
+    escalar: float | None = None
+
+
+# Retorna o caminho do arquivo de um conjunto, levantando 404 se o
+# identificador for inválido ou o conjunto não existir.
+def caminho_conjunto(id_conjunto):
+
+    caminho = os.path.join(DIRETORIO_CONJUNTOS, f"{id_conjunto}.f64")
+    if not FORMATO_ID.fullmatch(id_conjunto) or not os.path.exists(caminho):
+        raise HTTPException(status_code=404, detail=f"Conjunto não encontrado: {id_conjunto}")
+    return caminho
+
+
+# Retorna um novo identificador e o caminho temporário onde o arquivo
+# do conjunto é escrito. Só quando completo ele recebe o nome final,
+# para que um conjunto incompleto nunca seja lido.
+def novo_conjunto():
+
+    os.makedirs(DIRETORIO_CONJUNTOS, exist_ok=True)
+    id_conjunto = uuid.uuid4().hex
+    return id_conjunto, os.path.join(DIRETORIO_CONJUNTOS, f"{id_conjunto}.f64.parcial")
+
+
+# Descreve um conjunto: o identificador e o número de elementos.
+def descrever(id_conjunto, caminho):
+    return {"id": id_conjunto, "tamanho": os.path.getsize(caminho) // TAMANHO_ELEMENTO}
+
+
+# Mapeia o arquivo de um conjunto em memória, sem lê-lo. Arquivos vazios
+# não podem ser mapeados e viram um array vazio.
+def mapear(caminho, modo="r", tamanho=None):
+
+    if tamanho is None:
+        tamanho = os.path.getsize(caminho) // TAMANHO_ELEMENTO
+    if tamanho == 0:
+        open(caminho, "ab").close()
+        return np.empty(0, dtype="<f8")
+    return np.memmap(caminho, dtype="<f8", mode=modo, shape=(tamanho,))
+
+
+# O decorador '@rotas_conjuntos.post("")' cria a rota que recebe um
+# conjunto: o corpo ('application/octet-stream') contém os números em
+# float64 little-endian, o mesmo formato da rota '/lote/binario'. O
+# corpo é gravado no arquivo à medida que chega, sem ser guardado
+# inteiro na memória. As escritas no disco são feitas no pool de
+# threads, para não bloquear o loop de eventos durante envios grandes.
+@rotas_conjuntos.post("", status_code=201)
+async def enviar_conjunto(request: Request):
+
+    if request.headers.get("content-type", "").split(";")[0].strip() != "application/octet-stream":
+        raise HTTPException(status_code=415, detail="O corpo deve ser do tipo 'application/octet-stream'")
+
+    # Recusa logo os corpos que declaram um tamanho acima do máximo;
+    # os demais são conferidos enquanto chegam.
+    excedido = HTTPException(status_code=413, detail=f"O conjunto deve ter no máximo {TAMANHO_MAXIMO_CONJUNTO} bytes")
+    declarado = request.headers.get("content-length", "")
+    if declarado.isdigit() and int(declarado) > TAMANHO_MAXIMO_CONJUNTO:
+        raise excedido
+
+    id_conjunto, temporario = novo_conjunto()
+    try:
+        arquivo = await run_in_threadpool(open, temporario, "wb")
+        try:
+            tamanho = 0
+            async for pedaco in request.stream():
+                tamanho += len(pedaco)
+                if tamanho > TAMANHO_MAXIMO_CONJUNTO:
+                    raise excedido
+                await run_in_threadpool(arquivo.write, pedaco)
+        finally:
+            await run_in_threadpool(arquivo.close)
+
+        if tamanho % TAMANHO_ELEMENTO:
+            raise HTTPException(status_code=400, detail="O corpo deve conter números float64 (8 bytes cada)")
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+    caminho = temporario.removesuffix(".parcial")
+    os.replace(temporario, caminho)
+    return descrever(id_conjunto, caminho)
+
+
+# Lista os conjuntos guardados.
+@rotas_conjuntos.get("")
+def listar_conjuntos():
+
+    conjuntos = []
+    if os.path.isdir(DIRETORIO_CONJUNTOS):
+        for nome in sorted(os.listdir(DIRETORIO_CONJUNTOS)):
+            id_conjunto, extensao = os.path.splitext(nome)
+            if extensao == ".f64" and FORMATO_ID.fullmatch(id_conjunto):
+                conjuntos.append(descrever(id_conjunto, os.path.join(DIRETORIO_CONJUNTOS, nome)))
+
+    return {"conjuntos": conjuntos}
+
+
+# Descreve um conjunto.
+@rotas_conjuntos.get("/{id_conjunto}")
+def obter_conjunto(id_conjunto: str):
+    return descrever(id_conjunto, caminho_conjunto(id_conjunto))
+
+
+# Retorna os números de um conjunto, em float64 little-endian. O arquivo
+# é enviado diretamente do disco, em pedaços.
+@rotas_conjuntos.get("/{id_conjunto}/dados")
+def baixar_conjunto(id_conjunto: str):
+    return FileResponse(caminho_conjunto(id_conjunto), media_type="application/octet-stream")
+
+
+# Apaga um conjunto.
+@rotas_conjuntos.delete("/{id_conjunto}", status_code=204)
+def apagar_conjunto(id_conjunto: str):
+
+    os.remove(caminho_conjunto(id_conjunto))
+    return Response(status_code=204)
+
+
+# Aplica uma operação registrada a um conjunto e a outro conjunto (do
+# mesmo tamanho) ou a um número, gravando o resultado em um novo
+# conjunto. Os elementos sem resultado (ex: divisões por zero) ficam
+# com NaN e são contados em 'quantidade_erros'.
+# Como a rota é síncrona, o FastAPI a executa no pool de threads, e o
+# cálculo em blocos não bloqueia as demais requisições.
+@rotas_conjuntos.post("/{id_conjunto}/operacoes", status_code=201)
+def operar_conjunto(id_conjunto: str, corpo: OperacaoConjunto):
+
+    if corpo.operacao not in REGISTRO_OPERACOES:
+        raise HTTPException(status_code=400, detail=f"Operação desconhecida: {corpo.operacao}")
+    if (corpo.conjunto is None) == (corpo.escalar is None):
+        raise HTTPException(status_code=400, detail="Informe exatamente um entre 'conjunto' e 'escalar'")
+
+    # O primeiro operando é sempre um conjunto; o segundo é outro
+    # conjunto ou um número, expandido para cada bloco pelo NumPy.
+    numero1 = mapear(caminho_conjunto(id_conjunto))
+    if corpo.conjunto is not None:
+        numero2 = mapear(caminho_conjunto(corpo.conjunto))
+        if len(numero2) != len(numero1):
+            raise HTTPException(status_code=400, detail="Os conjuntos devem ter o mesmo tamanho")
+    else:
+        numero2 = None
+        escalar = np.float64(corpo.escalar)
+
+    # Calcula bloco a bloco, escrevendo os resultados diretamente no
+    # arquivo do novo conjunto, também mapeado em memória.
+    id_resultado, temporario = novo_conjunto()
+    try:
+        resultados = mapear(temporario, "w+", len(numero1))
+        quantidade_erros = 0
+        for inicio in range(0, len(numero1), ELEMENTOS_POR_BLOCO):
+            fim = inicio + ELEMENTOS_POR_BLOCO
+            bloco = numero1[inicio:fim]
+            segundo = numero2[inicio:fim] if numero2 is not None else np.broadcast_to(escalar, bloco.shape)
+            destino = resultados[inicio:fim]
+            _, erros = calcular_vetorizado(corpo.operacao, bloco, segundo, destino)
+            invalidos = erros != 0
+            destino[invalidos] = np.nan
+            quantidade_erros += int(np.count_nonzero(invalidos))
+
+        if isinstance(resultados, np.memmap):
+            resultados.flush()
+        del resultados
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+    caminho = temporario.removesuffix(".parcial")
+    os.replace(temporario, caminho)
+    return {**descrever(id_resultado, caminho), "quantidade_erros": quantidade_erros}
+
+
+# Calcula as reduções de um conjunto em blocos: quantidade de números,
+# quantidade de NaN (elementos sem resultado), quantidade de infinitos,
+# soma, média, mínimo, máximo e desvio padrão. Os NaN e os infinitos são
+# ignorados em todas as reduções, e uma redução que ainda assim estoure
+# (a soma de números muito grandes, por exemplo) fica nula.
+# A média e o desvio padrão são combinados bloco a bloco pelo método de
+# Chan, que evita a perda de precisão de somar os quadrados.
+@rotas_conjuntos.get("/{id_conjunto}/reducoes")
+def reduzir_conjunto(id_conjunto: str):
+
+    valores = mapear(caminho_conjunto(id_conjunto))
+
+    quantidade = 0
+    quantidade_nan = 0
+    quantidade_infinitos = 0
+    soma = 0.0
+    media = 0.0
+    m2 = 0.0
+    minimo = np.inf
+    maximo = -np.inf
+    for inicio in range(0, len(valores), ELEMENTOS_POR_BLOCO):
+        bloco = valores[inicio:inicio + ELEMENTOS_POR_BLOCO]
+        nan = np.isnan(bloco)
+        finitos = np.isfinite(bloco)
+        validos = bloco[finitos]
+        quantidade_nan += int(np.count_nonzero(nan))
+        quantidade_infinitos += len(bloco) - len(validos) - int(np.count_nonzero(nan))
+        if not len(validos):
+            continue
+
+        n = len(validos)
+        with np.errstate(over="ignore", invalid="ignore"):
+            media_bloco = float(validos.mean())
+            m2_bloco = float(np.square(validos - media_bloco).sum())
+            soma_bloco = float(validos.sum())
+        delta = media_bloco - media
+        total = quantidade + n
+        media += delta * n / total
+        m2 += m2_bloco + delta * delta * quantidade * n / total
+        quantidade = total
+        soma += soma_bloco
+        minimo = min(minimo, float(validos.min()))
+        maximo = max(maximo, float(validos.max()))
+
+    # Sem nenhum número válido, as reduções que dependem dos valores
+    # ficam nulas (null no JSON).
+    if not quantidade:
+        return {"id": id_conjunto, "quantidade": 0, "quantidade_nan": quantidade_nan,
+                "quantidade_infinitos": quantidade_infinitos, "soma": 0.0,
+                "media": None, "minimo": None, "maximo": None, "desvio_padrao": None}
+
+    # Soma, média e desvio padrão podem estourar mesmo com números
+    # finitos; nesse caso viram null, já que o JSON não tem infinitos.
+    def finito(valor):
+        return valor if np.isfinite(valor) else None
+
+    return {
+        "id": id_conjunto,
+        "quantidade": quantidade,
+        "quantidade_nan": quantidade_nan,
+        "quantidade_infinitos": quantidade_infinitos,
+        "soma": finito(soma),
+        "media": finito(media),
+        "minimo": minimo,
+        "maximo": maximo,
+        "desvio_padrao": finito((m2 / quantidade) ** 0.5),
+    }
@@ -1,254 +1,1918 @@
-# Importa o módulo 'requests', que é uma biblioteca Python
-# para fazer requisições HTTP.
-# Este módulo facilita enviar requisições para APIs e
-# receber respostas através da internet.
-import requests
-
-# Define uma constante 'URL_BASE' que armazena a URL base
-# da API que você está usando.
-# Essa URL é o endereço base no qual a API está hospedada.
-# Neste caso, 'http://127.0.0.1:8000' indica que a API está
-# rodando localmente no seu computador na porta 8000.
-URL_BASE = "http://127.0.0.1:8000"
-
-
-# Define uma função chamada 'consumir_soma' que é usada para realizar a
-# operação de soma através da API.
-# A função recebe dois parâmetros: 'numero1' e 'numero2', que
-# são os números que você deseja somar.
-def consumir_soma(numero1, numero2):
-
-    # Constrói a URL completa para acessar o endpoint específico
-    # da API que realiza a soma.
-    # 'f"{URL_BASE}/soma"' usa formatação de string para
-    # adicionar '/soma' ao final da URL base.
-    url = f"{URL_BASE}/soma"
-
-    # Cria um dicionário chamado 'parametros' que contém os
-    # parâmetros a serem enviados para a API.
-    # Neste caso, os parâmetros são 'numero1' e 'numero2'.
-    # Os parâmetros são passados à API através da URL para
-    # especificar os números a serem somados.
-    parametros = {"numero1": numero1, "numero2": numero2}
-
-    # Faz uma requisição GET à URL construída, passando os parâmetros.
-    # 'requests.get()' é a função que envia a requisição HTTP GET
-    # ao servidor da API.
-    # O argumento 'params=parametros' indica que os parâmetros
-    # definidos devem ser enviados junto com a requisição.
-    resposta = requests.get(url, params=parametros)
-
-    # Verifica se o código de status da resposta é 200, o que
-    # indica sucesso na operação HTTP.
-    # O código de status 200 significa que a requisição foi bem-sucedida e
-    # a API retornou uma resposta válida.
-    if resposta.status_code == 200:
-
-        # 'resposta.json()' converte a resposta JSON recebida
-        # da API em um dicionário Python.
-        # Retorna esse dicionário, que deve incluir o resultado da soma.
-        return resposta.json()
-
-    else:
-
-        # Se o código de status não for 200, retorna um dicionário
-        # contendo o código de erro e a mensagem de erro.
-        # 'resposta.status_code' contém o código de status HTTP da
-        # resposta (ex., 404, 500).
-        # 'resposta.text' contém o corpo da resposta como texto, que
-        # geralmente inclui uma mensagem de erro.
-        return {"erro": resposta.status_code, "mensagem": resposta.text}
-
-
-# Define uma função chamada 'consumir_subtracao' para interagir com
-# uma API que realiza operações de subtração.
-# Esta função é projetada para enviar dois números à API e
-# receber o resultado da subtração desses números.
-# Os parâmetros 'numero1' e 'numero2' são os números que
-# serão subtraídos, respectivamente.
-def consumir_subtracao(numero1, numero2):
-
-    # Constrói a URL para acessar o endpoint de subtração na API.
-    # Utiliza a variável 'URL_BASE', que contém a URL base da API, e
-    # adiciona '/subtracao' ao final.
-    # Isso especifica o caminho no servidor da API que é configurado
-    # para aceitar requisições de subtração.
-    url = f"{URL_BASE}/subtracao"
-
-    # Cria um dicionário chamado 'parametros' que mapeia os nomes
-    # dos parâmetros esperados pela API aos valores que
-    # queremos passar. Aqui, 'numero1' e 'numero2'
-    # são as chaves do dicionário, e os valores são os
-    # números fornecidos à função. Esses parâmetros serão
-    # enviados na URL da requisição.
-    parametros = {"numero1": numero1, "numero2": numero2}
-
-    # Envia uma requisição GET para a URL especificada, incluindo os
-    # parâmetros definidos.
-    # 'requests.get()' é o método utilizado para realizar a requisição HTTP GET.
-    # A função retorna um objeto de resposta que inclui todas as
-    # informações retornadas pela API.
-    resposta = requests.get(url, params=parametros)
-
-    # Verifica se o código de status HTTP da resposta é 200, indicando sucesso.
-    # O código de status 200 é padrão para indicar que a requisição foi
-    # bem-sucedida e que a API processou a operação sem erros.
-    if resposta.status_code == 200:
-
-        # Converte a resposta da API, que é um JSON, para um dicionário
-        # Python usando o método 'json()'.
-        # Esse dicionário contém o resultado da subtração e qualquer
-        # outra informação adicional fornecida pela API.
-        return resposta.json()
-
-    else:
-
-        # Se o código de status não for 200, significa que ocorreu
-        # algum erro com a requisição.
-        # Neste caso, a função retorna um dicionário contendo o código
-        # de erro e uma mensagem de erro.
-        # 'resposta.status_code' fornece o código de erro HTTP (ex., 404
-        # para "Não encontrado", 500 para "Erro interno do servidor", etc.).
-        # 'resposta.text' contém a resposta completa em texto, que pode
-        # incluir detalhes sobre o que deu errado.
-        return {"erro": resposta.status_code, "mensagem": resposta.text}
-
-
-# Define uma função chamada 'consumir_multiplicacao' para solicitar
-# uma operação de multiplicação de uma API.
-# Esta função aceita dois argumentos, 'numero1' e 'numero2', que
-# são os números a serem multiplicados.
-def consumir_multiplicacao(numero1, numero2):
-
-    # Monta a URL para o endpoint de multiplicação na API.
-    # A variável 'URL_BASE' contém a URL base da API, e '/multiplicacao' é
-    # o caminho específico no servidor da API que trata as
-    # requisições de multiplicação.
-    url = f"{URL_BASE}/multiplicacao"
-
-    # Cria um dicionário chamado 'parametros' que mapeia os nomes
-    # dos parâmetros da API ('numero1' e 'numero2')
-    # para os valores que serão passados para a API, que
-    # são os números que queremos multiplicar.
-    parametros = {"numero1": numero1, "numero2": numero2}
-
-    # Faz uma requisição GET ao servidor da API utilizando a URL
-    # especificada e passando os parâmetros.
-    # O método 'requests.get()' é utilizado para enviar a requisição e
-    # espera-se que a API responda com uma resposta.
-    resposta = requests.get(url, params=parametros)
-
-    # Checa o código de status HTTP da resposta para ver se a
-    # requisição foi bem-sucedida.
-    # O código '200' indica que a requisição foi bem-sucedida e a
-    # resposta contém o resultado esperado.
-    if resposta.status_code == 200:
-
-        # Se o código de status é 200, a resposta da API é convertida
-        # de JSON para um dicionário Python usando 'resposta.json()'.
-        # Isso torna mais fácil acessar o resultado da multiplicação e
-        # outras informações retornadas pela API.
-        return resposta.json()
-
-    else:
-
-        # Se o código de status não for 200, algo deu errado com a requisição.
-        # A função então retorna um dicionário contendo o código de
-        # erro e a mensagem associada ao erro,
-        # o que pode ajudar na depuração e no tratamento de erros.
-        # 'resposta.status_code' fornece o código de erro, e
-        # 'resposta.text' fornece a descrição do erro.
-        return {"erro": resposta.status_code, "mensagem": resposta.text}
-
-
-# Define uma função chamada 'consumir_divisao' que é responsável
-# por interagir com uma API para realizar divisões.
-# A função aceita dois argumentos: 'numero1' e 'numero2',
-# que são os números a serem divididos.
-def consumir_divisao(numero1, numero2):
-
-    # Monta a URL completa que será utilizada para enviar a requisição à API.
-    # A URL é composta pela URL base armazenada em 'URL_BASE' e o
-    # caminho específico '/divisao' para o endpoint de divisão.
-    url = f"{URL_BASE}/divisao"
-
-    # Cria um dicionário chamado 'parametros'. Este dicionário contém
-    # as chaves 'numero1' e 'numero2', correspondentes aos
-    # números que a API espera receber como parte da
-    # requisição para realizar a operação de divisão.
-    parametros = {"numero1": numero1, "numero2": numero2}
-
-    # Utiliza a função 'get' do módulo 'requests' para enviar uma
-    # requisição HTTP GET ao servidor.
-    # A URL é especificada como primeiro argumento e os parâmetros da
-    # requisição são passados através do argumento 'params'.
-    resposta = requests.get(url, params=parametros)
-
-    # Verifica o código de status da resposta HTTP. Um código de
-    # status 200 indica que a requisição foi bem-sucedida.
-    if resposta.status_code == 200:
-
-        # Se o código de status for 200, a resposta da API é convertida
-        # de JSON para um dicionário Python usando o método 'json'.
-        # Este dicionário contém os resultados da operação de
-        # divisão e é retornado pela função.
-        return resposta.json()
-
-    else:
-
-        # Se o código de status não for 200, indica que houve algum
-        # erro com a requisição.
-        # A função então retorna um dicionário contendo o código de
-        # erro e a mensagem de erro associada.
-        # 'resposta.status_code' fornece o código de erro HTTP, e
-        # 'resposta.text' fornece a descrição do erro como texto.
-        return {"erro": resposta.status_code, "mensagem": resposta.text}
-
-
-# A condição '__name__ == "__main__"' é usada para garantir que
-# este bloco de código só será executado
-# se o script for executado diretamente. Isso previne a
-# execução do código quando o script é importado como um módulo.
-if __name__ == "__main__":
-
-    # Imprime uma linha de texto para indicar que o script começou a consumir a API.
-    print("=== Consumindo a API de Operações Matemáticas ===")
-
-    # Chama a função 'consumir_soma' com os números 10 e 5 como argumentos.
-    # A função envia uma requisição para a API para calcular a soma de 10 e 5.
-    # O resultado da operação é armazenado na variável 'resultado'.
-    resultado = consumir_soma(10, 5)
-
-    # Imprime o resultado da soma. 'resultado' deve conter o
-    # resultado da operação ou uma mensagem de erro,
-    # dependendo da resposta da API.
-    print("Soma:", resultado)
-
-    # Similar ao passo anterior, mas chama a função 'consumir_subtracao'
-    # para calcular a subtração de 10 por 5.
-    resultado = consumir_subtracao(10, 5)
-
-    # Imprime o resultado da subtração.
-    print("Subtração:", resultado)
-
-    # Chama a função 'consumir_multiplicacao' para calcular a
-    # multiplicação de 10 por 5.
-    resultado = consumir_multiplicacao(15, 5)
-
-    # Imprime o resultado da multiplicação.
-    print("Multiplicação:", resultado)
-
-    # Chama a função 'consumir_divisao' para calcular a divisão de 10 por 5.
-    resultado = consumir_divisao(10, 5)
-
-    # Imprime o resultado da divisão.
-    print("Divisão:", resultado)
-
-    # Realiza um teste adicional de divisão para um caso especial: divisão por zero.
-    # Chama a função 'consumir_divisao' com os números 10 e 0.
-    resultado = consumir_divisao(10, 0)
-
-    # Imprime o resultado da tentativa de divisão por zero.
-    # Este teste é importante pois divisão por zero é uma operação
-    # indefinida e deve ser tratada adequadamente pela API.
+# Importa o módulo 'requests', que é uma biblioteca Python
+# para fazer requisições HTTP.
+# Este módulo facilita enviar requisições para APIs e
+# receber respostas através da internet.
+import requests
+
+# Importa o 'HTTPAdapter', que controla o pool de conexões
+# mantidas abertas (keep-alive) por uma sessão do 'requests'.
+from requests.adapters import HTTPAdapter
+
+# Importa o 'array', que guarda sequências de float64 em um bloco
+# contínuo de memória, e o 'sys', que informa a ordem dos bytes da
+# máquina. Ambos são usados nos lotes binários.
+import sys
+from array import array
+
+# Importa o 'asyncio', usado pelo cliente assíncrono para manter
+# muitas requisições em andamento ao mesmo tempo e pelo adaptador ASGI.
+# O 'httpx' e o 'websockets' são importados apenas pelos clientes que
+# os usam, para que o cliente síncrono funcione só com o 'requests'.
+import asyncio
+
+# Importa os módulos usados pelo agrupador de requisições: 'json' para
+# reproduzir as mensagens de erro da API, 'queue' e 'threading' para
+# a fila e a thread de envio, 'time' para o prazo de espera e 'Future'
+# para entregar a cada chamador o seu próprio resultado.
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Importa o 'itertools', que gera os identificadores das mensagens do
+# cliente WebSocket.
+import itertools
+
+# Importa o 'http.client', usado pelo fluxo NDJSON para enviar o corpo
+# da requisição e ler a resposta ao mesmo tempo (o 'requests' só lê a
+# resposta depois de enviar o corpo inteiro), e o 'urllib.parse', que
+# separa a URL base em esquema, servidor e caminho.
+import http.client
+import urllib.parse
+
+# Importa os módulos usados pelas novas tentativas e pelas requisições
+# redundantes: 'random' sorteia as esperas entre tentativas, 'deque'
+# guarda as latências recentes e o 'ThreadPoolExecutor' envia a
+# requisição redundante enquanto a original ainda está em andamento.
+import random
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# Importa o necessário para o transporte dentro do processo: a classe
+# base dos adaptadores do 'requests', o dicionário de cabeçalhos sem
+# distinção de maiúsculas, a função que descobre a codificação da
+# resposta, o 'io' para o corpo da resposta e o 'HTTPStatus' para o
+# texto de cada código de status.
+import io
+from http import HTTPStatus
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+# Importa o necessário para medir as fases das requisições: o 'socket'
+# para resolver os nomes à parte e as classes de conexão e de pool do
+# 'urllib3' (usado pelo 'requests', na versão 2 ou mais recente), que
+# passam a medir o tempo de resolução do nome (DNS), de conexão TCP e
+# de negociação TLS.
+import socket
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NameResolutionError, NewConnectionError
+
+# Importa os módulos usados pelo cache de resultados do cliente: o
+# 'sqlite3' guarda os resultados em disco entre execuções, o 'os'
+# localiza e cria o arquivo e o 'OrderedDict' mantém a ordem de uso
+# das entradas em memória.
+import os
+import sqlite3
+from collections import OrderedDict
+
+# Define uma constante 'URL_BASE' que armazena a URL base
+# da API que você está usando.
+# Essa URL é o endereço base no qual a API está hospedada.
+# Neste caso, 'http://127.0.0.1:8000' indica que a API está
+# rodando localmente no seu computador na porta 8000.
+URL_BASE = "http://127.0.0.1:8000"
+
+# Número máximo de conexões mantidas abertas e reutilizadas
+# pelo cliente para o mesmo servidor.
+TAMANHO_POOL = 10
+
+# Tempo máximo, em segundos, para estabelecer a conexão TCP com a API.
+TEMPO_LIMITE_CONEXAO = 3.05
+
+# Tempo máximo, em segundos, para aguardar a resposta da API
+# depois que a conexão foi estabelecida.
+TEMPO_LIMITE_LEITURA = 10
+
+# Número máximo de tentativas de cada requisição. Falhas de conexão,
+# tempos limite esgotados e as respostas em 'STATUS_TEMPORARIOS' são
+# repetidos; como todas as rotas da API apenas calculam, sem efeitos
+# colaterais, repetir uma requisição é sempre seguro.
+TENTATIVAS = 3
+
+# Espera base e espera máxima, em segundos, entre as tentativas. A
+# espera dobra a cada tentativa e é sorteada entre zero e esse valor
+# ("jitter"), para que muitos clientes não repitam todos ao mesmo tempo.
+ESPERA_BASE_TENTATIVAS = 0.1
+ESPERA_MAXIMA_TENTATIVAS = 5.0
+
+# Códigos de status que indicam uma falha temporária do servidor (ou do
+# proxy na frente dele), após a qual a requisição é repetida. Apenas
+# 502, 503 e 504 contam como falhas para o disjuntor: o 429 indica
+# que o servidor está saudável, mas limitando este cliente.
+STATUS_FALHA_SERVIDOR = frozenset({502, 503, 504})
+STATUS_TEMPORARIOS = STATUS_FALHA_SERVIDOR | {429}
+
+# Falhas consecutivas que abrem o disjuntor e por quantos segundos ele
+# fica aberto, recusando as requisições sem nem tentar enviá-las.
+LIMITE_FALHAS_DISJUNTOR = 5
+TEMPO_ABERTURA_DISJUNTOR = 30
+
+# Número de latências recentes guardadas para calcular o p95 usado
+# como atraso das requisições redundantes, e o mínimo de latências
+# necessário antes de enviá-las.
+AMOSTRAS_LATENCIA = 200
+MINIMO_AMOSTRAS_LATENCIA = 20
+
+# Número máximo de requisições simultâneas em andamento no
+# cliente assíncrono.
+MAX_CONCORRENCIA = 100
+
+# Número máximo de chamadas reunidas em um único lote pelo agrupador.
+TAMANHO_MAXIMO_AGRUPAMENTO = 256
+
+# Tempo máximo, em segundos, que o agrupador espera por novas
+# chamadas antes de enviar o lote que já acumulou.
+ESPERA_MAXIMA_AGRUPAMENTO = 0.005
+
+# Número de registros reunidos em cada pedaço enviado pelo fluxo NDJSON.
+REGISTROS_POR_BLOCO = 1000
+
+# Arquivo SQLite e limites, em número de entradas, do cache de
+# resultados do cliente (veja 'CacheOperacoes'): as mais usadas ficam
+# também em memória, e o arquivo guarda muitas mais entre execuções.
+CAMINHO_CACHE = os.environ.get(
+    "API_OPERACOES_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "api_operacoes", "resultados.sqlite3"),
+)
+TAMANHO_CACHE_MEMORIA = 10_000
+TAMANHO_CACHE_DISCO = 1_000_000
+
+# Intervalo, em segundos, entre as consultas à rota '/operacoes' que
+# confirmam que a versão da API não mudou desde que os resultados em
+# cache foram guardados.
+INTERVALO_VALIDACAO_CACHE = 300
+
+# Tempo, em segundos, durante o qual o cache deixa de ser usado depois
+# que a confirmação da versão falhou, antes de uma nova consulta.
+ESPERA_VALIDACAO_CACHE = 30
+
+# Códigos de status das respostas de erro guardadas no cache. Como as
+# operações são funções puras, esses erros (ex: divisão por zero) se
+# repetem sempre para os mesmos operandos; as falhas temporárias nunca
+# são guardadas.
+STATUS_CACHEAVEIS = frozenset({400, 422})
+
+# Nome de cada operação como aparece no campo 'operacao' das
+# respostas da API, usado para montar os resultados dos lotes
+# no mesmo formato das rotas individuais.
+# Esta é a lista conhecida quando o cliente foi escrito; ela é
+# atualizada a partir da rota '/operacoes' por 'carregar_operacoes'.
+NOMES_OPERACOES = {
+    "soma": "soma",
+    "subtracao": "subtração",
+    "multiplicacao": "multiplicação",
+    "divisao": "divisão",
+    "potencia": "potência",
+    "modulo": "módulo",
+}
+
+
+# Monta a mensagem de erro no mesmo formato do corpo retornado pela
+# API em caso de erro (ex: '{"detail":"Divisão por zero não é permitida"}'),
+# para que erros recebidos por lotes ou pelo WebSocket fiquem
+# idênticos aos das requisições individuais.
+def formatar_mensagem_erro(detalhe):
+    return json.dumps({"detail": detalhe}, ensure_ascii=False, separators=(",", ":"))
+
+
+# Retorna uma visão dos bytes de uma sequência de números no formato
+# float64 little-endian usado pela rota '/lote/binario'.
+# Arrays do NumPy e 'array("d")' contínuos são usados diretamente,
+# sem copiar nem criar um objeto Python por elemento; outras sequências
+# (ex: listas) são convertidas para um 'array("d")'.
+def visao_float64(valores):
+
+    try:
+        visao = memoryview(valores)
+    except TypeError:
+        visao = None
+
+    if visao is None or visao.format != "d" or not visao.c_contiguous or sys.byteorder != "little":
+        copia = array("d", valores)
+        if sys.byteorder != "little":
+            copia.byteswap()
+        visao = memoryview(copia)
+
+    return visao
+
+
+# Define a classe 'AdaptadorASGI', um adaptador do 'requests' que, em
+# vez de abrir uma conexão TCP, entrega cada requisição diretamente a
+# uma aplicação ASGI no próprio processo (ex: 'api_operacoes.app').
+# As respostas (status, cabeçalhos, corpo e erros) são as mesmas que a
+# aplicação enviaria pela rede, então o mesmo código funciona tanto com
+# a API local quanto com uma API remota, apenas sem o custo da rede.
+# A aplicação roda em um laço de eventos próprio, em uma thread de
+# fundo, pois o 'requests' é síncrono e pode ser chamado de várias threads.
+class AdaptadorASGI(BaseAdapter):
+
+    def __init__(self, app):
+
+        super().__init__()
+        self.app = app
+        self.laco = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.laco.run_forever, daemon=True)
+        self.thread.start()
+
+    # Chama a aplicação com uma requisição HTTP e retorna o status, os
+    # cabeçalhos e o corpo da resposta.
+    async def _chamar(self, metodo, url, cabecalhos, corpo):
+
+        partes = urllib.parse.urlsplit(url)
+        porta = partes.port or (443 if partes.scheme == "https" else 80)
+        scope = {
+            "type": "http",
+            "asgi": {"version": "3.0", "spec_version": "2.3"},
+            "http_version": "1.1",
+            "method": metodo,
+            "scheme": partes.scheme,
+            "path": urllib.parse.unquote(partes.path) or "/",
+            "raw_path": (partes.path or "/").encode("latin-1"),
+            "query_string": partes.query.encode("latin-1"),
+            "root_path": "",
+            "headers": [(b"host", partes.netloc.encode("latin-1"))] + [
+                (nome.lower().encode("latin-1"), valor.encode("latin-1")) for nome, valor in cabecalhos.items()
+            ],
+            "client": ("127.0.0.1", 0),
+            "server": (partes.hostname, porta),
+        }
+
+        # O corpo inteiro é entregue na primeira leitura. Leituras
+        # seguintes aguardam o fim da resposta e indicam a desconexão,
+        # como faria um servidor quando o cliente fecha a conexão.
+        concluida = asyncio.Event()
+        corpo_entregue = False
+
+        async def receber():
+            nonlocal corpo_entregue
+            if not corpo_entregue:
+                corpo_entregue = True
+                return {"type": "http.request", "body": corpo, "more_body": False}
+            await concluida.wait()
+            return {"type": "http.disconnect"}
+
+        status = None
+        cabecalhos_resposta = []
+        pedacos = []
+
+        async def enviar(mensagem):
+            nonlocal status, cabecalhos_resposta
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+                cabecalhos_resposta = mensagem.get("headers", [])
+            elif mensagem["type"] == "http.response.body":
+                pedacos.append(mensagem.get("body", b""))
+                if not mensagem.get("more_body", False):
+                    concluida.set()
+
+        # Uma exceção na aplicação vira a mesma resposta 500 que o
+        # servidor enviaria, se a aplicação ainda não tiver respondido.
+        try:
+            await self.app(scope, receber, enviar)
+        except Exception:
+            if status is None:
+                status = 500
+                cabecalhos_resposta = [(b"content-type", b"text/plain; charset=utf-8")]
+                pedacos = [b"Internal Server Error"]
+        finally:
+            concluida.set()
+
+        return status, cabecalhos_resposta, b"".join(pedacos)
+
+    # Envia uma requisição preparada pelo 'requests' à aplicação e
+    # monta o 'requests.Response' correspondente. O tempo limite de
+    # leitura é respeitado; o de conexão não se aplica.
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+
+        corpo = request.body or b""
+        if isinstance(corpo, str):
+            corpo = corpo.encode("utf-8")
+        elif not isinstance(corpo, (bytes, bytearray, memoryview)):
+            corpo = b"".join(pedaco.encode("utf-8") if isinstance(pedaco, str) else pedaco for pedaco in corpo)
+
+        if isinstance(timeout, tuple):
+            timeout = timeout[1]
+
+        futuro = asyncio.run_coroutine_threadsafe(
+            self._chamar(request.method, request.url, request.headers, bytes(corpo)), self.laco,
+        )
+        try:
+            status, cabecalhos, conteudo = futuro.result(timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise requests.ReadTimeout(f"A aplicação não respondeu em {timeout} s", request=request)
+
+        # Cabeçalhos repetidos são unidos por vírgula, como faz o 'urllib3'.
+        resposta = requests.Response()
+        resposta.headers = CaseInsensitiveDict()
+        for nome, valor in cabecalhos:
+            nome = nome.decode("latin-1")
+            valor = valor.decode("latin-1")
+            resposta.headers[nome] = f"{resposta.headers[nome]}, {valor}" if nome in resposta.headers else valor
+
+        resposta.status_code = status
+        resposta.reason = HTTPStatus(status).phrase if status in HTTPStatus._value2member_map_ else ""
+        resposta.raw = io.BytesIO(conteudo)
+        resposta.encoding = get_encoding_from_headers(resposta.headers)
+        resposta.url = request.url
+        resposta.request = request
+        resposta.connection = self
+        return resposta
+
+    # Encerra o laço de eventos da aplicação e a sua thread.
+    def close(self):
+
+        if self.laco.is_running():
+            self.laco.call_soon_threadsafe(self.laco.stop)
+            self.thread.join()
+
+
+# Tempos das conexões abertas pela thread atual. Quando
+# 'tempos_conexao.atuais' é um dicionário, as conexões abertas pela
+# thread registram nele os seus tempos, em segundos.
+tempos_conexao = threading.local()
+
+
+# Registra um tempo de conexão, se a thread atual estiver medindo.
+def registrar_tempo_conexao(fase, duracao):
+
+    tempos = getattr(tempos_conexao, "atuais", None)
+    if tempos is not None:
+        tempos[fase] = duracao
+
+
+# Define a classe 'MedicaoConexao', que acrescenta às conexões do
+# 'urllib3' a medição do tempo de resolução do nome e de conexão TCP e,
+# nas conexões HTTPS, de negociação TLS.
+# O nome é resolvido aqui, à parte, e cada endereço obtido é tentado
+# na ordem, como faz o 'urllib3' (ex: 'localhost' em IPv6 e em IPv4).
+class MedicaoConexao:
+
+    def _new_conn(self):
+
+        inicio = time.perf_counter()
+        try:
+            enderecos = socket.getaddrinfo(self._dns_host, self.port, 0, socket.SOCK_STREAM)
+        except socket.gaierror as erro:
+            raise NameResolutionError(self.host, self, erro) from erro
+        resolvido = time.perf_counter()
+        registrar_tempo_conexao("dns", resolvido - inicio)
+
+        host = self._dns_host
+        try:
+            for indice, (*_, endereco) in enumerate(enderecos):
+                self._dns_host = endereco[0]
+                try:
+                    soquete = super()._new_conn()
+                    break
+                except (NewConnectionError, ConnectTimeoutError):
+                    if indice == len(enderecos) - 1:
+                        raise
+        finally:
+            self._dns_host = host
+
+        registrar_tempo_conexao("conexao", time.perf_counter() - resolvido)
+        return soquete
+
+    def connect(self):
+
+        inicio = time.perf_counter()
+        super().connect()
+        tempos = getattr(tempos_conexao, "atuais", None)
+        if tempos is not None and isinstance(self, HTTPSConnection):
+            tempos["tls"] = time.perf_counter() - inicio - tempos.get("dns", 0) - tempos.get("conexao", 0)
+
+
+# Conexões e pools do 'urllib3' com a medição acima.
+class ConexaoMedida(MedicaoConexao, HTTPConnection):
+    pass
+
+
+class ConexaoMedidaHTTPS(MedicaoConexao, HTTPSConnection):
+    pass
+
+
+class PoolMedido(HTTPConnectionPool):
+    ConnectionCls = ConexaoMedida
+
+
+class PoolMedidoHTTPS(HTTPSConnectionPool):
+    ConnectionCls = ConexaoMedidaHTTPS
+
+
+# Define a classe 'AdaptadorMedido', o 'HTTPAdapter' do 'requests' com
+# os pools de conexões medidas. Fora de 'consumir_com_tempos' a medição
+# não registra nada e o comportamento é o mesmo do 'HTTPAdapter'.
+class AdaptadorMedido(HTTPAdapter):
+
+    def init_poolmanager(self, *args, **argumentos):
+
+        super().init_poolmanager(*args, **argumentos)
+        self.poolmanager.pool_classes_by_scheme = {"http": PoolMedido, "https": PoolMedidoHTTPS}
+
+
+# Converte o cabeçalho 'Server-Timing' (ex: 'validacao;dur=0.2, total;dur=1.5')
+# em um dicionário com a duração, em milissegundos, de cada fase. As
+# fases sem duração ficam com 'None'.
+def analisar_server_timing(cabecalho):
+
+    fases = {}
+    for metrica in cabecalho.split(","):
+        nome, *parametros = [parte.strip() for parte in metrica.split(";")]
+        if not nome:
+            continue
+        fases[nome] = None
+        for parametro in parametros:
+            chave, _, valor = parametro.partition("=")
+            if chave.strip() == "dur":
+                try:
+                    fases[nome] = float(valor)
+                except ValueError:
+                    pass
+
+    return fases
+
+
+# Exceção levantada quando o disjuntor está aberto: o servidor falhou
+# repetidamente e a requisição é recusada imediatamente, sem esperar
+# pelos tempos limite de uma tentativa que provavelmente falharia.
+class CircuitoAberto(Exception):
+    pass
+
+
+# Define a classe 'DisjuntorCircuito' (circuit breaker), que acompanha
+# as falhas do servidor. Depois de 'limite_falhas' falhas consecutivas,
+# o disjuntor abre e recusa as requisições por 'tempo_abertura'
+# segundos. Passado esse tempo, uma única requisição de teste é
+# liberada: se ela tiver sucesso o disjuntor fecha, senão abre de novo.
+# Como um mesmo cliente pode ser usado por várias threads, o estado é
+# protegido por uma trava.
+class DisjuntorCircuito:
+
+    def __init__(self, limite_falhas=LIMITE_FALHAS_DISJUNTOR, tempo_abertura=TEMPO_ABERTURA_DISJUNTOR):
+
+        self.limite_falhas = limite_falhas
+        self.tempo_abertura = tempo_abertura
+        self.falhas = 0
+        self.aberto_ate = 0.0
+        self.testando = False
+        self.trava = threading.Lock()
+
+    # Verifica se uma requisição pode ser enviada, levantando
+    # 'CircuitoAberto' se o disjuntor estiver aberto.
+    def permitir(self):
+
+        with self.trava:
+            if self.falhas < self.limite_falhas:
+                return
+
+            agora = time.monotonic()
+            if agora < self.aberto_ate or self.testando:
+                raise CircuitoAberto(f"Servidor indisponível; nova tentativa em {max(self.aberto_ate - agora, 0):.1f} s")
+
+            # O tempo de abertura passou: libera apenas esta requisição,
+            # que testa se o servidor voltou.
+            self.testando = True
+
+    # Registra uma resposta do servidor, fechando o disjuntor.
+    def registrar_sucesso(self):
+
+        with self.trava:
+            self.falhas = 0
+            self.testando = False
+
+    # Registra uma falha do servidor, abrindo o disjuntor quando as
+    # falhas consecutivas atingem o limite.
+    def registrar_falha(self):
+
+        with self.trava:
+            self.falhas += 1
+            self.testando = False
+            if self.falhas >= self.limite_falhas:
+                self.aberto_ate = time.monotonic() + self.tempo_abertura
+
+
+# Monta a chave do cache de resultados para uma operação. Retorna
+# 'None' quando os operandos não são números: a resposta da API
+# depende, nesse caso, do texto exato enviado, e não é guardada.
+def chave_cache(operacao, numero1, numero2):
+
+    if isinstance(numero1, (str, bytes)) or isinstance(numero2, (str, bytes)):
+        return None
+    try:
+        return repr((operacao, float(numero1), float(numero2)))
+    except (TypeError, ValueError):
+        return None
+
+
+# Define a classe 'CacheOperacoes', um cache dos resultados das
+# operações no cliente, para que processamentos repetidos sobre dados
+# parecidos não peçam ao servidor os mesmos cálculos de novo.
+# Tem dois níveis: um LRU em memória com as entradas mais usadas e um
+# arquivo SQLite, que guarda muitas mais e é mantido entre execuções.
+# Quando o arquivo passa do limite, as entradas usadas há mais tempo
+# são removidas.
+# Cada entrada guarda a resposta no formato de 'ClienteOperacoes.consumir'
+# (o corpo JSON ou o erro), serializada em JSON, para que cada consulta
+# retorne uma cópia própria. Os resultados valem para uma versão da
+# API: o cliente confirma a versão pela rota '/operacoes' e, se ela
+# mudou, o cache é esvaziado ('definir_versao').
+# Pode ser compartilhado por vários clientes e threads; os acessos são
+# protegidos por uma trava.
+class CacheOperacoes:
+
+    def __init__(self, caminho=CAMINHO_CACHE, tamanho_memoria=TAMANHO_CACHE_MEMORIA,
+                 tamanho_disco=TAMANHO_CACHE_DISCO):
+
+        self.tamanho_memoria = tamanho_memoria
+        self.tamanho_disco = tamanho_disco
+        self.itens = OrderedDict()
+        self.trava = threading.Lock()
+
+        # Contadores de acertos em cada nível, falhas e remoções do arquivo.
+        self.acertos_memoria = 0
+        self.acertos_disco = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+        # Abre (ou cria) o arquivo. O modo WAL permite que outros
+        # processos leiam o arquivo enquanto este grava, e o
+        # 'synchronous=NORMAL' evita esperar o disco a cada gravação:
+        # no pior caso, uma queda de energia perde os últimos resultados,
+        # que são apenas pedidos de novo ao servidor.
+        if os.path.dirname(caminho):
+            os.makedirs(os.path.dirname(caminho), exist_ok=True)
+        self.conexao = sqlite3.connect(caminho, check_same_thread=False)
+        self.conexao.execute("PRAGMA journal_mode=WAL")
+        self.conexao.execute("PRAGMA synchronous=NORMAL")
+        with self.conexao:
+            self.conexao.execute(
+                "CREATE TABLE IF NOT EXISTS resultados (chave TEXT PRIMARY KEY, corpo TEXT NOT NULL, uso REAL NOT NULL)"
+                " WITHOUT ROWID"
+            )
+            self.conexao.execute("CREATE INDEX IF NOT EXISTS resultados_uso ON resultados (uso)")
+            self.conexao.execute("CREATE TABLE IF NOT EXISTS metadados (nome TEXT PRIMARY KEY, valor TEXT)")
+
+        linha = self.conexao.execute("SELECT valor FROM metadados WHERE nome = 'versao'").fetchone()
+        self.versao = linha[0] if linha else None
+        self.quantidade_disco = self.conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+
+        # Instante até o qual a versão da API é considerada confirmada.
+        # Começa expirado, para que a versão seja confirmada antes do
+        # primeiro uso.
+        self.validade = 0.0
+
+    # Indica se a versão da API foi confirmada recentemente.
+    def valido(self):
+        return time.monotonic() < self.validade
+
+    # Registra a versão da API informada pelo servidor. Se ela for
+    # diferente da versão dos resultados guardados, o cache é esvaziado.
+    def definir_versao(self, versao):
+
+        with self.trava:
+            if versao != self.versao:
+                self.itens.clear()
+                with self.conexao:
+                    self.conexao.execute("DELETE FROM resultados")
+                    self.conexao.execute("INSERT OR REPLACE INTO metadados VALUES ('versao', ?)", (versao,))
+                self.quantidade_disco = 0
+                self.versao = versao
+
+            self.validade = time.monotonic() + INTERVALO_VALIDACAO_CACHE
+
+    # Retorna um dicionário com as respostas guardadas para as chaves
+    # encontradas. As que não estão em memória são procuradas no
+    # arquivo em uma única consulta e passam a ficar também em memória.
+    def obter(self, chaves):
+
+        encontrados = {}
+        with self.trava:
+            faltantes = []
+            for chave in dict.fromkeys(chaves):
+                corpo = self.itens.get(chave)
+                if corpo is None:
+                    faltantes.append(chave)
+                    continue
+                self.itens.move_to_end(chave)
+                self.acertos_memoria += 1
+                encontrados[chave] = corpo
+
+            # A consulta é dividida em partes, pois o SQLite limita o
+            # número de parâmetros de cada comando.
+            do_disco = []
+            for inicio in range(0, len(faltantes), 500):
+                parte = faltantes[inicio:inicio + 500]
+                do_disco += self.conexao.execute(
+                    f"SELECT chave, corpo FROM resultados WHERE chave IN ({','.join('?' * len(parte))})", parte,
+                ).fetchall()
+
+            # Marca as entradas lidas do arquivo como usadas agora, para
+            # que não sejam as primeiras removidas.
+            if do_disco:
+                with self.conexao:
+                    agora = time.time()
+                    self.conexao.executemany("UPDATE resultados SET uso = ? WHERE chave = ?",
+                                             [(agora, chave) for chave, _ in do_disco])
+                for chave, corpo in do_disco:
+                    self._guardar_memoria(chave, corpo)
+                    encontrados[chave] = corpo
+
+            self.acertos_disco += len(do_disco)
+            self.falhas += len(faltantes) - len(do_disco)
+
+        return {chave: json.loads(corpo) for chave, corpo in encontrados.items()}
+
+    # Guarda as respostas de um dicionário '{chave: resposta}' nos dois níveis.
+    def guardar(self, respostas):
+
+        if not respostas:
+            return
+
+        linhas = [(chave, json.dumps(resposta, ensure_ascii=False)) for chave, resposta in respostas.items()]
+        with self.trava:
+            for chave, corpo in linhas:
+                self._guardar_memoria(chave, corpo)
+
+            agora = time.time()
+            with self.conexao:
+                self.conexao.executemany("INSERT OR REPLACE INTO resultados VALUES (?, ?, ?)",
+                                         [(chave, corpo, agora) for chave, corpo in linhas])
+            self.quantidade_disco += len(linhas)
+
+            # A contagem é estimada (as substituições também são
+            # contadas); ao passar do limite, é refeita e as entradas
+            # usadas há mais tempo são removidas, com uma folga de 1%
+            # para não remover a cada nova entrada.
+            if self.quantidade_disco > self.tamanho_disco:
+                self.quantidade_disco = self.conexao.execute("SELECT COUNT(*) FROM resultados").fetchone()[0]
+                excesso = self.quantidade_disco - self.tamanho_disco
+                if excesso > 0:
+                    excesso += self.tamanho_disco // 100
+                    with self.conexao:
+                        self.conexao.execute(
+                            "DELETE FROM resultados WHERE chave IN"
+                            " (SELECT chave FROM resultados ORDER BY uso LIMIT ?)", (excesso,),
+                        )
+                    self.quantidade_disco = max(self.quantidade_disco - excesso, 0)
+                    self.remocoes += excesso
+
+    # Guarda uma entrada em memória, removendo as menos usadas
+    # recentemente quando o limite é ultrapassado. Elas continuam no arquivo.
+    def _guardar_memoria(self, chave, corpo):
+
+        self.itens[chave] = corpo
+        self.itens.move_to_end(chave)
+        while len(self.itens) > self.tamanho_memoria:
+            self.itens.popitem(last=False)
+
+    # Remove todas as entradas, da memória e do arquivo.
+    def limpar(self):
+
+        with self.trava:
+            self.itens.clear()
+            with self.conexao:
+                self.conexao.execute("DELETE FROM resultados")
+            self.quantidade_disco = 0
+
+    # Retorna os tamanhos, os contadores e a taxa de acerto do cache.
+    def estatisticas(self):
+
+        with self.trava:
+            consultas = self.acertos_memoria + self.acertos_disco + self.falhas
+            return {
+                "versao": self.versao,
+                "tamanho_memoria": len(self.itens),
+                "tamanho_maximo_memoria": self.tamanho_memoria,
+                "tamanho_disco": self.quantidade_disco,
+                "tamanho_maximo_disco": self.tamanho_disco,
+                "acertos_memoria": self.acertos_memoria,
+                "acertos_disco": self.acertos_disco,
+                "falhas": self.falhas,
+                "remocoes": self.remocoes,
+                "taxa_acerto": (self.acertos_memoria + self.acertos_disco) / consultas if consultas else 0.0,
+            }
+
+    # Fecha o arquivo do cache.
+    def fechar(self):
+
+        with self.trava:
+            self.conexao.close()
+
+
+# Define a classe 'ClienteOperacoes', que encapsula uma sessão do
+# 'requests' com um pool de conexões keep-alive.
+# Reutilizar a mesma conexão TCP entre chamadas evita pagar o
+# handshake a cada operação, o que domina a latência em laços.
+class ClienteOperacoes:
+
+    # O construtor recebe a URL base da API, o tamanho do pool de
+    # conexões, os tempos limite de conexão e de leitura de cada
+    # tentativa, o número de tentativas e as esperas entre elas.
+    # 'urls_reserva' são URLs de outras instâncias da API, usadas nas
+    # novas tentativas e nas requisições redundantes ("hedged requests"):
+    # se uma requisição GET demora mais que o p95 das latências recentes
+    # (ou que 'atraso_reserva', em segundos, se informado), uma segunda
+    # cópia é enviada a outra instância e vale a primeira resposta.
+    # 'disjuntor' permite compartilhar um 'DisjuntorCircuito' entre clientes.
+    # 'app' é uma aplicação ASGI no próprio processo (ex: 'api_operacoes.app');
+    # quando informada, as requisições são entregues diretamente a ela,
+    # sem passar pela rede, pelo 'AdaptadorASGI'.
+    # 'cache' é um 'CacheOperacoes' usado por 'consumir' e 'consumir_lote';
+    # sem ele, toda operação é pedida ao servidor.
+    def __init__(self, url_base=URL_BASE, tamanho_pool=TAMANHO_POOL,
+                 tempo_limite_conexao=TEMPO_LIMITE_CONEXAO, tempo_limite_leitura=TEMPO_LIMITE_LEITURA,
+                 tentativas=TENTATIVAS, espera_base=ESPERA_BASE_TENTATIVAS, espera_maxima=ESPERA_MAXIMA_TENTATIVAS,
+                 urls_reserva=(), atraso_reserva=None, disjuntor=None, app=None, cache=None):
+
+        # Guarda a URL base sem a barra final, para que
+        # 'f"{self.url_base}/soma"' sempre forme uma URL válida.
+        self.url_base = url_base.rstrip("/")
+
+        # O 'requests' aceita uma tupla (conexão, leitura) como tempo limite.
+        self.tempo_limite = (tempo_limite_conexao, tempo_limite_leitura)
+
+        # Configuração das novas tentativas e do disjuntor.
+        self.tentativas = max(tentativas, 1)
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self.disjuntor = disjuntor or DisjuntorCircuito()
+
+        # URLs usadas em rodízio pelas tentativas: a principal primeiro,
+        # depois as de reserva. As requisições redundantes precisam de
+        # threads próprias, criadas apenas quando há URLs de reserva.
+        self.urls = [self.url_base] + [url.rstrip("/") for url in urls_reserva]
+        self.atraso_reserva = atraso_reserva
+        self.latencias = deque(maxlen=AMOSTRAS_LATENCIA)
+        self.executor = ThreadPoolExecutor(max_workers=tamanho_pool) if len(self.urls) > 1 else None
+
+        # Cria a sessão, que mantém as conexões abertas entre as
+        # requisições, e monta nela um adaptador com o pool do
+        # tamanho desejado para HTTP e HTTPS.
+        self.sessao = requests.Session()
+        adaptador = AdaptadorMedido(pool_maxsize=tamanho_pool) if app is None else AdaptadorASGI(app)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.mount("https://", adaptador)
+
+        self.cache = cache
+        self.validacao_cache_falhou_em = None
+
+    # Envia uma única tentativa de requisição à URL base indicada,
+    # registrando o resultado no disjuntor e, nas respostas de sucesso,
+    # a latência usada pelas requisições redundantes. Qualquer exceção
+    # (não só as de conexão, mas também ex: 'ChunkedEncodingError')
+    # conta como falha, para que a requisição de teste do disjuntor
+    # sempre o libere e ele não fique aberto para sempre.
+    def _tentar(self, url_base, metodo, caminho, argumentos):
+
+        inicio = time.perf_counter()
+        try:
+            resposta = self.sessao.request(metodo, url_base + caminho, timeout=self.tempo_limite, **argumentos)
+        except Exception:
+            self.disjuntor.registrar_falha()
+            raise
+
+        if resposta.status_code in STATUS_FALHA_SERVIDOR:
+            self.disjuntor.registrar_falha()
+        else:
+            self.disjuntor.registrar_sucesso()
+            if resposta.status_code == 200:
+                self.latencias.append(time.perf_counter() - inicio)
+
+        return resposta
+
+    # Retorna o atraso, em segundos, após o qual uma requisição GET
+    # ganha uma cópia redundante, ou 'None' enquanto não há latências
+    # suficientes para estimar o p95.
+    def _atraso_redundante(self):
+
+        if self.atraso_reserva is not None:
+            return self.atraso_reserva
+
+        latencias = sorted(self.latencias)
+        if len(latencias) < MINIMO_AMOSTRAS_LATENCIA:
+            return None
+        return latencias[int(len(latencias) * 0.95) - 1]
+
+    # Envia uma requisição GET à URL da tentativa e, se ela não responder
+    # dentro do atraso, uma cópia à URL seguinte. Retorna a primeira
+    # resposta que não seja uma falha temporária; se as duas falharem,
+    # retorna (ou levanta) a última falha.
+    def _tentar_com_redundancia(self, tentativa, caminho, argumentos):
+
+        principal = self.urls[tentativa % len(self.urls)]
+        atraso = self._atraso_redundante()
+        if atraso is None:
+            return self._tentar(principal, "GET", caminho, argumentos)
+
+        pendentes = {self.executor.submit(self._tentar, principal, "GET", caminho, argumentos)}
+        if not wait(pendentes, timeout=atraso).done:
+            reserva = self.urls[(tentativa + 1) % len(self.urls)]
+            pendentes.add(self.executor.submit(self._tentar, reserva, "GET", caminho, argumentos))
+
+        # A requisição mais lenta não pode ser interrompida pelo
+        # 'requests'; ela termina em segundo plano e é descartada. Uma
+        # cópia que falha com qualquer erro do 'requests' não impede que
+        # a outra ainda responda.
+        falha = None
+        while pendentes:
+            prontos, pendentes = wait(pendentes, return_when=FIRST_COMPLETED)
+            for futuro in prontos:
+                try:
+                    resposta = futuro.result()
+                except requests.RequestException as erro:
+                    falha = erro
+                    continue
+                if resposta.status_code not in STATUS_TEMPORARIOS:
+                    return resposta
+                falha = resposta
+
+        if isinstance(falha, Exception):
+            raise falha
+        return falha
+
+    # Calcula a espera antes da próxima tentativa: um valor sorteado
+    # entre zero e a espera base dobrada a cada tentativa, ou o tempo
+    # pedido pelo servidor no cabeçalho 'Retry-After', se for maior.
+    # Ambos são limitados a 'espera_maxima'.
+    def _espera(self, tentativa, resposta):
+
+        espera = random.uniform(0, self.espera_base * 2 ** tentativa)
+        if resposta is not None:
+            try:
+                espera = max(espera, float(resposta.headers.get("Retry-After", 0)))
+            except ValueError:
+                pass
+
+        return min(espera, self.espera_maxima)
+
+    # Envia uma requisição à API com novas tentativas: falhas de conexão,
+    # tempos limite esgotados e respostas 429, 502, 503 e 504 são
+    # repetidos, alternando entre as URLs configuradas, até o número
+    # máximo de tentativas. Retorna a última resposta recebida ou, se
+    # nenhuma tentativa obteve resposta, levanta o último erro.
+    # Com o disjuntor aberto, levanta 'CircuitoAberto' imediatamente.
+    def _enviar(self, metodo, caminho, **argumentos):
+
+        resposta = None
+        erro = None
+        for tentativa in range(self.tentativas):
+
+            if tentativa:
+                time.sleep(self._espera(tentativa - 1, resposta))
+
+            self.disjuntor.permitir()
+            try:
+                if metodo == "GET" and self.executor is not None:
+                    resposta = self._tentar_com_redundancia(tentativa, caminho, argumentos)
+                else:
+                    resposta = self._tentar(self.urls[tentativa % len(self.urls)], metodo, caminho, argumentos)
+            except (requests.ConnectionError, requests.Timeout) as excecao:
+                resposta = None
+                erro = excecao
+                continue
+
+            if resposta.status_code not in STATUS_TEMPORARIOS:
+                return resposta
+
+        if resposta is None:
+            raise erro
+        return resposta
+
+    # Indica se o cache pode ser usado: ele existe e a versão da API
+    # foi confirmada recentemente. Se não foi, consulta a rota
+    # '/operacoes' uma única vez, sem novas tentativas, e registra a
+    # versão atual no cache. Se o servidor não responder, o cache não é
+    # usado, pois não há como saber se os resultados guardados continuam
+    # valendo, e a consulta só é repetida após 'ESPERA_VALIDACAO_CACHE'
+    # segundos: a própria requisição já fará as suas tentativas.
+    def _usar_cache(self):
+
+        if self.cache is None:
+            return False
+        if self.cache.valido():
+            return True
+
+        falhou_em = self.validacao_cache_falhou_em
+        if falhou_em is not None and time.monotonic() - falhou_em < ESPERA_VALIDACAO_CACHE:
+            return False
+
+        try:
+            self.disjuntor.permitir()
+            resposta = self._tentar(self.urls[0], "GET", "/operacoes", {})
+            resposta.raise_for_status()
+            self._registrar_versao(resposta.json())
+        except (requests.RequestException, CircuitoAberto, ValueError):
+            self.validacao_cache_falhou_em = time.monotonic()
+            return False
+
+        self.validacao_cache_falhou_em = None
+        return self.cache.valido()
+
+    # Registra no cache a versão da API informada pela rota '/operacoes';
+    # o cache é esvaziado se ela mudou.
+    def _registrar_versao(self, descoberta):
+
+        if self.cache is not None:
+            self.cache.definir_versao(descoberta.get("versao"))
+
+    # Realiza uma operação na API. 'operacao' é o nome da rota
+    # (ex: 'soma') e 'numero1' e 'numero2' são os operandos.
+    def consumir(self, operacao, numero1, numero2):
+
+        # Com o cache ativo, retorna a resposta guardada, se houver.
+        chave = chave_cache(operacao, numero1, numero2)
+        if chave is not None and self._usar_cache():
+            guardada = self.cache.obter([chave]).get(chave)
+            if guardada is not None:
+                return guardada
+        else:
+            chave = None
+
+        # Monta os parâmetros de consulta e envia a requisição GET pela
+        # sessão, reaproveitando uma conexão do pool, respeitando os
+        # tempos limite e repetindo as falhas temporárias.
+        parametros = {"numero1": numero1, "numero2": numero2}
+        resposta = self._enviar("GET", f"/{operacao}", params=parametros)
+
+        # Se o código de status for 200, converte o JSON da resposta
+        # em um dicionário Python. Caso contrário, monta um dicionário
+        # com o código de erro HTTP e o corpo da resposta como mensagem.
+        if resposta.status_code == 200:
+            corpo = resposta.json()
+        else:
+            corpo = {"erro": resposta.status_code, "mensagem": resposta.text}
+
+        # Guarda no cache os resultados e os erros que se repetem sempre
+        # para os mesmos operandos (ex: divisão por zero).
+        if chave is not None and (resposta.status_code == 200 or resposta.status_code in STATUS_CACHEAVEIS):
+            self.cache.guardar({chave: corpo})
+
+        return corpo
+
+    # Realiza uma operação como 'consumir' e retorna, além da resposta,
+    # os tempos de cada fase em milissegundos: no cliente, a resolução
+    # do nome ('dns'), a conexão TCP ('conexao') e a negociação TLS
+    # ('tls'), zeradas quando uma conexão do pool é reutilizada, a
+    # espera pela resposta ('espera', do envio até a chegada dos
+    # cabeçalhos), a transferência do corpo ('transferencia') e o total;
+    # no servidor, as fases do cabeçalho 'Server-Timing'.
+    # A requisição é enviada uma única vez, sem novas tentativas nem
+    # cópias redundantes, para que os tempos correspondam a ela.
+    def consumir_com_tempos(self, operacao, numero1, numero2):
+
+        self.disjuntor.permitir()
+        tempos = tempos_conexao.atuais = {}
+        inicio = time.perf_counter()
+        try:
+            parametros = {"numero1": numero1, "numero2": numero2}
+            resposta = self._tentar(self.urls[0], "GET", f"/{operacao}", {"params": parametros})
+        finally:
+            del tempos_conexao.atuais
+        total = time.perf_counter() - inicio
+
+        # O 'elapsed' do 'requests' vai do início do envio até a chegada
+        # dos cabeçalhos da resposta, incluindo a abertura da conexão.
+        ate_cabecalhos = resposta.elapsed.total_seconds()
+        abertura = {fase: tempos.get(fase, 0.0) for fase in ("dns", "conexao", "tls")}
+        tempos_cliente = {
+            **abertura,
+            "espera": ate_cabecalhos - sum(abertura.values()),
+            "transferencia": total - ate_cabecalhos,
+            "total": total,
+        }
+
+        if resposta.status_code == 200:
+            corpo = resposta.json()
+        else:
+            corpo = {"erro": resposta.status_code, "mensagem": resposta.text}
+
+        return {
+            "resposta": corpo,
+            "conexao_reutilizada": "conexao" not in tempos,
+            "tempos_cliente": {fase: duracao * 1000 for fase, duracao in tempos_cliente.items()},
+            "tempos_servidor": analisar_server_timing(resposta.headers.get("Server-Timing", "")),
+        }
+
+    # Consulta a rota de descoberta '/operacoes' e retorna a versão da
+    # API e a lista de operações disponíveis no servidor.
+    # Levanta 'requests.RequestException' se a consulta falhar.
+    def descobrir_operacoes(self):
+
+        resposta = self._enviar("GET", "/operacoes")
+        resposta.raise_for_status()
+        descoberta = resposta.json()
+        self._registrar_versao(descoberta)
+        return descoberta
+
+    # Envia um lote de operações para a rota '/lote' da API.
+    # 'operacao' é o nome de uma operação ou uma lista com uma operação
+    # por par, e 'numero1' e 'numero2' são listas de mesmo tamanho.
+    # Com o cache ativo, apenas as operações que não estão nele são enviadas.
+    def consumir_lote(self, operacao, numero1, numero2):
+
+        if self._usar_cache():
+            return self._consumir_lote_com_cache(operacao, list(numero1), list(numero2))
+
+        return self._enviar_lote(operacao, numero1, numero2)
+
+    # Envia o lote à rota '/lote', sem passar pelo cache.
+    def _enviar_lote(self, operacao, numero1, numero2):
+
+        # Monta o corpo JSON do lote e o envia com uma única requisição POST.
+        corpo = {"operacao": operacao, "numero1": list(numero1), "numero2": list(numero2)}
+        resposta = self._enviar("POST", "/lote", json=corpo)
+
+        # Retorna os resultados e os erros por elemento, ou o erro do
+        # lote inteiro no mesmo formato usado por 'consumir'.
+        if resposta.status_code == 200:
+            return resposta.json()
+
+        return {"erro": resposta.status_code, "mensagem": resposta.text}
+
+    # Monta a resposta de um lote a partir do cache, enviando à rota
+    # '/lote' apenas as operações que não estão nele. As entradas do
+    # cache têm o formato das rotas individuais, o mesmo usado pelo
+    # agrupador, para que 'consumir' e 'consumir_lote' aproveitem os
+    # resultados um do outro.
+    def _consumir_lote_com_cache(self, operacao, numero1, numero2):
+
+        operacoes = [operacao] * len(numero1) if isinstance(operacao, str) else list(operacao)
+        chaves = [chave_cache(*par) for par in zip(operacoes, numero1, numero2)]
+        guardadas = self.cache.obter([chave for chave in chaves if chave is not None])
+
+        # Preenche os resultados e os erros por elemento (código 400)
+        # guardados. Os demais erros guardados (ex: 422) recusariam o
+        # lote inteiro, e essas operações são enviadas normalmente.
+        resultados = [None] * len(operacoes)
+        erros = {}
+        faltantes = []
+        for indice, chave in enumerate(chaves):
+            guardada = guardadas.get(chave)
+            if guardada is None or guardada.get("erro") not in (None, 400):
+                faltantes.append(indice)
+            elif "erro" in guardada:
+                erros[indice] = json.loads(guardada["mensagem"])["detail"]
+            else:
+                resultados[indice] = guardada["resultado"]
+
+        if faltantes:
+            resposta = self._enviar_lote(
+                operacao if isinstance(operacao, str) else [operacoes[indice] for indice in faltantes],
+                [numero1[indice] for indice in faltantes],
+                [numero2[indice] for indice in faltantes],
+            )
+
+            # Um lote recusado como um todo é retornado como seria sem o cache.
+            if "erro" in resposta:
+                return resposta
+
+            # Junta as respostas do servidor às do cache e as guarda.
+            # Os resultados de operações ainda não carregadas com
+            # 'carregar_operacoes' não são guardados, pois falta o nome
+            # exibido no campo 'operacao'.
+            erros_lote = {erro["indice"]: erro["detalhe"] for erro in resposta["erros"]}
+            novas = {}
+            for posicao, indice in enumerate(faltantes):
+                if posicao in erros_lote:
+                    erros[indice] = erros_lote[posicao]
+                    nova = {"erro": 400, "mensagem": formatar_mensagem_erro(erros_lote[posicao])}
+                else:
+                    resultados[indice] = resposta["resultados"][posicao]
+                    if operacoes[indice] not in NOMES_OPERACOES:
+                        continue
+                    nova = {
+                        "operacao": NOMES_OPERACOES[operacoes[indice]],
+                        "numero1": float(numero1[indice]),
+                        "numero2": float(numero2[indice]),
+                        "resultado": resultados[indice],
+                    }
+                if chaves[indice] is not None:
+                    novas[chaves[indice]] = nova
+
+            self.cache.guardar(novas)
+
+        return {"resultados": resultados, "erros": [{"indice": indice, "detalhe": erros[indice]} for indice in sorted(erros)]}
+
+    # Envia um lote para a rota '/lote/binario', com os números
+    # empacotados como float64 em vez de texto JSON.
+    # 'numero1' e 'numero2' podem ser arrays do NumPy, 'array("d")' ou
+    # listas de mesmo tamanho. Os resultados são retornados em um
+    # 'array("d")', com NaN nas posições sem resultado (divisões por
+    # zero); 'np.frombuffer(resultados)' o converte sem cópia.
+    def consumir_lote_binario(self, operacao, numero1, numero2):
+
+        primeiro = visao_float64(numero1)
+        segundo = visao_float64(numero2)
+        if len(primeiro) != len(segundo):
+            raise ValueError("'numero1' e 'numero2' devem ter o mesmo tamanho")
+
+        # O corpo é formado pelos bytes de 'numero1' seguidos dos de 'numero2'.
+        resposta = self._enviar(
+            "POST",
+            "/lote/binario",
+            params={"operacao": operacao},
+            data=b"".join((primeiro, segundo)),
+            headers={"Content-Type": "application/octet-stream", "Accept": "application/octet-stream"},
+        )
+
+        if resposta.status_code != 200:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+
+        # Copia os bytes da resposta diretamente para um 'array("d")'.
+        resultados = array("d")
+        resultados.frombytes(resposta.content)
+        if sys.byteorder != "little":
+            resultados.byteswap()
+
+        return {"resultados": resultados, "quantidade_erros": int(resposta.headers["X-Quantidade-Erros"])}
+
+    # Envia uma coluna de números para ser guardada no servidor como um
+    # conjunto de dados e retorna a sua descrição ('id' e 'tamanho').
+    # 'valores' pode ser um array do NumPy, um 'array("d")' ou uma lista.
+    def enviar_conjunto(self, valores):
+
+        resposta = self._enviar(
+            "POST", "/conjuntos", data=bytes(visao_float64(valores)),
+            headers={"Content-Type": "application/octet-stream"},
+        )
+        if resposta.status_code != 201:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Aplica uma operação a um conjunto guardado e a outro conjunto
+    # ('conjunto') ou a um número ('escalar'). O resultado é guardado
+    # como um novo conjunto, cuja descrição é retornada.
+    def operar_conjunto(self, id_conjunto, operacao, conjunto=None, escalar=None):
+
+        corpo = {"operacao": operacao, "conjunto": conjunto, "escalar": escalar}
+        resposta = self._enviar("POST", f"/conjuntos/{id_conjunto}/operacoes", json=corpo)
+        if resposta.status_code != 201:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Retorna as reduções (soma, média, mínimo, ...) de um conjunto guardado.
+    def reduzir_conjunto(self, id_conjunto):
+
+        resposta = self._enviar("GET", f"/conjuntos/{id_conjunto}/reducoes")
+        if resposta.status_code != 200:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Baixa os números de um conjunto guardado em um 'array("d")'.
+    def baixar_conjunto(self, id_conjunto):
+
+        resposta = self._enviar("GET", f"/conjuntos/{id_conjunto}/dados")
+        if resposta.status_code != 200:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+
+        valores = array("d")
+        valores.frombytes(resposta.content)
+        if sys.byteorder != "little":
+            valores.byteswap()
+        return valores
+
+    # Apaga um conjunto guardado. Retorna 'True' se ele existia.
+    def apagar_conjunto(self, id_conjunto):
+        return self._enviar("DELETE", f"/conjuntos/{id_conjunto}").status_code == 204
+
+    # Cria um trabalho assíncrono no servidor e retorna o seu andamento
+    # inicial, com o identificador ('id'). O trabalho é um lote
+    # ('operacao', 'numero1' e 'numero2', como em 'consumir_lote') ou uma
+    # operação sobre um conjunto guardado ('conjunto'), com o segundo
+    # operando em outro conjunto ('segundo_conjunto') ou em um número
+    # ('escalar').
+    def criar_trabalho(self, operacao, numero1=None, numero2=None, conjunto=None, segundo_conjunto=None,
+                       escalar=None):
+
+        corpo = {"operacao": operacao}
+        if conjunto is None:
+            corpo.update(numero1=list(numero1), numero2=list(numero2))
+        else:
+            corpo.update(conjunto=conjunto, segundo_conjunto=segundo_conjunto, escalar=escalar)
+
+        resposta = self._enviar("POST", "/trabalhos", json=corpo)
+        if resposta.status_code != 202:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Consulta o andamento de um trabalho.
+    def consultar_trabalho(self, id_trabalho):
+
+        resposta = self._enviar("GET", f"/trabalhos/{id_trabalho}")
+        if resposta.status_code != 200:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Acompanha um trabalho pelos eventos do servidor (Server-Sent
+    # Events), gerando o andamento a cada bloco concluído, até o estado
+    # final. Os trabalhos ficam no servidor que os recebeu, por isso a
+    # conexão vai sempre para a URL principal, sem cópias redundantes.
+    def acompanhar_trabalho(self, id_trabalho):
+
+        self.disjuntor.permitir()
+        resposta = self._tentar(self.urls[0], "GET", f"/trabalhos/{id_trabalho}/eventos", {"stream": True})
+        with resposta:
+            if resposta.status_code != 200:
+                yield {"erro": resposta.status_code, "mensagem": resposta.text}
+                return
+
+            # Cada evento termina com uma linha vazia; as linhas iniciadas
+            # por ':' são comentários que apenas mantêm a conexão aberta.
+            dados = []
+            for linha in resposta.iter_lines(decode_unicode=True):
+                if linha.startswith("data:"):
+                    dados.append(linha[5:].strip())
+                elif not linha and dados:
+                    yield json.loads("\n".join(dados))
+                    dados = []
+
+    # Retorna o resultado de um trabalho concluído: o mesmo formato de
+    # 'consumir_lote' ou, sobre conjuntos, a descrição do conjunto de
+    # resultado ('conjunto') e a quantidade de erros.
+    def obter_resultado_trabalho(self, id_trabalho):
+
+        resposta = self._enviar("GET", f"/trabalhos/{id_trabalho}/resultado")
+        if resposta.status_code != 200:
+            return {"erro": resposta.status_code, "mensagem": resposta.text}
+        return resposta.json()
+
+    # Aguarda o fim de um trabalho acompanhando os seus eventos e retorna
+    # o resultado. 'progresso', se informado, é chamado com o andamento
+    # a cada bloco concluído.
+    def aguardar_trabalho(self, id_trabalho, progresso=None):
+
+        for andamento in self.acompanhar_trabalho(id_trabalho):
+            if "erro" in andamento and "estado" not in andamento:
+                return andamento
+            if progresso is not None:
+                progresso(andamento)
+
+        return self.obter_resultado_trabalho(id_trabalho)
+
+    # Cancela um trabalho em andamento ou descarta um trabalho concluído.
+    # Retorna 'True' se ele existia.
+    def cancelar_trabalho(self, id_trabalho):
+        return self._enviar("DELETE", f"/trabalhos/{id_trabalho}").status_code == 204
+
+    # Fecha a sessão e todas as conexões abertas do pool, além das
+    # threads das requisições redundantes, se houver.
+    def fechar(self):
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+        self.sessao.close()
+
+    # Permite usar o cliente com 'with', fechando as conexões
+    # automaticamente ao final do bloco.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+# Define a classe 'AgrupadorRequisicoes', que reúne chamadas
+# individuais feitas por várias threads em lotes enviados à rota
+# '/lote'. Cada chamada espera alguns milissegundos (ou até que
+# 'tamanho_maximo' chamadas estejam pendentes) e recebe o seu próprio
+# resultado, no mesmo formato retornado por 'ClienteOperacoes.consumir'.
+class AgrupadorRequisicoes:
+
+    # O construtor recebe o cliente usado para enviar os lotes, o
+    # tamanho máximo de cada lote e o tempo máximo de espera.
+    def __init__(self, cliente, tamanho_maximo=TAMANHO_MAXIMO_AGRUPAMENTO, espera_maxima=ESPERA_MAXIMA_AGRUPAMENTO):
+
+        self.cliente = cliente
+        self.tamanho_maximo = tamanho_maximo
+        self.espera_maxima = espera_maxima
+
+        # Fila onde as chamadas aguardam para serem agrupadas e a
+        # thread que as retira da fila e envia os lotes.
+        self.fila = queue.Queue()
+        self.thread = threading.Thread(target=self._executar, daemon=True)
+        self.thread.start()
+
+        # Indica que 'fechar' já foi chamado. A trava garante que nenhuma
+        # chamada entre na fila depois do sinal de encerramento.
+        self.fechado = False
+        self.trava = threading.Lock()
+
+    # Coloca uma operação na fila e retorna imediatamente um 'Future',
+    # que será resolvido quando o lote que a contém for respondido.
+    # Depois de fechado o agrupador (ex: uma chamada que o obteve logo
+    # antes de 'desativar_agrupamento'), a operação é enviada diretamente
+    # pelo cliente, em vez de ficar na fila sem ser respondida.
+    def enviar(self, operacao, numero1, numero2):
+
+        futuro = Future()
+        with self.trava:
+            if not self.fechado:
+                self.fila.put((operacao, numero1, numero2, futuro))
+                return futuro
+
+        try:
+            futuro.set_result(self.cliente.consumir(operacao, numero1, numero2))
+        except Exception as erro:
+            futuro.set_exception(erro)
+        return futuro
+
+    # Realiza uma operação através do agrupador, bloqueando até que
+    # o resultado esteja disponível.
+    def consumir(self, operacao, numero1, numero2):
+        return self.enviar(operacao, numero1, numero2).result()
+
+    # Encerra a thread de envio depois que as chamadas já enfileiradas
+    # forem respondidas. Pode ser chamada mais de uma vez.
+    def fechar(self):
+
+        with self.trava:
+            if not self.fechado:
+                self.fechado = True
+                self.fila.put(None)
+        self.thread.join()
+
+    # Laço executado pela thread de envio: espera a primeira chamada,
+    # acumula as seguintes até o prazo ou o tamanho máximo e envia o lote.
+    def _executar(self):
+
+        encerrar = False
+        while not encerrar:
+
+            # Aguarda a primeira chamada do próximo lote. 'None' é o
+            # sinal enviado por 'fechar' para encerrar a thread.
+            item = self.fila.get()
+            if item is None:
+                break
+
+            # Acumula novas chamadas até atingir o tamanho máximo ou
+            # até que o prazo contado a partir da primeira expire.
+            pendentes = [item]
+            prazo = time.monotonic() + self.espera_maxima
+            while len(pendentes) < self.tamanho_maximo:
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self.fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+                if item is None:
+                    encerrar = True
+                    break
+                pendentes.append(item)
+
+            self._enviar_lote(pendentes)
+
+        # Responde as chamadas que ainda estiverem na fila depois do
+        # sinal de encerramento, para que nenhum 'Future' fique pendente.
+        restantes = []
+        while True:
+            try:
+                item = self.fila.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                restantes.append(item)
+        for inicio in range(0, len(restantes), self.tamanho_maximo):
+            self._enviar_lote(restantes[inicio:inicio + self.tamanho_maximo])
+
+    # Envia um lote de chamadas pendentes e resolve o 'Future' de cada uma.
+    def _enviar_lote(self, pendentes):
+
+        operacoes, numeros1, numeros2, futuros = zip(*pendentes)
+
+        # Se o envio falhar (ex: servidor fora do ar), a mesma exceção
+        # é repassada a todos os chamadores do lote.
+        try:
+            resposta = self.cliente.consumir_lote(list(operacoes), list(numeros1), list(numeros2))
+        except Exception as erro:
+            for futuro in futuros:
+                futuro.set_exception(erro)
+            return
+
+        # Se o servidor continuou indisponível mesmo após as novas
+        # tentativas, todas as chamadas recebem o mesmo erro, em vez de
+        # sobrecarregá-lo ainda mais com uma requisição por chamada.
+        if resposta.get("erro") in STATUS_TEMPORARIOS:
+            for futuro in futuros:
+                futuro.set_result(resposta)
+            return
+
+        # Se o lote inteiro foi rejeitado (ex: uma operação desconhecida
+        # ou um número inválido), cada chamada é refeita individualmente
+        # para que apenas a chamada com problema receba o erro.
+        if "erro" in resposta:
+            for operacao, numero1, numero2, futuro in pendentes:
+                try:
+                    futuro.set_result(self.cliente.consumir(operacao, numero1, numero2))
+                except Exception as erro:
+                    futuro.set_exception(erro)
+            return
+
+        # Monta o resultado de cada chamada no mesmo formato das rotas
+        # individuais, ou o erro (ex: divisão por zero) com o mesmo corpo
+        # que a rota individual retornaria.
+        erros = {erro["indice"]: erro["detalhe"] for erro in resposta["erros"]}
+        for indice, (operacao, numero1, numero2, futuro) in enumerate(pendentes):
+            if indice in erros:
+                futuro.set_result({"erro": 400, "mensagem": formatar_mensagem_erro(erros[indice])})
+            elif operacao not in NOMES_OPERACOES:
+
+                # Operação nova no servidor, ainda não carregada com
+                # 'carregar_operacoes': sem o nome exibido, a chamada é
+                # refeita individualmente para obter a resposta exata.
+                try:
+                    futuro.set_result(self.cliente.consumir(operacao, numero1, numero2))
+                except Exception as erro:
+                    futuro.set_exception(erro)
+            else:
+                futuro.set_result({
+                    "operacao": NOMES_OPERACOES[operacao],
+                    "numero1": float(numero1),
+                    "numero2": float(numero2),
+                    "resultado": resposta["resultados"][indice],
+                })
+
+
+# Define a classe 'ClienteOperacoesWebSocket', que mantém uma única
+# conexão WebSocket aberta com a rota '/ws' da API. As operações são
+# enviadas sem esperar pelas respostas anteriores, e uma thread de
+# fundo entrega cada resposta ao chamador certo pelo seu 'id'.
+class ClienteOperacoesWebSocket:
+
+    # O construtor abre a conexão com a API. A URL do WebSocket é a
+    # URL base com o esquema 'ws' (ou 'wss', para 'https').
+    def __init__(self, url_base=URL_BASE, tempo_limite_conexao=TEMPO_LIMITE_CONEXAO):
+
+        # O 'websockets' só é necessário para este cliente. A exceção
+        # de conexão encerrada fica guardada para 'enviar' e '_receber'.
+        from websockets.exceptions import ConnectionClosed
+        from websockets.sync.client import connect as conectar_websocket
+        self.conexao_encerrada = ConnectionClosed
+
+        url = url_base.rstrip("/").replace("http", "ws", 1) + "/ws"
+        self.conexao = conectar_websocket(url, open_timeout=tempo_limite_conexao)
+
+        # Gerador de identificadores e dicionário das operações que
+        # aguardam resposta, protegido por uma trava porque várias
+        # threads podem enviar operações ao mesmo tempo.
+        self.identificadores = itertools.count()
+        self.pendentes = {}
+        self.trava = threading.Lock()
+
+        # Thread que recebe as respostas e resolve os 'Future's.
+        self.thread = threading.Thread(target=self._receber, daemon=True)
+        self.thread.start()
+
+    # Envia uma operação pela conexão e retorna imediatamente um
+    # 'Future', resolvido quando a resposta com o mesmo 'id' chegar.
+    def enviar(self, operacao, numero1, numero2):
+
+        futuro = Future()
+        with self.trava:
+            identificador = next(self.identificadores)
+            self.pendentes[identificador] = futuro
+
+        mensagem = {"id": identificador, "operacao": operacao, "numero1": numero1, "numero2": numero2}
+        try:
+            self.conexao.send(json.dumps(mensagem))
+        except self.conexao_encerrada as erro:
+            with self.trava:
+                self.pendentes.pop(identificador, None)
+            futuro.set_exception(ConnectionError(f"Conexão WebSocket encerrada: {erro}"))
+
+        return futuro
+
+    # Realiza uma operação pelo WebSocket, bloqueando até a resposta.
+    # O resultado tem o mesmo formato de 'ClienteOperacoes.consumir'.
+    def consumir(self, operacao, numero1, numero2):
+        return self.enviar(operacao, numero1, numero2).result()
+
+    # Envia todas as operações de uma vez, sem esperar pelas respostas,
+    # e retorna os resultados na mesma ordem das operações.
+    def consumir_muitos(self, operacoes):
+
+        futuros = [self.enviar(*operacao) for operacao in operacoes]
+        return [futuro.result() for futuro in futuros]
+
+    # Laço executado pela thread de fundo: recebe cada resposta e
+    # resolve o 'Future' da operação correspondente.
+    def _receber(self):
+
+        try:
+            for texto in self.conexao:
+                resposta = json.loads(texto)
+                with self.trava:
+                    futuro = self.pendentes.pop(resposta.pop("id"), None)
+                if futuro is None:
+                    continue
+
+                # Erros são convertidos para o formato usado pelas
+                # requisições HTTP: {"erro": código, "mensagem": corpo}.
+                if "erro" in resposta:
+                    futuro.set_result({"erro": resposta["erro"], "mensagem": formatar_mensagem_erro(resposta["detail"])})
+                else:
+                    futuro.set_result(resposta)
+
+        except self.conexao_encerrada:
+            pass
+
+        finally:
+
+            # Quando a conexão termina, as operações que ainda aguardavam
+            # resposta recebem um erro em vez de esperarem para sempre.
+            with self.trava:
+                futuros = list(self.pendentes.values())
+                self.pendentes.clear()
+            for futuro in futuros:
+                futuro.set_exception(ConnectionError("Conexão WebSocket encerrada"))
+
+    # Fecha a conexão e aguarda o término da thread de recebimento.
+    def fechar(self):
+
+        self.conexao.close()
+        self.thread.join()
+
+    # Permite usar o cliente com 'with', fechando a conexão
+    # automaticamente ao final do bloco.
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *excecao):
+        self.fechar()
+
+
+# Envia um fluxo de operações para a rota '/fluxo' da API e gera os
+# resultados, na mesma ordem, à medida que chegam.
+# 'operacoes' é qualquer iterável (inclusive infinito) de tuplas
+# (operacao, numero1, numero2); ele é percorrido aos poucos, em uma
+# thread de fundo, enquanto os resultados são lidos, de modo que nem
+# as operações nem os resultados precisam caber inteiros na memória.
+# Cada resultado tem o mesmo formato de 'ClienteOperacoes.consumir'.
+# Exemplo: for resultado in consumir_fluxo(ler_operacoes()): ...
+def consumir_fluxo(operacoes, url_base=URL_BASE, registros_por_bloco=REGISTROS_POR_BLOCO,
+                   tempo_limite=TEMPO_LIMITE_LEITURA):
+
+    # Abre a conexão e envia os cabeçalhos da requisição. O corpo é
+    # enviado em pedaços ('chunked'), pois o seu tamanho é desconhecido.
+    partes = urllib.parse.urlsplit(url_base)
+    classe = http.client.HTTPSConnection if partes.scheme == "https" else http.client.HTTPConnection
+    conexao = classe(partes.hostname, partes.port, timeout=tempo_limite)
+    conexao.putrequest("POST", partes.path.rstrip("/") + "/fluxo")
+    conexao.putheader("Content-Type", "application/x-ndjson")
+    conexao.putheader("Transfer-Encoding", "chunked")
+    conexao.endheaders()
+
+    # Envia um pedaço do corpo no formato 'chunked': o tamanho em
+    # hexadecimal, os dados e uma quebra de linha.
+    def enviar_pedaco(linhas):
+        dados = "".join(linhas).encode("utf-8")
+        conexao.send(f"{len(dados):X}\r\n".encode() + dados + b"\r\n")
+
+    # Thread de fundo que percorre as operações e as envia em pedaços
+    # de 'registros_por_bloco' linhas, terminando com o pedaço vazio.
+    # Se o envio falhar (ex: a leitura foi interrompida e a conexão
+    # fechada), a thread simplesmente termina. Qualquer outro erro (ex:
+    # uma operação que não é uma tupla de três elementos, ou uma exceção
+    # do próprio iterável) é guardado em 'falha' e a conexão é
+    # interrompida, para que a leitura termine logo e o gerador levante
+    # esse erro em vez de esperar pelo tempo limite.
+    falha = []
+
+    def enviar_operacoes():
+        try:
+            linhas = []
+            for operacao, numero1, numero2 in operacoes:
+                linhas.append(json.dumps({"operacao": operacao, "numero1": numero1, "numero2": numero2}) + "\n")
+                if len(linhas) >= registros_por_bloco:
+                    enviar_pedaco(linhas)
+                    linhas = []
+            if linhas:
+                enviar_pedaco(linhas)
+            conexao.send(b"0\r\n\r\n")
+        except OSError:
+            pass
+        except BaseException as erro:
+            falha.append(erro)
+            try:
+                conexao.sock.shutdown(socket.SHUT_RDWR)
+            except (AttributeError, OSError):
+                pass
+
+    envio = threading.Thread(target=enviar_operacoes, daemon=True)
+    envio.start()
+
+    try:
+
+        # Se a API recusar o fluxo inteiro, gera um único erro.
+        resposta = conexao.getresponse()
+        if resposta.status != 200:
+            yield {"erro": resposta.status, "mensagem": resposta.read().decode("utf-8", "replace")}
+        else:
+
+            # Lê a resposta linha por linha, convertendo os erros para o
+            # formato usado pelas requisições individuais.
+            for linha in resposta:
+                resultado = json.loads(linha)
+                if "erro" in resultado:
+                    yield {"erro": resultado["erro"], "mensagem": formatar_mensagem_erro(resultado["detail"])}
+                else:
+                    yield resultado
+
+    # A conexão interrompida pela thread de envio aparece aqui como um
+    # erro de leitura; o erro original da thread é levantado no lugar.
+    except (OSError, http.client.HTTPException):
+        envio.join()
+        if falha:
+            raise falha[0]
+        raise
+
+    finally:
+
+        # Fecha a conexão, o que também encerra a thread de envio se
+        # a leitura foi interrompida antes do final do fluxo.
+        conexao.close()
+        envio.join()
+
+    if falha:
+        raise falha[0]
+
+
+# Cliente compartilhado pelas funções 'consumir_*' deste módulo.
+# Como todas usam a mesma instância, as conexões são reaproveitadas
+# entre chamadas sucessivas.
+cliente_padrao = ClienteOperacoes()
+
+# Agrupador usado pelas funções 'consumir_*' quando o agrupamento
+# está ativado com 'ativar_agrupamento'. 'None' significa que cada
+# chamada é enviada individualmente.
+agrupador_padrao = None
+
+
+# Substitui o cliente compartilhado por um novo, configurado com os
+# argumentos recebidos (ex: outra URL base, pool ou tempos limite, ou
+# 'app=api_operacoes.app' para usar a API no próprio processo, sem rede).
+def configurar_cliente(**configuracao):
+
+    global cliente_padrao
+    cliente_padrao.fechar()
+
+    # Mantém o cache ativado com 'ativar_cache', se houver.
+    configuracao.setdefault("cache", cliente_padrao.cache)
+    cliente_padrao = ClienteOperacoes(**configuracao)
+
+    # Se o agrupamento estiver ativo, passa a enviar os lotes
+    # pelo novo cliente.
+    if agrupador_padrao is not None:
+        agrupador_padrao.cliente = cliente_padrao
+
+    return cliente_padrao
+
+
+# Ativa o agrupamento automático: a partir daqui, as chamadas às
+# funções 'consumir_*' são reunidas em lotes enviados à rota '/lote',
+# sem que o código que as chama precise ser alterado.
+# Os argumentos nomeados são repassados ao 'AgrupadorRequisicoes'.
+def ativar_agrupamento(**configuracao):
+
+    global agrupador_padrao
+    desativar_agrupamento()
+    agrupador_padrao = AgrupadorRequisicoes(cliente_padrao, **configuracao)
+    return agrupador_padrao
+
+
+# Desativa o agrupamento automático, voltando a enviar cada
+# chamada individualmente.
+def desativar_agrupamento():
+
+    global agrupador_padrao
+    if agrupador_padrao is not None:
+        agrupador_padrao.fechar()
+        agrupador_padrao = None
+
+
+# Ativa o cache de resultados nas funções 'consumir_*' deste módulo (e
+# no agrupador, que usa o mesmo cliente): as operações já calculadas,
+# inclusive em execuções anteriores, são respondidas sem consultar o
+# servidor. Os argumentos são repassados ao 'CacheOperacoes'.
+def ativar_cache(caminho=CAMINHO_CACHE, **configuracao):
+
+    desativar_cache()
+    cliente_padrao.cache = CacheOperacoes(caminho, **configuracao)
+    return cliente_padrao.cache
+
+
+# Desativa o cache de resultados do cliente compartilhado, fechando o
+# arquivo. Os resultados guardados permanecem nele.
+def desativar_cache():
+
+    if cliente_padrao.cache is not None:
+        cliente_padrao.cache.fechar()
+        cliente_padrao.cache = None
+
+
+# Atualiza 'NOMES_OPERACOES' com as operações disponíveis no servidor,
+# consultadas na rota de descoberta '/operacoes', e retorna os nomes
+# das operações. Se o servidor não responder, mantém a lista já
+# conhecida, para que o cliente continue funcionando.
+def carregar_operacoes(cliente=None):
+
+    try:
+        descoberta = (cliente or cliente_padrao).descobrir_operacoes()
+    except (requests.RequestException, CircuitoAberto, ValueError):
+        return list(NOMES_OPERACOES)
+
+    NOMES_OPERACOES.clear()
+    NOMES_OPERACOES.update({operacao["nome"]: operacao["descricao"] for operacao in descoberta["operacoes"]})
+    return list(NOMES_OPERACOES)
+
+
+# Realiza uma operação qualquer pelo agrupador, se estiver ativo,
+# ou diretamente pelo cliente compartilhado.
+def consumir_operacao(operacao, numero1, numero2):
+
+    if agrupador_padrao is not None:
+        return agrupador_padrao.consumir(operacao, numero1, numero2)
+
+    return cliente_padrao.consumir(operacao, numero1, numero2)
+
+
+# Realiza uma operação pelo cliente compartilhado e retorna a resposta
+# junto com os tempos de cada fase, no cliente e no servidor (veja
+# 'ClienteOperacoes.consumir_com_tempos'). Não passa pelo agrupador,
+# pois os tempos de um lote não correspondem a uma única operação.
+def consumir_com_tempos(operacao, numero1, numero2):
+    return cliente_padrao.consumir_com_tempos(operacao, numero1, numero2)
+
+
+# Define a classe 'ClienteOperacoesAssincrono', a versão assíncrona
+# do 'ClienteOperacoes'. Em vez de esperar cada resposta antes de
+# enviar a próxima requisição, ela mantém várias em andamento ao
+# mesmo tempo, limitadas por um semáforo, sobre um único pool
+# de conexões compartilhado.
+class ClienteOperacoesAssincrono:
+
+    # O construtor recebe a URL base da API, o número máximo de
+    # requisições simultâneas e os tempos limite de conexão e leitura.
+    # 'app' é uma aplicação ASGI no próprio processo; quando informada,
+    # as requisições são entregues diretamente a ela pelo transporte
+    # ASGI do 'httpx', no mesmo laço de eventos, sem passar pela rede.
+    def __init__(self, url_base=URL_BASE, max_concorrencia=MAX_CONCORRENCIA,
+                 tempo_limite_conexao=TEMPO_LIMITE_CONEXAO, tempo_limite_leitura=TEMPO_LIMITE_LEITURA, app=None):
+
+        # O semáforo impede que mais de 'max_concorrencia'
+        # requisições fiquem em andamento ao mesmo tempo.
+        self.semaforo = asyncio.Semaphore(max_concorrencia)
+
+        # Cria o cliente 'httpx' assíncrono com um pool de conexões do
+        # mesmo tamanho da concorrência, para que cada requisição em
+        # andamento tenha uma conexão keep-alive disponível. O 'httpx'
+        # só é necessário para este cliente.
+        import httpx
+        self.cliente = httpx.AsyncClient(
+            base_url=url_base.rstrip("/"),
+            limits=httpx.Limits(max_connections=max_concorrencia, max_keepalive_connections=max_concorrencia),
+            timeout=httpx.Timeout(tempo_limite_leitura, connect=tempo_limite_conexao),
+            transport=None if app is None else httpx.ASGITransport(app=app),
+        )
+
+    # Realiza uma operação na API de forma assíncrona, retornando o
+    # mesmo dicionário (resultado ou erro) que 'ClienteOperacoes.consumir'.
+    async def consumir(self, operacao, numero1, numero2):
+
+        # Aguarda uma vaga no semáforo antes de enviar a requisição.
+        async with self.semaforo:
+            resposta = await self.cliente.get(f"/{operacao}", params={"numero1": numero1, "numero2": numero2})
+
+        if resposta.status_code == 200:
+            return resposta.json()
+
+        return {"erro": resposta.status_code, "mensagem": resposta.text}
+
+    # Realiza muitas operações simultaneamente. 'operacoes' é um
+    # iterável de tuplas (operacao, numero1, numero2), e os resultados
+    # são retornados em uma lista na mesma ordem das operações.
+    async def consumir_muitos(self, operacoes):
+        return await asyncio.gather(*(self.consumir(*operacao) for operacao in operacoes))
+
+    # Fecha o cliente e todas as conexões abertas do pool.
+    async def fechar(self):
+        await self.cliente.aclose()
+
+    # Permite usar o cliente com 'async with', fechando as conexões
+    # automaticamente ao final do bloco.
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *excecao):
+        await self.fechar()
+
+
+# Função assíncrona de conveniência que cria um cliente assíncrono,
+# realiza todas as operações e fecha o cliente ao final.
+# Os argumentos nomeados são repassados ao 'ClienteOperacoesAssincrono'.
+# Exemplo: asyncio.run(consumir_muitos([("soma", 1, 2), ("divisao", 4, 2)]))
+async def consumir_muitos(operacoes, **configuracao):
+
+    async with ClienteOperacoesAssincrono(**configuracao) as cliente:
+        return await cliente.consumir_muitos(operacoes)
+
+
+# Define uma função chamada 'consumir_soma' que é usada para realizar a
+# operação de soma através da API.
+# A função recebe dois parâmetros: 'numero1' e 'numero2', que
+# são os números que você deseja somar.
+def consumir_soma(numero1, numero2):
+    return consumir_operacao("soma", numero1, numero2)
+
+
+# Define uma função chamada 'consumir_subtracao' para interagir com
+# a API que realiza operações de subtração.
+def consumir_subtracao(numero1, numero2):
+    return consumir_operacao("subtracao", numero1, numero2)
+
+
+# Define uma função chamada 'consumir_multiplicacao' para solicitar
+# uma operação de multiplicação da API.
+def consumir_multiplicacao(numero1, numero2):
+    return consumir_operacao("multiplicacao", numero1, numero2)
+
+
+# Define uma função chamada 'consumir_divisao' que é responsável
+# por interagir com a API para realizar divisões.
+def consumir_divisao(numero1, numero2):
+    return consumir_operacao("divisao", numero1, numero2)
+
+
+# Define uma função chamada 'consumir_potencia' para calcular
+# 'numero1' elevado a 'numero2' pela API.
+def consumir_potencia(numero1, numero2):
+    return consumir_operacao("potencia", numero1, numero2)
+
+
+# Define uma função chamada 'consumir_modulo' para calcular o resto
+# da divisão de 'numero1' por 'numero2' pela API.
+def consumir_modulo(numero1, numero2):
+    return consumir_operacao("modulo", numero1, numero2)
+
+
+# A condição '__name__ == "__main__"' é usada para garantir que
+# este bloco de código só será executado
+# se o script for executado diretamente. Isso previne a
+# execução do código quando o script é importado como um módulo.
+if __name__ == "__main__":
+
+    # Imprime uma linha de texto para indicar que o script começou a consumir a API.
+    print("=== Consumindo a API de Operações Matemáticas ===")
+
+    # Chama a função 'consumir_soma' com os números 10 e 5 como argumentos.
+    # A função envia uma requisição para a API para calcular a soma de 10 e 5.
+    # O resultado da operação é armazenado na variável 'resultado'.
+    resultado = consumir_soma(10, 5)
+
+    # Imprime o resultado da soma. 'resultado' deve conter o
+    # resultado da operação ou uma mensagem de erro,
+    # dependendo da resposta da API.
+    print("Soma:", resultado)
+
+    # Similar ao passo anterior, mas chama a função 'consumir_subtracao'
+    # para calcular a subtração de 10 por 5.
+    resultado = consumir_subtracao(10, 5)
+
+    # Imprime o resultado da subtração.
+    print("Subtração:", resultado)
+
+    # Chama a função 'consumir_multiplicacao' para calcular a
+    # multiplicação de 10 por 5.
+    resultado = consumir_multiplicacao(15, 5)
+
+    # Imprime o resultado da multiplicação.
+    print("Multiplicação:", resultado)
+
+    # Chama a função 'consumir_divisao' para calcular a divisão de 10 por 5.
+    resultado = consumir_divisao(10, 5)
+
+    # Imprime o resultado da divisão.
+    print("Divisão:", resultado)
+
+    # Realiza um teste adicional de divisão para um caso especial: divisão por zero.
+    # Chama a função 'consumir_divisao' com os números 10 e 0.
+    resultado = consumir_divisao(10, 0)
+
+    # Imprime o resultado da tentativa de divisão por zero.
+    # Este teste é importante pois divisão por zero é uma operação
+    # indefinida e deve ser tratada adequadamente pela API.
     print("Divisão por zero:", resultado)
\ No newline at end of file
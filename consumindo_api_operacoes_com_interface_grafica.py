@@ -1,220 +1,740 @@
-# Importa o módulo tkinter e o renomeia como 'tk', facilitando referências no código.
-# O 'ttk' é importado do 'tkinter' para usar widgets que têm um estilo melhorado.
-# O 'messagebox' é usado para mostrar caixas de diálogo de erro.
-import tkinter as tk
-from tkinter import ttk, messagebox
-
-# Importa o módulo 'requests', que permite enviar requisições HTTP
-# de maneira fácil e intuitiva em Python.
-import requests
-
-# A variável 'URL_BASE' armazena a URL base da API, que é usada para
-# construir as URLs completas das requisições.
-# A URL indica que a API está sendo executada localmente no
-# computador na porta 8000.
-URL_BASE = "http://127.0.0.1:8000"
-
-
-# Define a função 'consumir_operacao' que é responsável por
-# fazer as requisições à API.
-# A função aceita três argumentos: 'operacao', 'numero1' e 'numero2'.
-# 'operacao' é uma string que indica a operação matemática a
-# ser realizada (ex: 'soma').
-# 'numero1' e 'numero2' são os números sobre os quais a
-# operação será realizada.
-def consumir_operacao(operacao, numero1, numero2):
-
-    # Constrói a URL completa para acessar a API usando a
-    # operação especificada.
-    # A URL é formada pela URL base e o nome da operação, por
-    # exemplo, "http://127.0.0.1:8000/soma".
-    url = f"{URL_BASE}/{operacao}"
-
-    # Cria um dicionário 'parametros' que contém os parâmetros 'numero1' e 'numero2'.
-    # Estes parâmetros serão passados na URL da requisição.
-    parametros = {"numero1": numero1, "numero2": numero2}
-
-    # Tenta executar a requisição HTTP GET usando a função 'requests.get'.
-    # A URL e os parâmetros são passados como argumentos para a função.
-    try:
-
-        resposta = requests.get(url, params=parametros)
-
-        # Checa o código de status da resposta HTTP.
-        # Se o código de status for 200, a requisição foi bem-sucedida.
-        if resposta.status_code == 200:
-
-            # Extrai o 'resultado' do JSON retornado pela API e o retorna.
-            return resposta.json()["resultado"]
-
-        else:
-
-            # Se o código de status não for 200, levanta uma exceção com detalhes do erro,
-            # que são extraídos do JSON da resposta
-            # usando 'resposta.json()["detail"]'.
-            raise Exception(resposta.json()["detail"])
-
-    except Exception as e:
-
-        # Se ocorrer qualquer exceção durante a requisição ou processamento da
-        # resposta, retorna uma string contendo a mensagem de erro.
-        return f"Erro: {e}"
-
-
-# Define a função 'calcular', que é chamada quando o usuário interage com a
-# interface gráfica para realizar uma operação matemática.
-def calcular():
-
-    try:
-
-        # Tenta converter o texto inserido pelo usuário nos campos de
-        # entrada 'entrada_numero1' e 'entrada_numero2' para floats.
-        # 'entrada_numero1.get()' e 'entrada_numero2.get()' recuperam o
-        # texto desses campos de entrada.
-        numero1 = float(entrada_numero1.get())
-        numero2 = float(entrada_numero2.get())
-
-        # Recupera a operação matemática selecionada pelo usuário
-        # no 'combobox' da interface gráfica.
-        # 'operacao_selecionada.get()' retorna o valor atual
-        # selecionado no combobox 'operacao_selecionada'.
-        operacao = operacao_selecionada.get()
-
-        # Chama a função 'consumir_operacao' definida anteriormente,
-        # passando a operação e os dois números.
-        # Esta função realiza a requisição à API e retorna o resultado.
-        resultado = consumir_operacao(operacao, numero1, numero2)
-
-        # Atualiza o texto do 'resultado_label' com o resultado obtido.
-        # 'resultado_label["text"]' define o texto do rótulo 'resultado_label'
-        # para mostrar o resultado.
-        resultado_label["text"] = f"Resultado: {resultado}"
-
-    except ValueError:
-
-        # Caso ocorra um ValueError durante a conversão dos números, isso
-        # significa que o usuário não inseriu valores válidos.
-        # Mostra uma mensagem de erro usando uma caixa de diálogo de erro.
-        messagebox.showerror("Erro", "Por favor, insira números válidos!")
-
-    except Exception as e:
-
-        # Captura qualquer outra exceção que possa ocorrer durante a execução
-        # da função 'consumir_operacao' ou qualquer outra parte do bloco try.
-        # Mostra uma mensagem de erro usando uma caixa de diálogo de erro,
-        # com a mensagem da exceção convertida para string.
-        messagebox.showerror("Erro", str(e))
-
-
-# Cria a janela principal do aplicativo usando a biblioteca tkinter.
-# 'tk.Tk()' inicializa uma nova janela (ou instancia a
-# janela principal do aplicativo tkinter).
-janela = tk.Tk()
-
-# Define o título da janela que aparece na barra de título da janela.
-# 'janela.title("Calculadora com API")' coloca o
-# título "Calculadora com API" na janela criada.
-janela.title("Calculadora com API")
-
-# Configura as dimensões da janela principal.
-# 'janela.geometry("400x300")' define a largura da janela
-# para 400 pixels e a altura para 300 pixels.
-janela.geometry("400x300")
-
-# Cria um rótulo (label) que será exibido dentro da janela principal.
-# 'tk.Label(janela, text="Número 1:")' cria um rótulo com o texto "Número 1:".
-# Este rótulo serve para indicar ao usuário onde ele deve inserir o
-# primeiro número para a operação matemática.
-# 'pack(pady=5)' organiza o rótulo dentro da janela e adiciona um
-# preenchimento vertical (pady) de 5 pixels para separá-lo
-# de outros elementos.
-tk.Label(janela, text="Número 1:").pack(pady=5)
-
-# Cria um campo de entrada (Entry) onde o usuário pode digitar o primeiro número.
-# 'tk.Entry(janela, width=20)' cria uma caixa de entrada com
-# largura suficiente para 20 caracteres.
-# 'entrada_numero1' é a variável que armazena a referência a este campo de
-# entrada, permitindo que seu valor seja acessado ou
-# modificado posteriormente.
-entrada_numero1 = tk.Entry(janela, width=20)
-
-# Organiza o campo de entrada dentro da janela usando o método 'pack'.
-# 'pack()' é um gerenciador de geometria em tkinter que posiciona o widget na janela.
-# Sem parâmetros adicionais aqui, ele simplesmente adiciona o campo de
-# entrada abaixo do último widget adicionado, neste caso, o rótulo "Número 1:".
-entrada_numero1.pack()
-
-# Cria um rótulo (Label) para o segundo número da operação matemática.
-# 'tk.Label(janela, text="Número 2:")' cria um rótulo com o
-# texto "Número 2:", que será exibido na janela.
-# 'pack(pady=5)' organiza este rótulo dentro da janela, adicionando um
-# espaçamento vertical (pady) de 5 pixels acima e abaixo dele
-# para separação dos outros elementos.
-tk.Label(janela, text="Número 2:").pack(pady=5)
-
-# Cria um campo de entrada (Entry) para o usuário inserir o segundo número.
-# 'tk.Entry(janela, width=20)' cria o campo com uma largura definida
-# para acomodar 20 caracteres.
-# 'entrada_numero2' é a variável que armazena este campo de entrada,
-# permitindo acessar ou modificar seu conteúdo mais tarde.
-entrada_numero2 = tk.Entry(janela, width=20)
-
-# Organiza o campo de entrada na janela usando o método 'pack'.
-# 'pack()' adiciona o campo de entrada logo abaixo do rótulo "Número 2:".
-entrada_numero2.pack()
-
-# Cria um rótulo para indicar onde o usuário deve selecionar a
-# operação matemática desejada.
-# 'tk.Label(janela, text="Selecione a operação:")' define o texto do
-# rótulo como "Selecione a operação:".
-# Este rótulo é usado para orientar o usuário sobre onde e como
-# selecionar a operação matemática que deseja executar.
-tk.Label(janela, text="Selecione a operação:").pack(pady=5)
-
-# Cria um Combobox usando 'ttk.Combobox' que permite ao usuário escolher
-# entre várias opções em uma lista dropdown.
-# 'values=["soma", "subtracao", "multiplicacao", "divisao"]' define as
-# operações disponíveis para seleção.
-# 'state="readonly"' torna o combobox apenas para leitura, impedindo que o
-# usuário digite um valor; ele pode apenas selecionar da lista.
-operacao_selecionada = ttk.Combobox(janela, values=["soma", "subtracao", "multiplicacao", "divisao"], state="readonly")
-
-# Define o valor inicial do combobox como "soma", que será a opção mostrada
-# por padrão quando a janela for aberta.
-operacao_selecionada.set("soma")
-
-# Organiza o combobox na janela usando o método 'pack'.
-# 'pack()' adiciona o combobox abaixo do último rótulo adicionado, com um
-# espaçamento vertical conforme definido anteriormente.
-operacao_selecionada.pack()
-
-# Cria um botão para executar a operação matemática.
-# 'tk.Button(janela, text="Calcular", command=calcular)' cria um botão
-# na 'janela' com o texto "Calcular".
-# O argumento 'command=calcular' define que, quando o botão for
-# pressionado, a função 'calcular' será chamada.
-# Esta função é responsável por coletar os valores dos campos de
-# entrada, enviar esses valores para a API e exibir o resultado.
-botao_calcular = tk.Button(janela, text="Calcular", command=calcular)
-
-# Organiza o botão dentro da janela usando o método 'pack'.
-# 'pady=10' adiciona um preenchimento vertical de 10 pixels acima e abaixo do
-# botão, ajudando a separá-lo visualmente de outros elementos na interface.
-botao_calcular.pack(pady=10)
-
-# Cria um rótulo (label) para exibir o resultado da operação matemática.
-# 'tk.Label(janela, text="Resultado: ", font=("Arial", 14))' cria um rótulo
-# com o texto inicial "Resultado: ".
-# O parâmetro 'font=("Arial", 14)' define que o texto do rótulo usará a
-# fonte Arial tamanho 14, o que torna o texto maior e mais legível.
-resultado_label = tk.Label(janela, text="Resultado: ", font=("Arial", 14))
-
-# Organiza o rótulo de resultado dentro da janela usando o método 'pack'.
-# 'pady=20' adiciona um preenchimento vertical de 20 pixels
-# acima e abaixo do rótulo.
-# Isso garante que haja um espaçamento adequado entre o rótulo de
-# resultado e outros elementos da interface, melhorando a apresentação visual.
-resultado_label.pack(pady=20)
-
-# Inicia o loop da interface
+# Importa o módulo tkinter e o renomeia como 'tk', facilitando referências no código.
+# O 'ttk' é importado do 'tkinter' para usar widgets que têm um estilo melhorado.
+# O 'messagebox' é usado para mostrar caixas de diálogo de erro.
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+# Importa o módulo 'requests', que permite enviar requisições HTTP
+# de maneira fácil e intuitiva em Python.
+import requests
+
+# Importa o 'os', usado para ler a variável de ambiente do modo sem rede.
+import os
+
+# Importa o 'ThreadPoolExecutor', que executa as requisições em
+# threads de fundo para que a janela não congele enquanto a API responde.
+from concurrent.futures import ThreadPoolExecutor
+
+# Importa o necessário para o modo planilha: 'itertools' junta os
+# blocos lidos dos arquivos, 'filedialog' escolhe os arquivos, o
+# processamento em lote fornece a leitura de CSV/Parquet e o cálculo de
+# cada bloco de linhas pela rota '/lote', com as mesmas validações da
+# linha de comando, e 'planilha_api_operacoes' guarda as linhas da
+# planilha. O cliente também consulta as operações do combobox.
+import itertools
+from tkinter import filedialog
+
+from consumindo_api_operacoes import ClienteOperacoes, carregar_operacoes
+from consumindo_api_operacoes_em_lote import COLUNAS_SAIDA, calcular_bloco, ler_blocos
+from planilha_api_operacoes import DadosPlanilha, gravar_planilha, ler_linhas_coladas, montar_planilha
+
+# A variável 'URL_BASE' armazena a URL base da API, que é usada para
+# construir as URLs completas das requisições.
+# A URL indica que a API está sendo executada localmente no
+# computador na porta 8000.
+URL_BASE = "http://127.0.0.1:8000"
+
+# Tempos limite, em segundos, para conectar à API e para aguardar
+# a resposta. Sem eles, um servidor travado deixaria a requisição
+# pendente para sempre.
+TEMPO_LIMITE = (3.05, 10)
+
+# Intervalo, em milissegundos, entre as verificações feitas pela
+# janela para saber se uma requisição em andamento já terminou.
+INTERVALO_VERIFICACAO = 50
+
+# Operações exibidas no combobox enquanto a lista do servidor não é
+# carregada.
+OPERACOES_PADRAO = ["soma", "subtracao", "multiplicacao", "divisao"]
+
+# Sessão HTTP compartilhada, que reaproveita as conexões com a API
+# entre os cliques no botão "Calcular".
+sessao = requests.Session()
+
+# Marca as requisições da janela como interativas, para que o controle
+# de admissão da API as atenda antes dos lotes quando estiver
+# sobrecarregado. O servidor só considera o cabeçalho quando iniciado
+# com 'API_OPERACOES_CONFIAR_PRIORIDADE=1'; sem isso, as operações
+# individuais já são tratadas como interativas pela rota.
+sessao.headers["X-Prioridade"] = "interativa"
+
+# Modo sem rede: com a variável de ambiente 'API_OPERACOES_LOCAL' valendo
+# "1", a API roda dentro da própria janela e as requisições são
+# entregues diretamente a ela, sem precisar de um servidor uvicorn.
+app_local = None
+if os.environ.get("API_OPERACOES_LOCAL") == "1":
+    from api_operacoes import app as app_local
+    from consumindo_api_operacoes import AdaptadorASGI
+    sessao.mount(URL_BASE, AdaptadorASGI(app_local))
+
+# Threads de fundo que executam as requisições à API.
+executor = ThreadPoolExecutor(max_workers=4)
+
+# Número de linhas da planilha enviadas em cada requisição à rota
+# '/lote' e de requisições em andamento ao mesmo tempo.
+TAMANHO_LOTE_PLANILHA = 2000
+CONCORRENCIA_PLANILHA = 2
+
+# Altura, em pixels, de cada linha da tabela da planilha e, aproximada,
+# do cabeçalho. Usadas para calcular quantas linhas cabem na tabela.
+ALTURA_LINHA_PLANILHA = 20
+ALTURA_CABECALHO_PLANILHA = 25
+
+# Número de linhas roladas a cada movimento da roda do mouse.
+LINHAS_POR_ROLAGEM = 3
+
+# Threads de fundo da planilha, separadas das do cálculo individual para
+# que um lote grande não atrase o botão "Calcular" da janela principal.
+executor_planilha = ThreadPoolExecutor(max_workers=CONCORRENCIA_PLANILHA + 1)
+
+# Cliente da API usado pela planilha, com novas tentativas nas falhas
+# temporárias. Sem o cabeçalho 'X-Prioridade', as requisições à rota
+# '/lote' são tratadas como de lote pelo controle de admissão e não
+# atrasam as requisições interativas.
+cliente_planilha = ClienteOperacoes(URL_BASE, tamanho_pool=CONCORRENCIA_PLANILHA, app=app_local)
+
+# Requisições em andamento, indexadas pelos seus dados de entrada
+# (operação, número 1, número 2). Um novo clique com os mesmos dados
+# reaproveita a requisição que já está em andamento.
+requisicoes_em_andamento = {}
+
+# Dados de entrada da requisição mais recente. Somente o resultado
+# dela é exibido; respostas de requisições anteriores são ignoradas.
+requisicao_atual = None
+
+
+# Define a função 'consumir_operacao' que é responsável por
+# fazer as requisições à API.
+# A função aceita três argumentos: 'operacao', 'numero1' e 'numero2'.
+# 'operacao' é uma string que indica a operação matemática a
+# ser realizada (ex: 'soma').
+# 'numero1' e 'numero2' são os números sobre os quais a
+# operação será realizada.
+def consumir_operacao(operacao, numero1, numero2):
+
+    # Constrói a URL completa para acessar a API usando a
+    # operação especificada.
+    # A URL é formada pela URL base e o nome da operação, por
+    # exemplo, "http://127.0.0.1:8000/soma".
+    url = f"{URL_BASE}/{operacao}"
+
+    # Cria um dicionário 'parametros' que contém os parâmetros 'numero1' e 'numero2'.
+    # Estes parâmetros serão passados na URL da requisição.
+    parametros = {"numero1": numero1, "numero2": numero2}
+
+    # Tenta executar a requisição HTTP GET usando a sessão compartilhada.
+    # A URL, os parâmetros e os tempos limite são passados como argumentos.
+    try:
+
+        resposta = sessao.get(url, params=parametros, timeout=TEMPO_LIMITE)
+
+        # Checa o código de status da resposta HTTP.
+        # Se o código de status for 200, a requisição foi bem-sucedida.
+        if resposta.status_code == 200:
+
+            # Extrai o 'resultado' do JSON retornado pela API e o retorna.
+            return resposta.json()["resultado"]
+
+        else:
+
+            # Se o código de status não for 200, levanta uma exceção com detalhes do erro,
+            # que são extraídos do JSON da resposta
+            # usando 'resposta.json()["detail"]'.
+            raise Exception(resposta.json()["detail"])
+
+    except Exception as e:
+
+        # Se ocorrer qualquer exceção durante a requisição ou processamento da
+        # resposta, retorna uma string contendo a mensagem de erro.
+        return f"Erro: {e}"
+
+
+# Define a função 'acompanhar_descoberta', que aguarda a consulta das
+# operações ('carregar_operacoes', executada em uma thread de fundo ao
+# abrir a janela) terminar e então atualiza as opções do combobox.
+# Se o servidor não responder, a consulta retorna as operações já
+# conhecidas pelo cliente.
+def acompanhar_descoberta(futuro):
+
+    if not futuro.done():
+        janela.after(INTERVALO_VERIFICACAO, acompanhar_descoberta, futuro)
+        return
+
+    if futuro.cancelled() or futuro.exception() is not None:
+        return
+
+    exibir_operacoes(futuro.result())
+
+
+# Define a função 'exibir_operacoes', que troca as opções do combobox
+# pelas operações recebidas.
+def exibir_operacoes(operacoes):
+
+    if operacoes:
+        operacao_selecionada["values"] = operacoes
+
+        # Mantém a operação escolhida, se ela continuar disponível.
+        if operacao_selecionada.get() not in operacoes:
+            operacao_selecionada.set(operacoes[0])
+
+
+# Define a função 'calcular', que é chamada quando o usuário interage com a
+# interface gráfica para realizar uma operação matemática.
+def calcular():
+
+    # A função altera a variável global 'requisicao_atual'.
+    global requisicao_atual
+
+    try:
+
+        # Tenta converter o texto inserido pelo usuário nos campos de
+        # entrada 'entrada_numero1' e 'entrada_numero2' para floats.
+        # 'entrada_numero1.get()' e 'entrada_numero2.get()' recuperam o
+        # texto desses campos de entrada.
+        numero1 = float(entrada_numero1.get())
+        numero2 = float(entrada_numero2.get())
+
+        # Recupera a operação matemática selecionada pelo usuário
+        # no 'combobox' da interface gráfica.
+        # 'operacao_selecionada.get()' retorna o valor atual
+        # selecionado no combobox 'operacao_selecionada'.
+        operacao = operacao_selecionada.get()
+
+        # Os dados de entrada identificam a requisição. A partir daqui,
+        # apenas o resultado desta requisição será exibido.
+        chave = (operacao, numero1, numero2)
+        requisicao_atual = chave
+
+        # Cancela as requisições anteriores que ainda nem começaram,
+        # pois o resultado delas não seria mais exibido.
+        for outra_chave, futuro in list(requisicoes_em_andamento.items()):
+            if outra_chave != chave and futuro.cancel():
+                del requisicoes_em_andamento[outra_chave]
+
+        # Mostra ao usuário que o cálculo está em andamento.
+        resultado_label["text"] = "Resultado: calculando..."
+
+        # Se uma requisição com os mesmos dados já está em andamento,
+        # apenas aguarda por ela em vez de enviar outra igual.
+        if chave in requisicoes_em_andamento:
+            return
+
+        # Envia a função 'consumir_operacao' para uma thread de fundo,
+        # que faz a requisição à API sem bloquear a janela, e agenda a
+        # verificação do seu término no laço de eventos do tkinter.
+        futuro = executor.submit(consumir_operacao, operacao, numero1, numero2)
+        requisicoes_em_andamento[chave] = futuro
+        janela.after(INTERVALO_VERIFICACAO, acompanhar_requisicao, chave, futuro)
+
+    except ValueError:
+
+        # Caso ocorra um ValueError durante a conversão dos números, isso
+        # significa que o usuário não inseriu valores válidos.
+        # Mostra uma mensagem de erro usando uma caixa de diálogo de erro.
+        messagebox.showerror("Erro", "Por favor, insira números válidos!")
+
+    except Exception as e:
+
+        # Captura qualquer outra exceção que possa ocorrer durante a execução
+        # da função 'consumir_operacao' ou qualquer outra parte do bloco try.
+        # Mostra uma mensagem de erro usando uma caixa de diálogo de erro,
+        # com a mensagem da exceção convertida para string.
+        messagebox.showerror("Erro", str(e))
+
+
+# Define a função 'acompanhar_requisicao', executada periodicamente
+# pelo laço de eventos do tkinter até que a requisição termine.
+# Como ela roda na thread da janela, pode atualizar os widgets
+# com segurança, o que as threads de fundo não podem fazer.
+def acompanhar_requisicao(chave, futuro):
+
+    # Se a requisição ainda não terminou, verifica novamente
+    # depois de alguns milissegundos.
+    if not futuro.done():
+        janela.after(INTERVALO_VERIFICACAO, acompanhar_requisicao, chave, futuro)
+        return
+
+    # Remove a requisição da lista das que estão em andamento.
+    if requisicoes_em_andamento.get(chave) is futuro:
+        del requisicoes_em_andamento[chave]
+
+    # Ignora requisições canceladas e requisições que foram
+    # substituídas por um clique mais recente.
+    if futuro.cancelled() or chave != requisicao_atual:
+        return
+
+    # Atualiza o texto do 'resultado_label' com o resultado obtido.
+    # 'resultado_label["text"]' define o texto do rótulo 'resultado_label'
+    # para mostrar o resultado.
+    resultado_label["text"] = f"Resultado: {futuro.result()}"
+
+
+# Define a função 'abrir_planilha', que abre uma janela do modo
+# planilha, para calcular muitas operações de uma vez.
+def abrir_planilha():
+    JanelaPlanilha(janela)
+
+
+# Define a função 'fechar_janela', chamada quando o usuário fecha a
+# janela. Ela descarta as requisições pendentes e encerra a janela
+# sem esperar pelas que ainda estão em andamento.
+def fechar_janela():
+
+    executor.shutdown(wait=False, cancel_futures=True)
+    executor_planilha.shutdown(wait=False, cancel_futures=True)
+    janela.destroy()
+
+
+# Define a classe 'JanelaPlanilha', a janela do modo planilha. Ela exibe
+# as linhas em uma tabela virtualizada: o 'Treeview' tem apenas os itens
+# que cabem na tela, que são preenchidos com as linhas da posição atual
+# da barra de rolagem. Assim, abrir, rolar e atualizar a tabela custa o
+# mesmo com 100 linhas ou com 100 mil.
+# As linhas pendentes são enviadas à rota '/lote' em blocos, por threads
+# de fundo, e os resultados aparecem na tabela à medida que chegam.
+class JanelaPlanilha:
+
+    def __init__(self, mestre):
+
+        self.dados = DadosPlanilha()
+
+        # Posição da primeira linha exibida e itens do 'Treeview'.
+        self.primeira = 0
+        self.itens = []
+
+        # Blocos em andamento, como '(dados, indices, futuro)', e a
+        # posição a partir da qual são procuradas as próximas linhas pendentes.
+        self.lotes = []
+        self.proxima = 0
+
+        # 'calculando' indica que novos blocos devem ser enviados e
+        # 'ocupado' que um arquivo está sendo lido ou gravado.
+        self.calculando = False
+        self.ocupado = False
+        self.fechada = False
+
+        self.janela = tk.Toplevel(mestre)
+        self.janela.title("Planilha de operações")
+        self.janela.geometry("640x480")
+
+        # Barra de botões no topo da janela.
+        barra_botoes = tk.Frame(self.janela)
+        barra_botoes.pack(fill="x", padx=5, pady=5)
+        self.botao_abrir = tk.Button(barra_botoes, text="Abrir...", command=self.abrir)
+        self.botao_colar = tk.Button(barra_botoes, text="Colar", command=self.colar)
+        self.botao_calcular = tk.Button(barra_botoes, text="Calcular", command=self.calcular)
+        self.botao_parar = tk.Button(barra_botoes, text="Parar", command=self.parar, state="disabled")
+        self.botao_salvar = tk.Button(barra_botoes, text="Salvar...", command=self.salvar)
+        for botao in (self.botao_abrir, self.botao_colar, self.botao_calcular, self.botao_parar, self.botao_salvar):
+            botao.pack(side="left", padx=2)
+
+        # Rótulo com o andamento, na parte de baixo da janela.
+        self.andamento_label = tk.Label(self.janela, anchor="w")
+        self.andamento_label.pack(side="bottom", fill="x", padx=5, pady=5)
+
+        # A tabela e a sua barra de rolagem. A barra não é ligada ao
+        # 'Treeview', que tem apenas as linhas visíveis, e sim a
+        # 'rolar', que muda as linhas exibidas.
+        quadro = tk.Frame(self.janela)
+        quadro.pack(fill="both", expand=True, padx=5)
+        ttk.Style(self.janela).configure("Planilha.Treeview", rowheight=ALTURA_LINHA_PLANILHA)
+        self.tabela = ttk.Treeview(
+            quadro, columns=("linha",) + COLUNAS_SAIDA[:3] + ("resultado",), show="headings",
+            selectmode="none", style="Planilha.Treeview",
+        )
+        for coluna, titulo, largura in (
+            ("linha", "Linha", 60), ("operacao", "Operação", 110), ("numero1", "Número 1", 110),
+            ("numero2", "Número 2", 110), ("resultado", "Resultado", 220),
+        ):
+            self.tabela.heading(coluna, text=titulo)
+            self.tabela.column(coluna, width=largura, stretch=coluna == "resultado")
+        self.tabela.tag_configure("erro", foreground="red")
+        self.barra_rolagem = ttk.Scrollbar(quadro, orient="vertical", command=self.rolar)
+        self.barra_rolagem.pack(side="right", fill="y")
+        self.tabela.pack(side="left", fill="both", expand=True)
+
+        # Recalcula as linhas visíveis quando a janela muda de tamanho e
+        # trata a roda do mouse (no Linux, os botões 4 e 5).
+        self.tabela.bind("<Configure>", self.redimensionar)
+        for evento in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self.tabela.bind(evento, self.rolar_roda)
+        self.janela.bind("<Control-v>", lambda evento: self.colar())
+        self.janela.protocol("WM_DELETE_WINDOW", self.fechar)
+
+        self.exibir_andamento()
+
+    # Ajusta o número de itens do 'Treeview' à altura disponível. A
+    # altura do cabeçalho é medida pela posição do primeiro item, quando
+    # ele já está na tela.
+    def redimensionar(self, evento):
+
+        caixa = self.tabela.bbox(self.itens[0]) if self.itens else ""
+        cabecalho = caixa[1] if caixa else ALTURA_CABECALHO_PLANILHA
+        linhas = max((evento.height - cabecalho) // ALTURA_LINHA_PLANILHA, 1)
+
+        while len(self.itens) < linhas:
+            self.itens.append(self.tabela.insert("", "end"))
+        while len(self.itens) > linhas:
+            self.tabela.delete(self.itens.pop())
+
+        self.ir_para(self.primeira)
+
+    # Exibe as linhas a partir de 'primeira' e atualiza a barra de rolagem.
+    def ir_para(self, primeira):
+
+        total = len(self.dados)
+        self.primeira = max(min(primeira, total - len(self.itens)), 0)
+        self.atualizar_visiveis()
+
+        if total:
+            self.barra_rolagem.set(self.primeira / total, min((self.primeira + len(self.itens)) / total, 1))
+        else:
+            self.barra_rolagem.set(0, 1)
+
+    # Preenche os itens do 'Treeview' com as linhas visíveis.
+    def atualizar_visiveis(self):
+
+        for posicao, item in enumerate(self.itens):
+            indice = self.primeira + posicao
+            if indice < len(self.dados):
+                valores, erro = self.dados.descrever(indice)
+                self.tabela.item(item, values=valores, tags=("erro",) if erro else ())
+            else:
+                self.tabela.item(item, values=(), tags=())
+
+    # Chamada pela barra de rolagem: "moveto" leva a uma fração da
+    # planilha e "scroll" avança linhas ou páginas.
+    def rolar(self, acao, quantidade, unidade=None):
+
+        if acao == "moveto":
+            self.ir_para(int(float(quantidade) * len(self.dados)))
+        elif acao == "scroll":
+            passos = int(quantidade)
+            if unidade == "pages":
+                passos *= max(len(self.itens) - 1, 1)
+            self.ir_para(self.primeira + passos)
+
+    # Rola a tabela com a roda do mouse. O "break" impede que o
+    # 'Treeview' também role os seus próprios itens.
+    def rolar_roda(self, evento):
+
+        subir = evento.num == 4 or evento.delta > 0
+        self.ir_para(self.primeira + (-LINHAS_POR_ROLAGEM if subir else LINHAS_POR_ROLAGEM))
+        return "break"
+
+    # Habilita apenas os botões que podem ser usados no momento. Os
+    # dados não podem ser trocados enquanto há blocos em andamento.
+    def atualizar_botoes(self):
+
+        livre = "disabled" if self.calculando or self.ocupado or self.lotes else "normal"
+        for botao in (self.botao_abrir, self.botao_colar, self.botao_calcular, self.botao_salvar):
+            botao["state"] = livre
+        self.botao_parar["state"] = "normal" if self.calculando else "disabled"
+
+    # Mostra quantas linhas foram calculadas.
+    def exibir_andamento(self, situacao=None):
+
+        dados = self.dados
+        texto = f"{len(dados)} linhas, {dados.calculadas} calculadas, {dados.com_erro} com erro"
+        if situacao is None and self.calculando:
+            situacao = "calculando..."
+        elif situacao is None and self.lotes:
+            situacao = "parando..."
+        self.andamento_label["text"] = texto if situacao is None else f"{texto} ({situacao})"
+
+    # Aguarda uma tarefa de fundo (leitura, gravação ou descoberta das
+    # operações) e então chama 'ao_concluir' com o seu resultado.
+    def aguardar(self, futuro, ao_concluir):
+
+        if self.fechada:
+            return
+        if not futuro.done():
+            self.janela.after(INTERVALO_VERIFICACAO, self.aguardar, futuro, ao_concluir)
+            return
+
+        self.ocupado = False
+        self.atualizar_botoes()
+        if futuro.exception() is not None:
+            self.exibir_andamento()
+            messagebox.showerror("Erro", str(futuro.exception()), parent=self.janela)
+            return
+
+        ao_concluir(futuro.result())
+
+    # Lê os dados em uma thread de fundo e depois os exibe.
+    def carregar(self, futuro, situacao):
+
+        self.ocupado = True
+        self.atualizar_botoes()
+        self.exibir_andamento(situacao)
+        self.aguardar(futuro, self.exibir_dados)
+
+    def exibir_dados(self, dados):
+
+        self.dados = dados
+        self.ir_para(0)
+        self.exibir_andamento()
+
+    # Abre um arquivo CSV (ou Parquet) com as colunas 'operacao',
+    # 'numero1' e 'numero2'. O arquivo é lido em blocos pela thread de fundo.
+    def abrir(self):
+
+        caminho = filedialog.askopenfilename(
+            parent=self.janela, title="Abrir planilha",
+            filetypes=[("CSV", "*.csv"), ("Parquet", "*.parquet *.pq"), ("Todos os arquivos", "*")],
+        )
+        if not caminho:
+            return
+
+        linhas = itertools.chain.from_iterable(ler_blocos(caminho, TAMANHO_LOTE_PLANILHA, 0))
+        self.carregar(executor_planilha.submit(montar_planilha, linhas), f"lendo {os.path.basename(caminho)}...")
+
+    # Substitui a planilha pelas linhas da área de transferência.
+    def colar(self):
+
+        if self.calculando or self.ocupado or self.lotes:
+            return
+
+        try:
+            texto = self.janela.clipboard_get()
+        except tk.TclError:
+            messagebox.showerror("Erro", "A área de transferência não contém texto", parent=self.janela)
+            return
+
+        self.carregar(executor_planilha.submit(montar_planilha, ler_linhas_coladas(texto)), "lendo as linhas coladas...")
+
+    # Grava a planilha com os resultados em um arquivo CSV.
+    def salvar(self):
+
+        caminho = filedialog.asksaveasfilename(
+            parent=self.janela, title="Salvar resultados", defaultextension=".csv", filetypes=[("CSV", "*.csv")],
+        )
+        if not caminho:
+            return
+
+        self.ocupado = True
+        self.atualizar_botoes()
+        self.exibir_andamento("gravando...")
+        self.aguardar(executor_planilha.submit(gravar_planilha, self.dados, caminho), lambda _: self.exibir_andamento())
+
+    # Calcula as linhas pendentes. Antes, atualiza a lista de operações
+    # do servidor, usada por 'calcular_bloco' para recusar localmente as
+    # operações desconhecidas.
+    def calcular(self):
+
+        if self.dados.calculadas + self.dados.com_erro == len(self.dados):
+            return
+
+        self.ocupado = True
+        self.atualizar_botoes()
+        self.exibir_andamento("consultando as operações...")
+        self.aguardar(executor_planilha.submit(carregar_operacoes, cliente_planilha), self.iniciar_calculo)
+
+    # Inicia o cálculo com as operações consultadas, que também passam a
+    # ser as opções do combobox da janela principal.
+    def iniciar_calculo(self, operacoes):
+
+        exibir_operacoes(operacoes)
+        self.calculando = True
+        self.proxima = 0
+        self.enviar_lotes()
+        self.atualizar_botoes()
+        self.exibir_andamento()
+        self.janela.after(INTERVALO_VERIFICACAO, self.acompanhar_lotes)
+
+    # Envia blocos de linhas pendentes até ter 'CONCORRENCIA_PLANILHA'
+    # blocos em andamento. Limitar os blocos em andamento limita a
+    # memória usada, por maior que seja a planilha.
+    def enviar_lotes(self):
+
+        while self.calculando and len(self.lotes) < CONCORRENCIA_PLANILHA:
+            indices, self.proxima = self.dados.proximas_pendentes(self.proxima, TAMANHO_LOTE_PLANILHA)
+            if not indices:
+                self.calculando = False
+                break
+
+            bloco = [self.dados.linha(indice) for indice in indices]
+            futuro = executor_planilha.submit(calcular_bloco, cliente_planilha, bloco)
+            self.lotes.append((self.dados, indices, futuro))
+
+    # Executada periodicamente pelo laço de eventos enquanto há blocos
+    # em andamento: registra os resultados dos blocos concluídos, envia
+    # os próximos e atualiza as linhas visíveis e o andamento.
+    def acompanhar_lotes(self):
+
+        if self.fechada:
+            return
+
+        falha = None
+        for lote in [lote for lote in self.lotes if lote[2].done()]:
+            self.lotes.remove(lote)
+            dados, indices, futuro = lote
+
+            # As linhas dos blocos cancelados ou que falharam continuam
+            # pendentes e são enviadas de novo no próximo cálculo.
+            if futuro.cancelled():
+                continue
+            try:
+                resultados, erros = futuro.result()
+            except Exception as e:
+                falha = e
+                continue
+
+            for indice, resultado, erro in zip(indices, resultados, erros):
+                dados.registrar(indice, resultado, erro)
+
+        # Uma falha que persistiu após as novas tentativas do cliente
+        # (ex: API fora do ar) interrompe o cálculo.
+        if falha is not None and self.calculando:
+            self.parar()
+            messagebox.showerror("Erro", f"Cálculo interrompido: {falha}", parent=self.janela)
+
+        self.enviar_lotes()
+        self.atualizar_visiveis()
+        self.atualizar_botoes()
+        self.exibir_andamento()
+
+        if self.lotes:
+            self.janela.after(INTERVALO_VERIFICACAO, self.acompanhar_lotes)
+
+    # Para de enviar blocos e cancela os que ainda não começaram. Os
+    # que já estão na API terminam e os seus resultados são exibidos.
+    def parar(self):
+
+        self.calculando = False
+        for _, _, futuro in self.lotes:
+            futuro.cancel()
+        self.atualizar_botoes()
+        self.exibir_andamento()
+
+    def fechar(self):
+
+        self.fechada = True
+        for _, _, futuro in self.lotes:
+            futuro.cancel()
+        self.janela.destroy()
+
+
+# Cria a janela principal do aplicativo usando a biblioteca tkinter.
+# 'tk.Tk()' inicializa uma nova janela (ou instancia a
+# janela principal do aplicativo tkinter).
+janela = tk.Tk()
+
+# Define o título da janela que aparece na barra de título da janela.
+# 'janela.title("Calculadora com API")' coloca o
+# título "Calculadora com API" na janela criada.
+janela.title("Calculadora com API")
+
+# Configura as dimensões da janela principal.
+# 'janela.geometry("400x340")' define a largura da janela
+# para 400 pixels e a altura para 340 pixels.
+janela.geometry("400x340")
+
+# Cria um rótulo (label) que será exibido dentro da janela principal.
+# 'tk.Label(janela, text="Número 1:")' cria um rótulo com o texto "Número 1:".
+# Este rótulo serve para indicar ao usuário onde ele deve inserir o
+# primeiro número para a operação matemática.
+# 'pack(pady=5)' organiza o rótulo dentro da janela e adiciona um
+# preenchimento vertical (pady) de 5 pixels para separá-lo
+# de outros elementos.
+tk.Label(janela, text="Número 1:").pack(pady=5)
+
+# Cria um campo de entrada (Entry) onde o usuário pode digitar o primeiro número.
+# 'tk.Entry(janela, width=20)' cria uma caixa de entrada com
+# largura suficiente para 20 caracteres.
+# 'entrada_numero1' é a variável que armazena a referência a este campo de
+# entrada, permitindo que seu valor seja acessado ou
+# modificado posteriormente.
+entrada_numero1 = tk.Entry(janela, width=20)
+
+# Organiza o campo de entrada dentro da janela usando o método 'pack'.
+# 'pack()' é um gerenciador de geometria em tkinter que posiciona o widget na janela.
+# Sem parâmetros adicionais aqui, ele simplesmente adiciona o campo de
+# entrada abaixo do último widget adicionado, neste caso, o rótulo "Número 1:".
+entrada_numero1.pack()
+
+# Cria um rótulo (Label) para o segundo número da operação matemática.
+# 'tk.Label(janela, text="Número 2:")' cria um rótulo com o
+# texto "Número 2:", que será exibido na janela.
+# 'pack(pady=5)' organiza este rótulo dentro da janela, adicionando um
+# espaçamento vertical (pady) de 5 pixels acima e abaixo dele
+# para separação dos outros elementos.
+tk.Label(janela, text="Número 2:").pack(pady=5)
+
+# Cria um campo de entrada (Entry) para o usuário inserir o segundo número.
+# 'tk.Entry(janela, width=20)' cria o campo com uma largura definida
+# para acomodar 20 caracteres.
+# 'entrada_numero2' é a variável que armazena este campo de entrada,
+# permitindo acessar ou modificar seu conteúdo mais tarde.
+entrada_numero2 = tk.Entry(janela, width=20)
+
+# Organiza o campo de entrada na janela usando o método 'pack'.
+# 'pack()' adiciona o campo de entrada logo abaixo do rótulo "Número 2:".
+entrada_numero2.pack()
+
+# Cria um rótulo para indicar onde o usuário deve selecionar a
+# operação matemática desejada.
+# 'tk.Label(janela, text="Selecione a operação:")' define o texto do
+# rótulo como "Selecione a operação:".
+# Este rótulo é usado para orientar o usuário sobre onde e como
+# selecionar a operação matemática que deseja executar.
+tk.Label(janela, text="Selecione a operação:").pack(pady=5)
+
+# Cria um Combobox usando 'ttk.Combobox' que permite ao usuário escolher
+# entre várias opções em uma lista dropdown.
+# 'values=OPERACOES_PADRAO' define as operações disponíveis para seleção
+# até que a lista do servidor seja carregada.
+# 'state="readonly"' torna o combobox apenas para leitura, impedindo que o
+# usuário digite um valor; ele pode apenas selecionar da lista.
+operacao_selecionada = ttk.Combobox(janela, values=OPERACOES_PADRAO, state="readonly")
+
+# Define o valor inicial do combobox como "soma", que será a opção mostrada
+# por padrão quando a janela for aberta.
+operacao_selecionada.set("soma")
+
+# Organiza o combobox na janela usando o método 'pack'.
+# 'pack()' adiciona o combobox abaixo do último rótulo adicionado, com um
+# espaçamento vertical conforme definido anteriormente.
+operacao_selecionada.pack()
+
+# Cria um botão para executar a operação matemática.
+# 'tk.Button(janela, text="Calcular", command=calcular)' cria um botão
+# na 'janela' com o texto "Calcular".
+# O argumento 'command=calcular' define que, quando o botão for
+# pressionado, a função 'calcular' será chamada.
+# Esta função é responsável por coletar os valores dos campos de
+# entrada, enviar esses valores para a API e exibir o resultado.
+botao_calcular = tk.Button(janela, text="Calcular", command=calcular)
+
+# Organiza o botão dentro da janela usando o método 'pack'.
+# 'pady=10' adiciona um preenchimento vertical de 10 pixels acima e abaixo do
+# botão, ajudando a separá-lo visualmente de outros elementos na interface.
+botao_calcular.pack(pady=10)
+
+# Cria o botão que abre o modo planilha, onde muitas operações podem
+# ser coladas ou lidas de um arquivo e calculadas de uma vez.
+tk.Button(janela, text="Planilha...", command=abrir_planilha).pack()
+
+# Cria um rótulo (label) para exibir o resultado da operação matemática.
+# 'tk.Label(janela, text="Resultado: ", font=("Arial", 14))' cria um rótulo
+# com o texto inicial "Resultado: ".
+# O parâmetro 'font=("Arial", 14)' define que o texto do rótulo usará a
+# fonte Arial tamanho 14, o que torna o texto maior e mais legível.
+resultado_label = tk.Label(janela, text="Resultado: ", font=("Arial", 14))
+
+# Organiza o rótulo de resultado dentro da janela usando o método 'pack'.
+# 'pady=20' adiciona um preenchimento vertical de 20 pixels
+# acima e abaixo do rótulo.
+# Isso garante que haja um espaçamento adequado entre o rótulo de
+# resultado e outros elementos da interface, melhorando a apresentação visual.
+resultado_label.pack(pady=20)
+
+# Faz com que fechar a janela chame a função 'fechar_janela'.
+janela.protocol("WM_DELETE_WINDOW", fechar_janela)
+
+# Consulta em segundo plano as operações disponíveis no servidor,
+# sem atrasar a abertura da janela.
+janela.after(INTERVALO_VERIFICACAO, acompanhar_descoberta, executor.submit(carregar_operacoes, cliente_planilha))
+
+# Inicia o loop da interface
 janela.mainloop()
\ No newline at end of file
@@ -0,0 +1,331 @@
+# Processamento em lote de arquivos de operações pela API.
+#
+# Lê as operações de um arquivo CSV (ou Parquet, se o 'pyarrow' estiver
+# instalado) com as colunas 'operacao', 'numero1' e 'numero2', envia-as
+# à rota '/lote' em blocos, com vários blocos em andamento ao mesmo
+# tempo, e grava os resultados em um arquivo CSV na mesma ordem da
+# entrada. O arquivo é lido e gravado bloco a bloco, de modo que a
+# memória usada não depende do tamanho da entrada.
+# O progresso é gravado após cada bloco concluído; uma execução
+# interrompida pode ser retomada com '--retomar'. Com '--cache', os
+# resultados são guardados em um arquivo SQLite e as operações já
+# calculadas em execuções anteriores não são enviadas de novo.
+#
+# Exemplos:
+#   python consumindo_api_operacoes_em_lote.py operacoes.csv resultados.csv
+#   python consumindo_api_operacoes_em_lote.py operacoes.parquet resultados.csv --concorrencia 8 --tamanho-lote 5000
+#   python consumindo_api_operacoes_em_lote.py operacoes.csv resultados.csv --retomar
+#   python consumindo_api_operacoes_em_lote.py operacoes.csv resultados.csv --cache
+
+# Importa os módulos da biblioteca padrão usados pelo processamento:
+# 'argparse' para a linha de comando, 'csv' para ler e gravar os
+# arquivos, 'itertools' para separar a entrada em blocos, 'json' para o
+# arquivo de progresso, 'math' para recusar números não finitos, 'os'
+# para gravar o progresso com segurança, 'sys' para as mensagens e o
+# código de saída e 'time' para medir a vazão.
+import argparse
+import csv
+import itertools
+import json
+import math
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# Importa o 'requests', cujas exceções indicam falhas de conexão, e o
+# cliente da API com a lista de operações conhecidas e o cache de resultados.
+import requests
+from consumindo_api_operacoes import (
+    CAMINHO_CACHE, NOMES_OPERACOES, STATUS_TEMPORARIOS, URL_BASE, CacheOperacoes, CircuitoAberto, ClienteOperacoes,
+    carregar_operacoes,
+)
+
+# O Parquet é um formato de entrada opcional, disponível apenas se a
+# biblioteca 'pyarrow' estiver instalada.
+try:
+    import pyarrow.parquet as parquet
+except ImportError:
+    parquet = None
+
+# Número padrão de operações por bloco (uma requisição à rota '/lote')
+# e de blocos em andamento ao mesmo tempo.
+TAMANHO_LOTE = 1000
+CONCORRENCIA = 4
+
+# Intervalo, em segundos, entre os relatórios de andamento.
+INTERVALO_RELATORIO = 1.0
+
+# Colunas do arquivo de entrada e do arquivo de saída.
+COLUNAS_ENTRADA = ("operacao", "numero1", "numero2")
+COLUNAS_SAIDA = COLUNAS_ENTRADA + ("resultado", "erro")
+
+
+# Exceção levantada quando um bloco não pôde ser calculado (ex: o
+# servidor continuou indisponível após as novas tentativas). O
+# processamento para e pode ser retomado a partir desse bloco.
+class ErroProcessamento(Exception):
+    pass
+
+
+# Lê as operações de um arquivo CSV, pulando as 'pular' primeiras, e as
+# retorna em blocos de 'tamanho' tuplas (operacao, numero1, numero2).
+def ler_blocos_csv(caminho, tamanho, pular):
+
+    with open(caminho, newline="", encoding="utf-8") as arquivo:
+        leitor = csv.DictReader(arquivo)
+        faltando = set(COLUNAS_ENTRADA) - set(leitor.fieldnames or ())
+        if faltando:
+            raise ErroProcessamento(f"Colunas ausentes na entrada: {', '.join(sorted(faltando))}")
+
+        linhas = ((linha["operacao"], linha["numero1"], linha["numero2"]) for linha in leitor)
+        linhas = itertools.islice(linhas, pular, None)
+        while bloco := list(itertools.islice(linhas, tamanho)):
+            yield bloco
+
+
+# Lê as operações de um arquivo Parquet, grupo de linhas por grupo de
+# linhas, pulando as 'pular' primeiras, e as retorna em blocos como
+# 'ler_blocos_csv'.
+def ler_blocos_parquet(caminho, tamanho, pular):
+
+    if parquet is None:
+        raise ErroProcessamento("A leitura de arquivos Parquet requer a biblioteca 'pyarrow'")
+
+    arquivo = parquet.ParquetFile(caminho)
+    faltando = set(COLUNAS_ENTRADA) - set(arquivo.schema_arrow.names)
+    if faltando:
+        raise ErroProcessamento(f"Colunas ausentes na entrada: {', '.join(sorted(faltando))}")
+
+    for lote in arquivo.iter_batches(batch_size=tamanho, columns=list(COLUNAS_ENTRADA)):
+        if pular >= lote.num_rows:
+            pular -= lote.num_rows
+            continue
+        colunas = [lote.column(nome).to_pylist()[pular:] for nome in COLUNAS_ENTRADA]
+        pular = 0
+        yield list(zip(*colunas))
+
+
+# Escolhe o leitor pela extensão do arquivo de entrada.
+def ler_blocos(caminho, tamanho, pular):
+
+    if caminho.lower().endswith((".parquet", ".pq")):
+        return ler_blocos_parquet(caminho, tamanho, pular)
+    return ler_blocos_csv(caminho, tamanho, pular)
+
+
+# Extrai a mensagem de erro do corpo de uma resposta de erro da API
+# (ex: '{"detail":"Divisão por zero não é permitida"}').
+def extrair_detalhe(mensagem):
+
+    try:
+        return json.loads(mensagem)["detail"]
+    except (ValueError, TypeError, KeyError):
+        return mensagem
+
+
+# Calcula um bloco de operações e retorna as listas de resultados e de
+# erros, na mesma ordem do bloco. Operações desconhecidas e números
+# inválidos são recusados aqui mesmo, sem ir ao servidor, para que um
+# único registro ruim não faça a API recusar o bloco inteiro.
+def calcular_bloco(cliente, bloco):
+
+    resultados = [None] * len(bloco)
+    erros = [None] * len(bloco)
+
+    indices, operacoes, numeros1, numeros2 = [], [], [], []
+    for indice, (operacao, numero1, numero2) in enumerate(bloco):
+        if operacao not in NOMES_OPERACOES:
+            erros[indice] = f"Operação desconhecida: {operacao}"
+            continue
+        try:
+            numero1 = float(numero1)
+            numero2 = float(numero2)
+        except (TypeError, ValueError):
+            erros[indice] = "Os campos 'numero1' e 'numero2' devem ser números"
+            continue
+        if not (math.isfinite(numero1) and math.isfinite(numero2)):
+            erros[indice] = "Os campos 'numero1' e 'numero2' devem ser números finitos"
+            continue
+        indices.append(indice)
+        operacoes.append(operacao)
+        numeros1.append(numero1)
+        numeros2.append(numero2)
+
+    if not indices:
+        return resultados, erros
+
+    resposta = cliente.consumir_lote(operacoes, numeros1, numeros2)
+
+    # O servidor continuou indisponível: interrompe o processamento,
+    # que pode ser retomado a partir deste bloco.
+    if resposta.get("erro") in STATUS_TEMPORARIOS:
+        raise ErroProcessamento(f"API indisponível ({resposta['erro']}): {extrair_detalhe(resposta['mensagem'])}")
+
+    # O bloco foi recusado como um todo (ex: um resultado que não pode
+    # ser representado em JSON): cada operação é enviada
+    # individualmente, para que apenas as problemáticas fiquem com erro.
+    if "erro" in resposta:
+        for posicao, indice in enumerate(indices):
+            individual = cliente.consumir(operacoes[posicao], numeros1[posicao], numeros2[posicao])
+            if "erro" in individual:
+                erros[indice] = extrair_detalhe(individual["mensagem"])
+            else:
+                resultados[indice] = individual["resultado"]
+        return resultados, erros
+
+    for posicao, indice in enumerate(indices):
+        resultados[indice] = resposta["resultados"][posicao]
+    for erro in resposta["erros"]:
+        erros[indices[erro["indice"]]] = erro["detalhe"]
+
+    return resultados, erros
+
+
+# Grava o progresso (linhas já gravadas na saída e o tamanho da saída
+# nesse momento) em um arquivo temporário que depois substitui o
+# anterior, para que uma interrupção nunca deixe o progresso corrompido.
+def gravar_progresso(caminho, entrada, linhas, tamanho_saida):
+
+    temporario = caminho + ".tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump({"entrada": os.path.abspath(entrada), "linhas": linhas, "tamanho_saida": tamanho_saida}, arquivo)
+    os.replace(temporario, caminho)
+
+
+# Lê o progresso de uma execução anterior, ou retorna 'None' se não houver.
+def ler_progresso(caminho, entrada):
+
+    try:
+        with open(caminho, encoding="utf-8") as arquivo:
+            progresso = json.load(arquivo)
+    except FileNotFoundError:
+        return None
+
+    if progresso["entrada"] != os.path.abspath(entrada):
+        raise ErroProcessamento(f"O progresso em '{caminho}' é de outro arquivo de entrada: {progresso['entrada']}")
+    return progresso
+
+
+# Processa o arquivo de entrada inteiro, gravando os resultados na saída.
+# Retorna o número de linhas processadas nesta execução e o de erros.
+def processar(cliente, entrada, saida, caminho_progresso, tamanho_lote, concorrencia, retomar):
+
+    # Ao retomar, descarta o que foi gravado na saída depois do último
+    # bloco concluído e pula as linhas correspondentes da entrada.
+    progresso = ler_progresso(caminho_progresso, entrada) if retomar else None
+    if progresso is None:
+        linhas_concluidas = 0
+        arquivo = open(saida, "w", newline="", encoding="utf-8")
+        csv.writer(arquivo).writerow(COLUNAS_SAIDA)
+    else:
+        linhas_concluidas = progresso["linhas"]
+        arquivo = open(saida, "r+", newline="", encoding="utf-8")
+        arquivo.seek(progresso["tamanho_saida"])
+        arquivo.truncate()
+        print(f"Retomando após {linhas_concluidas} linhas", file=sys.stderr)
+
+    escritor = csv.writer(arquivo)
+    inicio = time.perf_counter()
+    ultimo_relatorio = inicio
+    linhas = 0
+    erros = 0
+
+    # Mantém até '2 * concorrencia' blocos lidos e em andamento: os
+    # resultados são gravados na ordem da entrada, à medida que o bloco
+    # mais antigo termina, e novos blocos só são lidos depois disso.
+    executor = ThreadPoolExecutor(max_workers=concorrencia)
+    pendentes = deque()
+    blocos = ler_blocos(entrada, tamanho_lote, linhas_concluidas)
+    try:
+        while True:
+            while len(pendentes) < 2 * concorrencia and (bloco := next(blocos, None)) is not None:
+                pendentes.append((bloco, executor.submit(calcular_bloco, cliente, bloco)))
+            if not pendentes:
+                break
+
+            bloco, futuro = pendentes.popleft()
+            resultados, erros_bloco = futuro.result()
+            for registro, resultado, erro in zip(bloco, resultados, erros_bloco):
+                escritor.writerow((*registro, "" if resultado is None else resultado, erro or ""))
+
+            # Grava o progresso somente depois que as linhas do bloco
+            # estão no disco.
+            arquivo.flush()
+            linhas += len(bloco)
+            erros += sum(erro is not None for erro in erros_bloco)
+            gravar_progresso(caminho_progresso, entrada, linhas_concluidas + linhas, arquivo.tell())
+
+            agora = time.perf_counter()
+            if agora - ultimo_relatorio >= INTERVALO_RELATORIO:
+                ultimo_relatorio = agora
+                print(f"{linhas_concluidas + linhas} linhas, {linhas / (agora - inicio):.0f} linhas/s, {erros} erros", file=sys.stderr)
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+        arquivo.close()
+
+    # Concluído: o progresso não é mais necessário.
+    if os.path.exists(caminho_progresso):
+        os.remove(caminho_progresso)
+    duracao = time.perf_counter() - inicio
+    print(f"Concluído: {linhas_concluidas + linhas} linhas, {linhas / max(duracao, 1e-9):.0f} linhas/s, {erros} erros", file=sys.stderr)
+    return linhas, erros
+
+
+# Lê os argumentos da linha de comando.
+def ler_argumentos():
+
+    parser = argparse.ArgumentParser(description="Processa um arquivo de operações pela API de Operações Matemáticas")
+    parser.add_argument("entrada", help="arquivo CSV ou Parquet com as colunas 'operacao', 'numero1' e 'numero2'")
+    parser.add_argument("saida", help="arquivo CSV de resultados")
+    parser.add_argument("--url", default=URL_BASE, help="URL base da API")
+    parser.add_argument("--local", action="store_true", help="usa a API no próprio processo, sem servidor")
+    parser.add_argument("--tamanho-lote", type=int, default=TAMANHO_LOTE, help="operações por requisição à rota '/lote'")
+    parser.add_argument("--concorrencia", type=int, default=CONCORRENCIA, help="requisições simultâneas")
+    parser.add_argument("--progresso", help="arquivo de progresso (padrão: SAIDA.progresso)")
+    parser.add_argument("--retomar", action="store_true", help="retoma uma execução interrompida a partir do progresso")
+    parser.add_argument("--cache", nargs="?", const=CAMINHO_CACHE,
+                        help=f"guarda os resultados em um arquivo SQLite e reaproveita os já calculados (padrão: {CAMINHO_CACHE})")
+    return parser.parse_args()
+
+
+def main():
+
+    argumentos = ler_argumentos()
+    caminho_progresso = argumentos.progresso or argumentos.saida + ".progresso"
+
+    # No modo local, as requisições são entregues diretamente à
+    # aplicação, no próprio processo.
+    app = None
+    if argumentos.local:
+        from api_operacoes import app
+
+    # Com '--cache', as operações já calculadas em execuções anteriores
+    # não são pedidas de novo ao servidor.
+    cache = CacheOperacoes(argumentos.cache) if argumentos.cache else None
+
+    cliente = ClienteOperacoes(argumentos.url, tamanho_pool=argumentos.concorrencia, app=app, cache=cache)
+    try:
+        # Atualiza a lista de operações conhecidas a partir do servidor.
+        carregar_operacoes(cliente)
+        processar(
+            cliente, argumentos.entrada, argumentos.saida, caminho_progresso,
+            argumentos.tamanho_lote, argumentos.concorrencia, argumentos.retomar,
+        )
+    except (ErroProcessamento, requests.RequestException, CircuitoAberto) as erro:
+        sys.exit(f"Erro: {erro}; use --retomar para continuar do último bloco concluído.")
+    except KeyboardInterrupt:
+        sys.exit("Interrompido; use --retomar para continuar do último bloco concluído.")
+    finally:
+        cliente.fechar()
+        if cache is not None:
+            estatisticas = cache.estatisticas()
+            print(f"Cache: {estatisticas['acertos_memoria'] + estatisticas['acertos_disco']} acertos, "
+                  f"{estatisticas['falhas']} falhas ({estatisticas['taxa_acerto']:.1%})", file=sys.stderr)
+            cache.fechar()
+
+
+# Executa o processamento apenas quando o arquivo é executado diretamente.
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+# Importa os módulos usados para medir as requisições:
+# 'time' fornece o relógio de alta resolução usado nas durações,
+# 'bisect' encontra rapidamente a faixa do histograma de cada duração
+# e 'defaultdict' cria os contadores sob demanda.
+import time
+from bisect import bisect_left
+from collections import defaultdict
+
+# Limites superiores, em segundos, das faixas do histograma de latência.
+# Vão de meio milissegundo (as operações em si) até dez segundos
+# (lotes muito grandes ou um servidor sobrecarregado).
+LIMITES_HISTOGRAMA = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Nome usado no lugar da rota quando a requisição não corresponde a
+# nenhuma rota da aplicação (ex: 404). Usar o caminho recebido criaria
+# uma série nova para cada URL inválida.
+ROTA_DESCONHECIDA = "desconhecida"
+
+# Chave do 'scope' ASGI onde o middleware guarda o instante de chegada
+# da requisição, usado também pela medição das fases das requisições
+# (cabeçalho 'Server-Timing').
+CHAVE_INICIO = "api_operacoes.inicio"
+
+# Tipo de conteúdo do formato de texto do Prometheus.
+TIPO_CONTEUDO_PROMETHEUS = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# Define a classe 'MetricasRequisicoes', que acumula as métricas de
+# todas as requisições atendidas por este processo.
+# As atualizações são feitas apenas pelo laço de eventos do servidor,
+# em uma única thread, por isso não há travas: cada processo (worker)
+# mantém as suas próprias métricas sem disputar com os demais.
+class MetricasRequisicoes:
+
+    def __init__(self):
+
+        # Número de requisições por (método, rota, status).
+        self.contagens = defaultdict(int)
+
+        # Histograma de latência por (método, rota): a contagem de cada
+        # faixa (com uma faixa extra para durações acima do último limite),
+        # a soma das durações e o número de requisições.
+        self.histogramas = defaultdict(lambda: [[0] * (len(LIMITES_HISTOGRAMA) + 1), 0.0, 0])
+
+        # Número de requisições sendo atendidas neste momento.
+        self.em_andamento = 0
+
+    # Registra uma requisição concluída.
+    def registrar(self, metodo, rota, status, duracao):
+
+        self.contagens[(metodo, rota, status)] += 1
+
+        faixas, _, _ = histograma = self.histogramas[(metodo, rota)]
+        faixas[bisect_left(LIMITES_HISTOGRAMA, duracao)] += 1
+        histograma[1] += duracao
+        histograma[2] += 1
+
+    # Gera o texto das métricas no formato lido pelo Prometheus.
+    def exportar(self):
+
+        linhas = [
+            "# HELP api_operacoes_requisicoes_total Requisições HTTP atendidas, por método, rota e status.",
+            "# TYPE api_operacoes_requisicoes_total counter",
+        ]
+        for (metodo, rota, status), contagem in sorted(self.contagens.items()):
+            linhas.append(f'api_operacoes_requisicoes_total{{metodo="{metodo}",rota="{rota}",status="{status}"}} {contagem}')
+
+        linhas += [
+            "# HELP api_operacoes_requisicoes_em_andamento Requisições HTTP sendo atendidas neste momento.",
+            "# TYPE api_operacoes_requisicoes_em_andamento gauge",
+            f"api_operacoes_requisicoes_em_andamento {self.em_andamento}",
+            "# HELP api_operacoes_duracao_segundos Latência das requisições HTTP, por método e rota.",
+            "# TYPE api_operacoes_duracao_segundos histogram",
+        ]
+        for (metodo, rota), (faixas, soma, contagem) in sorted(self.histogramas.items()):
+
+            # No formato do Prometheus, cada faixa conta as requisições
+            # com duração menor ou igual ao seu limite ('le'), então as
+            # contagens são acumuladas de uma faixa para a seguinte.
+            rotulos = f'metodo="{metodo}",rota="{rota}"'
+            acumulado = 0
+            for limite, quantidade in zip(LIMITES_HISTOGRAMA, faixas):
+                acumulado += quantidade
+                linhas.append(f'api_operacoes_duracao_segundos_bucket{{{rotulos},le="{limite}"}} {acumulado}')
+            linhas.append(f'api_operacoes_duracao_segundos_bucket{{{rotulos},le="+Inf"}} {contagem}')
+            linhas.append(f"api_operacoes_duracao_segundos_sum{{{rotulos}}} {soma}")
+            linhas.append(f"api_operacoes_duracao_segundos_count{{{rotulos}}} {contagem}")
+
+        return "\n".join(linhas) + "\n"
+
+
+# Define a classe 'MiddlewareMetricas', um middleware ASGI que envolve a
+# aplicação e registra, para cada requisição HTTP, a rota, o status e a
+# duração, além de manter o número de requisições em andamento.
+# Ele é adicionado com 'app.add_middleware(MiddlewareMetricas, metricas=...)'.
+class MiddlewareMetricas:
+
+    def __init__(self, app, metricas):
+
+        self.app = app
+        self.metricas = metricas
+
+    async def __call__(self, scope, receive, send):
+
+        # Conexões WebSocket e eventos de ciclo de vida não são medidos.
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        inicio = scope[CHAVE_INICIO] = time.perf_counter()
+        status = 500
+
+        # Intercepta o início da resposta para guardar o status enviado.
+        async def enviar(mensagem):
+            nonlocal status
+            if mensagem["type"] == "http.response.start":
+                status = mensagem["status"]
+            await send(mensagem)
+
+        self.metricas.em_andamento += 1
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            self.metricas.em_andamento -= 1
+
+            # O roteador do Starlette guarda em 'scope["route"]' a rota
+            # encontrada, cujo 'path' é o modelo da rota (ex: '/soma').
+            rota = scope.get("route")
+            caminho = getattr(rota, "path", ROTA_DESCONHECIDA)
+            self.metricas.registrar(scope["method"], caminho, status, time.perf_counter() - inicio)
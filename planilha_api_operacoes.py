@@ -0,0 +1,183 @@
+# Dados do modo planilha da calculadora com interface gráfica
+# (consumindo_api_operacoes_com_interface_grafica.py).
+#
+# Guarda as linhas da planilha em colunas compactas, lê as linhas
+# coladas de outras planilhas e grava os resultados em CSV. Nada aqui
+# depende do tkinter, de modo que os dados podem ser montados e
+# gravados pelas threads de fundo da janela e usados sem interface.
+
+# Importa os módulos usados pela planilha: 'array' guarda as colunas de
+# números em blocos contínuos de memória (8 bytes por número, em vez de
+# um objeto Python por célula), 'csv' grava os arquivos e 'math'
+# representa os números inválidos como NaN.
+import csv
+import math
+from array import array
+
+# Importa as colunas do arquivo de saída do processamento em lote,
+# usadas também nos arquivos gravados pela planilha.
+from consumindo_api_operacoes_em_lote import COLUNAS_SAIDA
+
+# Estados das linhas da planilha.
+PENDENTE = 0
+CALCULADA = 1
+COM_ERRO = 2
+
+
+# Converte um campo da planilha em número, aceitando também a vírgula
+# como separador decimal, usada pelas planilhas em português (ex: "1,5").
+# Retorna 'None' quando o campo não é um número.
+def converter_numero(campo):
+
+    try:
+        return float(campo)
+    except (TypeError, ValueError):
+        pass
+    try:
+        return float(campo.replace(",", "."))
+    except (AttributeError, ValueError):
+        return None
+
+
+# Lê as linhas coladas de uma planilha (ex: copiadas do Excel ou do
+# LibreOffice) no formato 'operacao, numero1, numero2'. As colunas podem
+# ser separadas por tabulação, ponto e vírgula ou vírgula, e a primeira
+# linha é ignorada se for o cabeçalho.
+def ler_linhas_coladas(texto):
+
+    for posicao, linha in enumerate(texto.splitlines()):
+        if not linha.strip():
+            continue
+
+        separador = "\t" if "\t" in linha else ";" if ";" in linha else ","
+        campos = [campo.strip() for campo in linha.split(separador)] + ["", ""]
+        if posicao == 0 and campos[0].lower() == "operacao":
+            continue
+
+        yield campos[0], campos[1], campos[2]
+
+
+# Define a classe 'DadosPlanilha', que guarda as linhas da planilha.
+# Cada coluna é um array compacto, e não uma lista de objetos Python,
+# para que 100 mil linhas ocupem poucos megabytes: as operações são
+# guardadas como a posição do nome em 'nomes', os números e resultados
+# como floats de 8 bytes e o estado de cada linha como um byte. Apenas
+# as mensagens de erro ficam em um dicionário, indexado pela linha.
+class DadosPlanilha:
+
+    def __init__(self):
+
+        self.nomes = []
+        self.codigos = {}
+        self.operacoes = array("I")
+        self.numeros1 = array("d")
+        self.numeros2 = array("d")
+        self.resultados = array("d")
+        self.estados = bytearray()
+        self.mensagens = {}
+
+        # Quantidade de linhas calculadas e de linhas com erro.
+        self.calculadas = 0
+        self.com_erro = 0
+
+    def __len__(self):
+        return len(self.estados)
+
+    # Acrescenta uma linha. Os números que não puderem ser convertidos
+    # deixam a linha com erro, sem enviá-la à API.
+    def adicionar(self, operacao, numero1, numero2):
+
+        operacao = "" if operacao is None else str(operacao).strip()
+        codigo = self.codigos.get(operacao)
+        if codigo is None:
+            codigo = self.codigos[operacao] = len(self.nomes)
+            self.nomes.append(operacao)
+
+        valor1 = converter_numero(numero1)
+        valor2 = converter_numero(numero2)
+        self.operacoes.append(codigo)
+        self.numeros1.append(math.nan if valor1 is None else valor1)
+        self.numeros2.append(math.nan if valor2 is None else valor2)
+        self.resultados.append(math.nan)
+        self.estados.append(PENDENTE)
+
+        if valor1 is None or valor2 is None:
+            self.registrar(len(self) - 1, None, "Os campos 'numero1' e 'numero2' devem ser números")
+
+    # Retorna a linha no formato aceito por 'calcular_bloco'.
+    def linha(self, indice):
+        return self.nomes[self.operacoes[indice]], self.numeros1[indice], self.numeros2[indice]
+
+    # Registra o resultado ou o erro de uma linha.
+    def registrar(self, indice, resultado, erro):
+
+        if erro is None and resultado is not None:
+            self.resultados[indice] = resultado
+            self.estados[indice] = CALCULADA
+            self.calculadas += 1
+        else:
+            self.mensagens[indice] = erro or "A API não retornou um resultado"
+            self.estados[indice] = COM_ERRO
+            self.com_erro += 1
+
+    # Retorna as posições das próximas 'quantidade' linhas pendentes a
+    # partir de 'inicio' e a posição onde a busca deve continuar.
+    def proximas_pendentes(self, inicio, quantidade):
+
+        indices = []
+        while len(indices) < quantidade:
+            inicio = self.estados.find(PENDENTE, inicio)
+            if inicio < 0:
+                return indices, len(self)
+            indices.append(inicio)
+            inicio += 1
+
+        return indices, inicio
+
+    # Retorna os valores exibidos na tabela para uma linha e se ela tem erro.
+    def descrever(self, indice):
+
+        estado = self.estados[indice]
+        if estado == CALCULADA:
+            resultado = formatar_numero(self.resultados[indice])
+        elif estado == COM_ERRO:
+            resultado = self.mensagens[indice]
+        else:
+            resultado = "..."
+
+        operacao, numero1, numero2 = self.linha(indice)
+        valores = (indice + 1, operacao, formatar_numero(numero1), formatar_numero(numero2), resultado)
+        return valores, estado == COM_ERRO
+
+
+# Formata um número da planilha; os números inválidos ficam em branco.
+def formatar_numero(valor):
+    return "" if math.isnan(valor) else repr(valor)
+
+
+# Monta os dados de uma planilha a partir de linhas no formato
+# '(operacao, numero1, numero2)'. Executada em uma thread de fundo.
+def montar_planilha(linhas):
+
+    dados = DadosPlanilha()
+    for operacao, numero1, numero2 in linhas:
+        dados.adicionar(operacao, numero1, numero2)
+    return dados
+
+
+# Grava a planilha em um arquivo CSV com as mesmas colunas da saída do
+# processamento em lote. As linhas ainda pendentes ficam sem resultado.
+# Executada em uma thread de fundo.
+def gravar_planilha(dados, caminho):
+
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo)
+        escritor.writerow(COLUNAS_SAIDA)
+        for indice in range(len(dados)):
+            operacao, numero1, numero2 = dados.linha(indice)
+            estado = dados.estados[indice]
+            escritor.writerow((
+                operacao, formatar_numero(numero1), formatar_numero(numero2),
+                formatar_numero(dados.resultados[indice]) if estado == CALCULADA else "",
+                dados.mensagens.get(indice, ""),
+            ))
@@ -0,0 +1,169 @@
+# Registro das operações da API de Operações Matemáticas.
+#
+# Cada operação é descrita uma única vez aqui: o nome (que também é o
+# caminho da rota), a descrição exibida nas respostas, a função escalar,
+# a função vetorizada do NumPy e a validação dos operandos. A partir do
+# registro são geradas as rotas individuais, os cálculos em lote, o
+# caminho rápido e a rota de descoberta usada pelos clientes. Para criar
+# uma operação nova basta chamar 'registrar_operacao'.
+#
+# Este módulo não depende do FastAPI, para que os cálculos possam ser
+# usados também fora do servidor (ex: em processos de trabalho).
+
+# Importa o 'operator', que fornece as operações aritméticas como
+# funções, e o NumPy, usado nos cálculos vetorizados.
+import operator
+from dataclasses import dataclass
+
+import numpy as np
+
+# Mensagem de erro usada sempre que uma divisão por zero é solicitada.
+MENSAGEM_DIVISAO_POR_ZERO = "Divisão por zero não é permitida"
+
+# Código de erro e mensagem dos resultados infinitos ou NaN (ex: a soma
+# de dois números muito grandes), que não podem ser representados em
+# JSON. O código não corresponde a nenhuma operação registrada.
+CODIGO_NAO_FINITO = 255
+MENSAGEM_NAO_FINITO = "O resultado excede o maior número representável"
+
+
+# Define a classe 'Operacao', que descreve uma operação registrada.
+# 'codigo' identifica a operação nos arrays de erros dos cálculos
+# vetorizados (0 significa "sem erro"). 'invalidos' recebe os dois
+# operandos (números ou arrays) e retorna se cada par é inválido;
+# 'None' indica que todos os pares são válidos. 'escalar' pode levantar
+# 'OverflowError' quando o resultado não cabe em um float (ex: a
+# potência), e 'vetorizada' retorna infinito nesse caso.
+@dataclass(frozen=True)
+class Operacao:
+    codigo: int
+    nome: str
+    descricao: str
+    escalar: object
+    vetorizada: object
+    invalidos: object = None
+    mensagem_erro: str = None
+
+
+# Dicionário com as operações registradas, indexadas pelo nome,
+# na ordem em que foram registradas.
+REGISTRO_OPERACOES = {}
+
+
+# Registra uma nova operação e a retorna.
+# 'vetorizada' deve aceitar os argumentos 'out' e 'where' das funções
+# universais do NumPy (ex: np.add), pois os lotes calculam apenas os
+# elementos de cada operação, escrevendo direto no array de resultados.
+def registrar_operacao(nome, descricao, escalar, vetorizada, invalidos=None, mensagem_erro=None):
+
+    operacao = Operacao(len(REGISTRO_OPERACOES) + 1, nome, descricao, escalar, vetorizada, invalidos, mensagem_erro)
+    REGISTRO_OPERACOES[nome] = operacao
+    return operacao
+
+
+# Retorna a mensagem de erro correspondente a um código de erro.
+def mensagem_erro(codigo):
+
+    if codigo == CODIGO_NAO_FINITO:
+        return MENSAGEM_NAO_FINITO
+    return OPERACOES_POR_CODIGO[codigo].mensagem_erro
+
+
+# Divisão e módulo são inválidos quando o divisor é zero.
+def divisor_zero(numero1, numero2):
+    return numero2 == 0
+
+
+# A potência é indefinida para zero elevado a um expoente negativo e,
+# nos números reais, para uma base negativa com expoente fracionário.
+# Os operadores '&' e '|' funcionam tanto com booleanos quanto com arrays.
+def potencia_indefinida(numero1, numero2):
+    return ((numero1 == 0) & (numero2 < 0)) | ((numero1 < 0) & (numero2 % 1 != 0))
+
+
+# Operações disponíveis na API.
+registrar_operacao("soma", "soma", operator.add, np.add)
+registrar_operacao("subtracao", "subtração", operator.sub, np.subtract)
+registrar_operacao("multiplicacao", "multiplicação", operator.mul, np.multiply)
+registrar_operacao("divisao", "divisão", operator.truediv, np.divide, divisor_zero, MENSAGEM_DIVISAO_POR_ZERO)
+registrar_operacao("potencia", "potência", operator.pow, np.power, potencia_indefinida,
+                   "Potência indefinida: zero com expoente negativo ou base negativa com expoente fracionário")
+registrar_operacao("modulo", "módulo", operator.mod, np.remainder, divisor_zero, "Módulo por zero não é permitido")
+
+# Operações indexadas pelo código, usadas para traduzir os códigos
+# de erro dos cálculos vetorizados nas mensagens correspondentes.
+OPERACOES_POR_CODIGO = {operacao.codigo: operacao for operacao in REGISTRO_OPERACOES.values()}
+
+
+# Calcula um lote inteiro de operações em uma única passada vetorizada.
+# 'operacoes' é o nome de uma operação (a mesma para todos os pares) ou
+# um array NumPy de nomes, com uma operação por par.
+# Retorna o array de resultados e um array com o código de erro de
+# cada elemento: 0 quando há resultado, ou o código da operação cuja
+# validação recusou o par (ex: divisão por zero).
+# 'resultados' permite informar o array onde os resultados são gravados
+# (ex: um trecho de um arquivo mapeado em memória); as posições com
+# erro não são alteradas.
+def calcular_vetorizado(operacoes, numero1, numero2, resultados=None):
+
+    # Cria o array que receberá os resultados, se não foi informado,
+    # e o dos códigos de erro, ambos com o mesmo tamanho dos operandos.
+    if resultados is None:
+        resultados = np.zeros_like(numero1)
+    erros = np.zeros(numero1.shape, dtype=np.uint8)
+
+    # Percorre cada operação registrada, calculando de uma só vez
+    # todos os pares que pedem essa operação.
+    calculados = np.zeros(numero1.shape, dtype=bool)
+    for nome, operacao in REGISTRO_OPERACOES.items():
+
+        # Seleciona os pares desta operação. Quando 'operacoes' é uma
+        # string, a comparação resulta em um único booleano que é
+        # expandido para o tamanho do lote.
+        mascara = np.broadcast_to(operacoes == nome, numero1.shape)
+        if not mascara.any():
+            continue
+
+        # Separa os pares recusados pela validação, que são reportados
+        # individualmente em vez de falhar o lote inteiro.
+        if operacao.invalidos is not None:
+            invalidos = mascara & operacao.invalidos(numero1, numero2)
+            erros[invalidos] = operacao.codigo
+            mascara = mascara & ~invalidos
+
+        # Aplica a função do NumPy apenas aos elementos selecionados,
+        # escrevendo diretamente no array de resultados. Os resultados
+        # que estouram viram infinito sem aviso; quem precisa de valores
+        # finitos (ex: as respostas JSON) os trata com 'separar_erros'.
+        with np.errstate(over="ignore"):
+            operacao.vetorizada(numero1, numero2, out=resultados, where=mascara)
+        calculados |= mascara
+
+    # Os pares de operandos finitos cujo resultado estourou (ex: 10 ** 400)
+    # são marcados como erro, como a rota individual faz.
+    estouros = calculados & ~np.isfinite(resultados) & np.isfinite(numero1) & np.isfinite(numero2)
+    erros[estouros] = CODIGO_NAO_FINITO
+
+    return resultados, erros
+
+
+# Prepara os resultados dos cálculos vetorizados para uma resposta
+# JSON: retorna a lista de resultados, com 'None' (null no JSON) nas
+# posições que não têm resultado, e a lista de erros com o índice e o
+# motivo de cada uma. 'erros' é o array de códigos de erro retornado
+# pelos cálculos vetorizados (0 significa "sem erro"). Os resultados
+# infinitos ou NaN, que o JSON não representa, também viram erros,
+# em vez de recusar a resposta inteira.
+def separar_erros(resultados, erros):
+
+    nao_finitos = (erros == 0) & ~np.isfinite(resultados)
+    if nao_finitos.any():
+        erros = np.where(nao_finitos, CODIGO_NAO_FINITO, erros)
+
+    lista_resultados = resultados.tolist()
+    lista_erros = []
+    for indice in np.flatnonzero(erros).tolist():
+        lista_resultados[indice] = None
+        lista_erros.append({"indice": indice, "detalhe": mensagem_erro(int(erros[indice]))})
+
+    return lista_resultados, lista_erros
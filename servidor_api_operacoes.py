@@ -0,0 +1,239 @@
+# Lançador de produção da API de Operações Matemáticas.
+#
+# Inicia vários processos do servidor, por padrão um por núcleo, que
+# atendem a mesma porta. Com 'SO_REUSEPORT' (Linux e BSDs), cada
+# processo abre o seu próprio socket na porta e o kernel distribui as
+# conexões entre eles; sem ele, o socket aberto pelo processo principal
+# é compartilhado pelos processos. O 'uvloop' e o 'httptools' são usados
+# automaticamente pelo uvicorn quando estão instalados.
+#
+# O processo principal apenas supervisiona: reinicia os processos que
+# terminarem inesperadamente e, ao receber SIGTERM (ou Ctrl+C), encerra
+# de forma ordenada: a rota '/pronto' passa a responder 503, para que
+# os balanceadores de carga deixem de enviar tráfego, e após
+# '--atraso-drenagem' segundos cada processo para de aceitar conexões e
+# conclui as requisições em andamento, por até '--tempo-drenagem'
+# segundos.
+#
+# Cada processo tem o seu próprio estado (cache, métricas, controle de
+# admissão e trabalhos assíncronos); a rota '/metrics' descreve apenas
+# o processo que respondeu. Em particular, o cache de resultados não é
+# compartilhado: cada processo guarda as suas próprias respostas, e a
+# taxa de acerto e o tamanho do cache informados por '/cache' e
+# '/metrics' variam conforme o processo que respondeu. Os ETags não
+# dependem do processo (são derivados da versão da API, do caminho e da
+# query string), então um 'If-None-Match' é respondido com 304 por
+# qualquer processo, mesmo que ele ainda não tenha a resposta em cache.
+#
+# Exemplos:
+#   python -m servidor_api_operacoes
+#   python -m servidor_api_operacoes --host 0.0.0.0 --porta 8000 --processos 32 --atraso-drenagem 5
+
+# Importa os módulos usados pelo lançador: 'argparse' para a linha de
+# comando, 'importlib.util' para verificar se o 'uvloop' e o 'httptools'
+# estão instalados, 'multiprocessing' para os processos do servidor,
+# 'os' para o número de núcleos e as variáveis de ambiente, 'signal'
+# para o encerramento, 'socket' para abrir a porta, 'sys' para as
+# mensagens e 'time' para o prazo da drenagem.
+import argparse
+import importlib.util
+import multiprocessing
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+import time
+
+# Importa o uvicorn, o servidor ASGI que executa a aplicação em cada processo.
+import uvicorn
+
+# Valores padrão da linha de comando. 'TEMPO_DRENAGEM' é o prazo, em
+# segundos, para concluir as requisições em andamento no encerramento,
+# e 'ATRASO_DRENAGEM' o tempo entre a rota '/pronto' passar a responder
+# 503 e os processos pararem de aceitar conexões.
+HOST = os.environ.get("API_OPERACOES_HOST", "127.0.0.1")
+PORTA = int(os.environ.get("API_OPERACOES_PORTA", "8000"))
+PROCESSOS = int(os.environ.get("API_OPERACOES_PROCESSOS", "0")) or os.cpu_count() or 1
+TEMPO_DRENAGEM = 30
+ATRASO_DRENAGEM = 0
+
+# Um processo que termina menos de 'TEMPO_MINIMO_EXECUCAO' segundos
+# depois de iniciado (ex: por um erro de configuração) só é reiniciado
+# após 'ESPERA_REINICIO' segundos, para não reiniciar sem parar.
+TEMPO_MINIMO_EXECUCAO = 1.0
+ESPERA_REINICIO = 1.0
+
+
+# Escreve uma mensagem do lançador na saída de erros.
+def registrar(mensagem):
+    print(f"[servidor_api_operacoes] {mensagem}", file=sys.stderr, flush=True)
+
+
+# Abre o socket TCP da porta do servidor. Com 'reutilizar_porta', outros
+# sockets com a mesma opção podem abrir a mesma porta ('SO_REUSEPORT').
+# O socket não é colocado em escuta aqui: o uvicorn o faz em cada
+# processo, ao iniciar.
+def criar_soquete(host, porta, reutilizar_porta):
+
+    familia = socket.AF_INET6 if ":" in host else socket.AF_INET
+    soquete = socket.socket(familia, socket.SOCK_STREAM)
+    soquete.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reutilizar_porta:
+        soquete.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    soquete.bind((host, porta))
+    soquete.set_inheritable(True)
+    return soquete
+
+
+# Executa um processo do servidor. 'soquete' é o socket compartilhado
+# ou 'None' quando o processo deve abrir o seu próprio com 'SO_REUSEPORT'.
+# 'encerrando' é o evento compartilhado que a rota '/pronto' consulta.
+# Com 'loop' e 'http' em "auto", o uvicorn usa o 'uvloop' e o
+# 'httptools' se estiverem instalados, ou as implementações padrão.
+def executar_processo(host, porta, soquete, encerrando, tempo_drenagem, nivel_log, log_acesso):
+
+    from api_operacoes import app
+    app.state.encerrando = encerrando
+
+    if soquete is None:
+        soquete = criar_soquete(host, porta, reutilizar_porta=True)
+
+    configuracao = uvicorn.Config(
+        app, loop="auto", http="auto", timeout_graceful_shutdown=tempo_drenagem,
+        log_level=nivel_log, access_log=log_acesso,
+    )
+    uvicorn.Server(configuracao).run(sockets=[soquete])
+
+
+# Define a classe 'Supervisor', que inicia os processos do servidor,
+# reinicia os que terminarem e conduz o encerramento ordenado.
+class Supervisor:
+
+    def __init__(self, argumentos):
+
+        self.argumentos = argumentos
+
+        # O método 'spawn' inicia cada processo do zero, importando a
+        # aplicação nele, o que funciona da mesma forma em todos os
+        # sistemas e evita copiar o estado do processo principal.
+        self.contexto = multiprocessing.get_context("spawn")
+        self.encerrando = self.contexto.Event()
+        self.processos = {}
+
+        # O socket aberto aqui reserva a porta e falha cedo se ela
+        # estiver ocupada. Com 'SO_REUSEPORT' ele nunca entra em escuta
+        # (o kernel só entrega conexões aos sockets em escuta, os dos
+        # processos); sem ele, é o socket compartilhado pelos processos.
+        self.reutilizar_porta = hasattr(socket, "SO_REUSEPORT")
+        self.soquete = criar_soquete(argumentos.host, argumentos.porta, self.reutilizar_porta)
+
+    # Inicia o processo de número 'indice'.
+    def iniciar(self, indice):
+
+        argumentos = self.argumentos
+        processo = self.contexto.Process(
+            target=executar_processo, name=f"api_operacoes-{indice}",
+            args=(
+                argumentos.host, argumentos.porta, None if self.reutilizar_porta else self.soquete,
+                self.encerrando, argumentos.tempo_drenagem, argumentos.nivel_log, argumentos.log_acesso,
+            ),
+        )
+        processo.start()
+        self.processos[indice] = (processo, time.monotonic())
+
+    # Marca o encerramento. Chamada pelos sinais SIGTERM e SIGINT.
+    def encerrar(self, sinal, quadro):
+        self.encerrando.set()
+
+    # Inicia os processos e os supervisiona até o encerramento.
+    def executar(self):
+
+        signal.signal(signal.SIGTERM, self.encerrar)
+        signal.signal(signal.SIGINT, self.encerrar)
+
+        argumentos = self.argumentos
+        registrar(
+            f"{argumentos.processos} processos em http://{argumentos.host}:{argumentos.porta} "
+            f"({'SO_REUSEPORT' if self.reutilizar_porta else 'socket compartilhado'}, "
+            f"laço {'uvloop' if importlib.util.find_spec('uvloop') else 'asyncio'}, "
+            f"HTTP {'httptools' if importlib.util.find_spec('httptools') else 'h11'})"
+        )
+        for indice in range(argumentos.processos):
+            self.iniciar(indice)
+
+        # Aguarda o término de algum processo (ou o intervalo, para
+        # verificar o encerramento) e reinicia os que terminaram.
+        while not self.encerrando.is_set():
+            multiprocessing.connection.wait([processo.sentinel for processo, _ in self.processos.values()], timeout=1)
+            for indice, (processo, inicio) in list(self.processos.items()):
+                if processo.exitcode is None or self.encerrando.is_set():
+                    continue
+
+                registrar(f"Processo {processo.pid} terminou com código {processo.exitcode}; reiniciando")
+                if time.monotonic() - inicio < TEMPO_MINIMO_EXECUCAO:
+                    time.sleep(ESPERA_REINICIO)
+                self.iniciar(indice)
+
+        self.drenar()
+
+    # Encerra os processos de forma ordenada. A rota '/pronto' já
+    # responde 503 desde a marcação do encerramento; após o atraso, o
+    # SIGTERM faz cada processo parar de aceitar conexões e concluir as
+    # requisições em andamento. Os que não terminarem no prazo são
+    # interrompidos.
+    def drenar(self):
+
+        argumentos = self.argumentos
+        registrar(f"Encerrando; drenando as requisições em andamento (até {argumentos.tempo_drenagem} s)")
+        time.sleep(argumentos.atraso_drenagem)
+
+        for processo, _ in self.processos.values():
+            if processo.is_alive():
+                processo.terminate()
+
+        # O prazo inclui uma folga para o próprio encerramento do uvicorn.
+        prazo = time.monotonic() + argumentos.tempo_drenagem + 5
+        for processo, _ in self.processos.values():
+            processo.join(max(prazo - time.monotonic(), 0))
+            if processo.is_alive():
+                registrar(f"Processo {processo.pid} não terminou no prazo; interrompendo")
+                processo.kill()
+                processo.join()
+
+        self.soquete.close()
+        registrar("Encerrado")
+
+
+# Lê os argumentos da linha de comando.
+def ler_argumentos():
+
+    parser = argparse.ArgumentParser(description="Executa a API de Operações Matemáticas com vários processos")
+    parser.add_argument("--host", default=HOST, help="endereço em que o servidor escuta")
+    parser.add_argument("--porta", type=int, default=PORTA, help="porta em que o servidor escuta")
+    parser.add_argument("--processos", type=int, default=PROCESSOS, help="número de processos (padrão: um por núcleo)")
+    parser.add_argument("--tempo-drenagem", type=int, default=TEMPO_DRENAGEM,
+                        help="segundos para concluir as requisições em andamento no encerramento")
+    parser.add_argument("--atraso-drenagem", type=float, default=ATRASO_DRENAGEM,
+                        help="segundos entre '/pronto' responder 503 e os processos pararem de aceitar conexões")
+    parser.add_argument("--nivel-log", default="info", help="nível de log do uvicorn")
+    parser.add_argument("--log-acesso", action="store_true", help="registra cada requisição")
+    return parser.parse_args()
+
+
+def main():
+
+    argumentos = ler_argumentos()
+
+    # Cada processo do servidor cria o seu próprio pool de processos
+    # para os trabalhos assíncronos; sem configuração explícita, os
+    # núcleos são divididos entre eles, em vez de cada um usar todos.
+    os.environ.setdefault("API_OPERACOES_PROCESSOS_TRABALHOS", str(max((os.cpu_count() or 1) // argumentos.processos, 1)))
+
+    Supervisor(argumentos).executar()
+
+
+# Executa o lançador apenas quando o arquivo é executado diretamente
+# (ex: 'python -m servidor_api_operacoes').
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+# Medição das fases das requisições da API de Operações Matemáticas.
+#
+# As rotas criadas com a classe 'RotaComTempos' medem, em cada
+# requisição, o tempo gasto em cada fase e o informam ao cliente no
+# cabeçalho 'Server-Timing' (exibido pelas ferramentas de
+# desenvolvedor dos navegadores):
+#   roteamento   da chegada da requisição até a rota ser encontrada,
+#                incluindo os middlewares;
+#   validacao    leitura e validação dos parâmetros;
+#   threadpool   espera por uma thread do pool e volta ao laço de
+#                eventos (apenas nas rotas síncronas);
+#   manipulador  a função da rota;
+#   codificacao  conversão do retorno em JSON e montagem da resposta;
+#   total        da chegada da requisição até a resposta pronta.
+# As respostas de erro (400, 404, 422 e 500) também recebem o cabeçalho.
+#
+# Opcionalmente, algumas requisições são perfiladas com o cProfile e o
+# relatório é gravado em um arquivo '.prof', que pode ser lido com
+# 'python -m pstats', o snakeviz ou convertido em flame graph pelo
+# flameprof. O perfil fica desativado a menos que a variável de ambiente
+# 'API_OPERACOES_DIRETORIO_PERFIS' indique onde gravar os relatórios.
+
+# Importa os módulos usados pela medição: 'cProfile' e 'pstats' para os
+# perfis, 'contextvars' para passar as marcas de tempo da rota à função
+# da rota, 'functools' e 'inspect' para envolver a função preservando a
+# sua assinatura, 'itertools' para contar as requisições, 'os' e 're'
+# para os arquivos dos perfis e 'time' para as marcas de tempo.
+import cProfile
+import contextvars
+import functools
+import inspect
+import itertools
+import os
+import pstats
+import re
+import time
+
+# Importa a exceção HTTP, a classe base das rotas do FastAPI, a função
+# que executa código bloqueante no pool de threads e o necessário para
+# responder aos erros de validação (422) e aos erros inesperados (500).
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.exception_handlers import request_validation_exception_handler
+from fastapi.responses import PlainTextResponse
+from fastapi.routing import APIRoute
+
+# Importa a chave do 'scope' ASGI onde o middleware de métricas guarda
+# o instante de chegada da requisição, início da fase de roteamento.
+from metricas_api_operacoes import CHAVE_INICIO
+
+# Diretório onde os perfis são gravados. Sem ele, nenhuma requisição é
+# perfilada.
+DIRETORIO_PERFIS = os.environ.get("API_OPERACOES_DIRETORIO_PERFIS")
+
+# Perfila uma a cada 'PERFIL_A_CADA' requisições (0 desativa a
+# amostragem). Independentemente dela, as requisições com o cabeçalho
+# 'X-Perfil: 1' são perfiladas.
+PERFIL_A_CADA = int(os.environ.get("API_OPERACOES_PERFIL_A_CADA", "0"))
+
+# Marcas de tempo da requisição em andamento, preenchidas pela rota e
+# pela função da rota. O 'ContextVar' mantém as marcas de cada
+# requisição separadas, mesmo com muitas em andamento ao mesmo tempo.
+marcas_requisicao = contextvars.ContextVar("marcas_requisicao")
+
+# Chave do 'scope' ASGI onde a rota guarda os cabeçalhos de tempos da
+# requisição, lidos pelos tratadores de exceções abaixo quando a rota
+# termina com um erro que não é uma 'HTTPException'.
+CHAVE_CABECALHOS_TEMPOS = "api_operacoes.cabecalhos_tempos"
+
+# Contador das requisições medidas, usado pela amostragem dos perfis.
+contador_requisicoes = itertools.count(1)
+
+# Indica se há um perfil em andamento no laço de eventos. O cProfile só
+# perfila uma requisição por vez em cada thread.
+perfil_ativo = False
+
+
+# Decide se a requisição deve ser perfilada.
+def deve_perfilar(request):
+
+    if DIRETORIO_PERFIS is None or perfil_ativo:
+        return False
+    if request.headers.get("x-perfil") == "1":
+        return True
+    return PERFIL_A_CADA > 0 and next(contador_requisicoes) % PERFIL_A_CADA == 0
+
+
+# Grava o perfil de uma requisição, juntando o perfil do laço de
+# eventos e, nas rotas síncronas, o da thread do pool. Retorna o nome
+# do arquivo gravado. É executada no pool de threads, para que a
+# escrita do arquivo não bloqueie o laço de eventos.
+def gravar_perfil(request, perfis):
+
+    os.makedirs(DIRETORIO_PERFIS, exist_ok=True)
+    rota = re.sub(r"[^0-9A-Za-z]+", "_", request.url.path).strip("_") or "raiz"
+    nome = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{request.method}-{rota}.prof"
+
+    estatisticas = pstats.Stats(perfis[0])
+    for perfil in perfis[1:]:
+        estatisticas.add(perfil)
+    estatisticas.dump_stats(os.path.join(DIRETORIO_PERFIS, nome))
+    return nome
+
+
+# Envolve a função da rota, registrando quando a validação terminou
+# (a função é chamada logo depois), quando a função começou e terminou
+# e quando o resultado voltou ao laço de eventos.
+# O FastAPI executa as funções síncronas no pool de threads; aqui a
+# função passa a ser assíncrona e envia ela mesma a função original ao
+# pool, para medir a espera pela thread. 'functools.wraps' preserva a
+# assinatura, da qual o FastAPI extrai os parâmetros.
+def medir_funcao(funcao):
+
+    assincrona = inspect.iscoroutinefunction(funcao)
+
+    @functools.wraps(funcao)
+    async def funcao_medida(**argumentos):
+
+        marcas = marcas_requisicao.get()
+        marcas["validado"] = time.perf_counter()
+
+        if assincrona:
+            marcas["inicio_funcao"] = marcas["validado"]
+            try:
+                return await funcao(**argumentos)
+            finally:
+                marcas["fim_funcao"] = marcas["retorno"] = time.perf_counter()
+
+        def executar():
+
+            marcas["inicio_funcao"] = time.perf_counter()
+            perfil = None
+            if "perfis" in marcas:
+                perfil = cProfile.Profile()
+                marcas["perfis"].append(perfil)
+                perfil.enable()
+            try:
+                return funcao(**argumentos)
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+                marcas["fim_funcao"] = time.perf_counter()
+
+        try:
+            return await run_in_threadpool(executar)
+        finally:
+            marcas["retorno"] = time.perf_counter()
+
+    return funcao_medida
+
+
+# Monta o valor do cabeçalho 'Server-Timing' a partir das marcas de
+# tempo. As fases não medidas (ex: a validação, quando a resposta veio
+# do cache) são omitidas. As durações são em milissegundos.
+def formatar_server_timing(marcas, inicio, fim):
+
+    fases = []
+    if inicio is not None:
+        fases.append(("roteamento", marcas["rota"] - inicio))
+    if "validado" in marcas:
+        fases.append(("validacao", marcas["validado"] - marcas["rota"]))
+    if "inicio_funcao" in marcas and "fim_funcao" in marcas:
+        espera = (marcas["inicio_funcao"] - marcas["validado"]) + (marcas["retorno"] - marcas["fim_funcao"])
+        if espera:
+            fases.append(("threadpool", espera))
+        fases.append(("manipulador", marcas["fim_funcao"] - marcas["inicio_funcao"]))
+    if "retorno" in marcas:
+        fases.append(("codificacao", fim - marcas["retorno"]))
+    fases.append(("total", fim - (marcas["rota"] if inicio is None else inicio)))
+
+    return ", ".join(f"{nome};dur={duracao * 1000:.3f}" for nome, duracao in fases)
+
+
+# Define a classe 'RotaComTempos', um tipo de rota do FastAPI que mede
+# as fases de cada requisição e as informa no cabeçalho 'Server-Timing'.
+# Pode ser combinada com outros tipos de rota por herança; ela deve vir
+# primeiro, para medir também o que eles fazem (ex: o cache).
+class RotaComTempos(APIRoute):
+
+    def __init__(self, path, endpoint, **argumentos):
+        super().__init__(path, medir_funcao(endpoint), **argumentos)
+
+    def get_route_handler(self):
+
+        manipulador_original = super().get_route_handler()
+
+        async def manipulador_com_tempos(request):
+
+            global perfil_ativo
+
+            marcas = {"rota": time.perf_counter()}
+            token = marcas_requisicao.set(marcas)
+
+            # Perfila o laço de eventos durante a requisição; a thread do
+            # pool, se houver, é perfilada pela função medida.
+            perfil = None
+            if deve_perfilar(request):
+                perfil = cProfile.Profile()
+                marcas["perfis"] = [perfil]
+                perfil_ativo = True
+                perfil.enable()
+
+            # As respostas de erro levantadas pela rota (ex: divisão por
+            # zero) também recebem o cabeçalho, pelos cabeçalhos da exceção.
+            # Os demais erros (validação e erros inesperados) recebem os
+            # cabeçalhos guardados no 'scope' pelos tratadores de exceções.
+            cabecalhos = request.scope[CHAVE_CABECALHOS_TEMPOS] = {}
+            try:
+                resposta = await manipulador_original(request)
+                cabecalhos = resposta.headers
+            except HTTPException as erro:
+                erro.headers = cabecalhos = dict(erro.headers or {})
+                raise
+            finally:
+                if perfil is not None:
+                    perfil.disable()
+                    perfil_ativo = False
+                marcas_requisicao.reset(token)
+
+                cabecalhos["Server-Timing"] = formatar_server_timing(
+                    marcas, request.scope.get(CHAVE_INICIO), time.perf_counter(),
+                )
+                if perfil is not None:
+                    cabecalhos["X-Perfil"] = await run_in_threadpool(gravar_perfil, request, marcas["perfis"])
+
+            return resposta
+
+        return manipulador_com_tempos
+
+
+# Tratador dos erros de validação (422): a mesma resposta do FastAPI,
+# com os cabeçalhos de tempos da rota.
+async def tratar_erro_validacao(request, erro):
+
+    resposta = await request_validation_exception_handler(request, erro)
+    resposta.headers.update(request.scope.get(CHAVE_CABECALHOS_TEMPOS, {}))
+    return resposta
+
+
+# Tratador dos erros inesperados (500): a mesma resposta do Starlette,
+# com os cabeçalhos de tempos da rota. O erro continua sendo registrado
+# no log pelo servidor.
+async def tratar_erro_interno(request, erro):
+    return PlainTextResponse("Internal Server Error", status_code=500, headers=request.scope.get(CHAVE_CABECALHOS_TEMPOS))
@@ -0,0 +1,52 @@
+# Testes da rota '/expressao' (api_operacoes.py), chamada diretamente
+# pelo TestClient, sem servidor.
+#
+# Execução:
+#   python -m unittest test_expressao_api_operacoes
+import unittest
+
+from fastapi.testclient import TestClient
+
+from api_operacoes import PROFUNDIDADE_MAXIMA_EXPRESSAO, TAMANHO_MAXIMO_EXPRESSAO, app
+
+
+class TestExpressao(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.cliente = TestClient(app)
+
+    def calcular(self, expressao, **variaveis):
+        return self.cliente.post("/expressao", json={"expressao": expressao, "variaveis": variaveis})
+
+    def test_expressao_simples(self):
+
+        resposta = self.calcular("(a + b) * c / d", a=1, b=2, c=3, d=4)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["resultado"], 2.25)
+
+    # Expressões muito aninhadas, dentro do tamanho máximo, recebem 400
+    # em vez de esgotarem a pilha e resultarem em 500.
+    def test_expressoes_profundas(self):
+
+        for expressao in (
+            "-" * (TAMANHO_MAXIMO_EXPRESSAO - 1) + "1",
+            "+" * (TAMANHO_MAXIMO_EXPRESSAO - 1) + "1",
+            "-+" * (TAMANHO_MAXIMO_EXPRESSAO // 2 - 1) + "a",
+            "+".join(["1"] * (TAMANHO_MAXIMO_EXPRESSAO // 2)),
+            "(" * 300 + "1" + ")" * 300,
+        ):
+            with self.subTest(expressao=expressao[:20]):
+                resposta = self.calcular(expressao, a=1)
+                self.assertEqual(resposta.status_code, 400)
+
+    # Aninhamentos até o limite continuam sendo aceitos.
+    def test_profundidade_no_limite(self):
+
+        resposta = self.calcular("-" * PROFUNDIDADE_MAXIMA_EXPRESSAO + "1")
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()["resultado"], 1.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# Testes dos dados do modo planilha (planilha_api_operacoes.py), que
+# não dependem do tkinter nem de um servidor da API.
+#
+# Execução:
+#   python -m unittest test_planilha_api_operacoes
+import math
+import unittest
+
+from planilha_api_operacoes import CALCULADA, COM_ERRO, PENDENTE, DadosPlanilha, ler_linhas_coladas
+
+
+class TestLerLinhasColadas(unittest.TestCase):
+
+    # As colunas podem vir separadas por tabulação, ponto e vírgula ou
+    # vírgula, e o cabeçalho e as linhas em branco são ignorados.
+    def test_separadores_e_cabecalho(self):
+
+        texto = "operacao\tnumero1\tnumero2\nsoma\t1\t2\n\ndivisao;3,5;0\nmodulo, 7 , 3\n"
+        self.assertEqual(list(ler_linhas_coladas(texto)), [
+            ("soma", "1", "2"), ("divisao", "3,5", "0"), ("modulo", "7", "3"),
+        ])
+
+    # O cabeçalho só é reconhecido na primeira linha, e as colunas que
+    # faltam ficam vazias.
+    def test_cabecalho_fora_do_inicio_e_colunas_faltando(self):
+
+        texto = "soma\t1\noperacao\t2\t3"
+        self.assertEqual(list(ler_linhas_coladas(texto)), [("soma", "1", ""), ("operacao", "2", "3")])
+
+
+class TestDadosPlanilha(unittest.TestCase):
+
+    # Os nomes das operações são guardados uma única vez e os números
+    # aceitam a vírgula decimal; números inválidos deixam a linha com erro.
+    def test_adicionar(self):
+
+        dados = DadosPlanilha()
+        dados.adicionar("soma", "1,5", 2)
+        dados.adicionar(" soma ", "x", "3")
+        dados.adicionar("divisao", "4", "2")
+
+        self.assertEqual(len(dados), 3)
+        self.assertEqual(dados.nomes, ["soma", "divisao"])
+        self.assertEqual(dados.linha(0), ("soma", 1.5, 2.0))
+        self.assertTrue(math.isnan(dados.numeros1[1]))
+        self.assertEqual(list(dados.estados), [PENDENTE, COM_ERRO, PENDENTE])
+        self.assertEqual((dados.calculadas, dados.com_erro), (0, 1))
+        self.assertIn("numero1", dados.mensagens[1])
+
+    # Resultados e erros atualizam o estado, os contadores e a descrição
+    # exibida na tabela.
+    def test_registrar(self):
+
+        dados = DadosPlanilha()
+        for numero in range(3):
+            dados.adicionar("divisao", numero, 0)
+        dados.registrar(0, 0.5, None)
+        dados.registrar(1, None, "Divisão por zero não é permitida")
+        dados.registrar(2, None, None)
+
+        self.assertEqual(list(dados.estados), [CALCULADA, COM_ERRO, COM_ERRO])
+        self.assertEqual((dados.calculadas, dados.com_erro), (1, 2))
+        self.assertEqual(dados.resultados[0], 0.5)
+        self.assertEqual(dados.descrever(0), ((1, "divisao", "0.0", "0.0", "0.5"), False))
+        self.assertEqual(dados.descrever(1)[0][4], "Divisão por zero não é permitida")
+        self.assertEqual(dados.mensagens[2], "A API não retornou um resultado")
+
+    # As linhas pendentes são percorridas em blocos, pulando as já
+    # calculadas e as com erro, até o fim da planilha.
+    def test_proximas_pendentes(self):
+
+        dados = DadosPlanilha()
+        for numero in range(10):
+            dados.adicionar("soma", numero, "x" if numero in (2, 3) else 1)
+        dados.registrar(5, 6.0, None)
+
+        self.assertEqual(dados.proximas_pendentes(0, 3), ([0, 1, 4], 5))
+        self.assertEqual(dados.proximas_pendentes(5, 3), ([6, 7, 8], 9))
+        self.assertEqual(dados.proximas_pendentes(9, 3), ([9], 10))
+        self.assertEqual(dados.proximas_pendentes(10, 3), ([], 10))
+        self.assertEqual(DadosPlanilha().proximas_pendentes(0, 3), ([], 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,457 @@
+# Trabalhos assíncronos da API de Operações Matemáticas.
+#
+# Um lote muito grande enviado de uma só vez ocuparia o servidor até o
+# fim do cálculo e estouraria o tempo limite de proxies e clientes. Com
+# os trabalhos, o lote (ou a referência a um conjunto de dados guardado
+# em '/conjuntos') é recebido, o identificador do trabalho é retornado
+# imediatamente e o cálculo é dividido em blocos, executados em um pool
+# de processos com um processo por núcleo. O andamento pode ser
+# consultado ('GET /trabalhos/<id>') ou acompanhado por Server-Sent
+# Events ('GET /trabalhos/<id>/eventos'), e o resultado é obtido em
+# 'GET /trabalhos/<id>/resultado' quando o trabalho termina.
+#
+# Os trabalhos ficam na memória do processo do servidor que os recebeu;
+# com vários processos, as consultas devem chegar ao mesmo processo ou
+# usar trabalhos sobre conjuntos, cujo resultado é um novo conjunto
+# guardado no diretório compartilhado.
+
+# Importa os módulos usados pelos trabalhos: 'asyncio' para acompanhar
+# os blocos sem bloquear o laço de eventos, 'json' para os eventos,
+# 'multiprocessing' e 'ProcessPoolExecutor' para o pool de processos,
+# 'os' para o número de núcleos e os arquivos, 'time' para a retenção
+# dos trabalhos concluídos e 'uuid' para os identificadores.
+import asyncio
+import json
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+
+# Importa o NumPy, usado nos cálculos e para juntar os blocos.
+import numpy as np
+
+# Importa as classes do FastAPI usadas pelas rotas e o modelo do
+# corpo JSON dos trabalhos.
+from fastapi import APIRouter, HTTPException, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+# Importa as funções do registro de conjuntos, que localizam, criam e
+# mapeiam em memória os arquivos dos conjuntos.
+from conjuntos_api_operacoes import (
+    ELEMENTOS_POR_BLOCO, TAMANHO_ELEMENTO, caminho_conjunto, descrever, mapear, novo_conjunto,
+)
+
+# Importa o registro das operações e o cálculo vetorizado, os mesmos
+# usados pelas rotas de lote.
+from registro_api_operacoes import REGISTRO_OPERACOES, calcular_vetorizado, separar_erros
+
+# Importa o tipo de rota que informa as fases de cada requisição no
+# cabeçalho 'Server-Timing'.
+from tempos_api_operacoes import RotaComTempos
+
+# Número de processos do pool, configurável pela variável de ambiente
+# 'API_OPERACOES_PROCESSOS_TRABALHOS'. O padrão é um por núcleo.
+PROCESSOS_TRABALHOS = int(os.environ.get("API_OPERACOES_PROCESSOS_TRABALHOS", "0")) or os.cpu_count() or 1
+
+# Tempo, em segundos, que um trabalho concluído fica disponível para a
+# consulta do resultado antes de ser descartado.
+TEMPO_RETENCAO_TRABALHOS = 3600
+
+# Intervalo, em segundos, entre os comentários enviados pelos eventos
+# quando não há novidades, para que proxies e clientes não encerrem a
+# conexão por inatividade. Deve ser menor que o tempo limite de leitura
+# dos clientes (10 segundos no cliente 'consumindo_api_operacoes').
+INTERVALO_MANTER_CONEXAO = 5
+
+# Estados de um trabalho.
+PENDENTE = "pendente"
+EXECUTANDO = "executando"
+CONCLUIDO = "concluido"
+FALHOU = "falhou"
+CANCELADO = "cancelado"
+
+# Estados finais, nos quais o trabalho não muda mais.
+ESTADOS_FINAIS = frozenset({CONCLUIDO, FALHOU, CANCELADO})
+
+# Pool de processos, criado no primeiro trabalho para que o servidor não
+# inicie processos que talvez nunca sejam usados.
+# O método 'spawn' inicia processos novos em vez de copiar o processo do
+# servidor, que já tem threads em execução (copiá-lo com 'fork' pode
+# deixar travas internas presas nos processos filhos).
+executor = None
+
+# Dicionário com os trabalhos conhecidos, indexados pelo identificador.
+# Assim como as métricas, é alterado apenas pelo laço de eventos.
+trabalhos = {}
+
+
+# Retorna o pool de processos, criando-o se necessário.
+def obter_executor():
+
+    global executor
+    if executor is None:
+        executor = ProcessPoolExecutor(PROCESSOS_TRABALHOS, mp_context=multiprocessing.get_context("spawn"))
+    return executor
+
+
+# Ciclo de vida das rotas de trabalhos: no encerramento do servidor,
+# encerra o pool de processos, descartando os blocos que ainda não
+# começaram e aguardando os que estão em execução. Sem isso, os
+# processos do pool ficariam órfãos quando o servidor termina pelo
+# sinal SIGTERM, que não executa as rotinas de saída do Python.
+@asynccontextmanager
+async def ciclo_de_vida(app):
+
+    yield
+    if executor is not None:
+        await asyncio.to_thread(executor.shutdown, cancel_futures=True)
+
+
+# Cria o roteador das rotas de trabalhos, com o ciclo de vida acima,
+# que a aplicação executa ao incluí-lo.
+rotas_trabalhos = APIRouter(prefix="/trabalhos", route_class=RotaComTempos, lifespan=ciclo_de_vida)
+
+
+# Calcula um bloco de um trabalho com listas de números. Executada nos
+# processos do pool, recebe e retorna arrays NumPy, que são enviados
+# entre os processos de forma compacta.
+def calcular_bloco_numeros(operacoes, numero1, numero2):
+    return calcular_vetorizado(operacoes, numero1, numero2)
+
+
+# Calcula um bloco de um trabalho sobre conjuntos, do elemento 'inicio'
+# até 'fim'. Executada nos processos do pool: cada processo mapeia os
+# arquivos por conta própria e grava os resultados direto no arquivo do
+# conjunto de resultado, de modo que nenhum número passa pelo processo
+# do servidor. Os elementos sem resultado ficam com NaN, como na rota
+# de operações entre conjuntos. Retorna a quantidade de erros do bloco.
+def calcular_bloco_conjuntos(operacao, caminho1, caminho2, escalar, caminho_resultado, tamanho, inicio, fim):
+
+    numero1 = mapear(caminho1, tamanho=tamanho)[inicio:fim]
+    if caminho2 is not None:
+        numero2 = mapear(caminho2, tamanho=tamanho)[inicio:fim]
+    else:
+        numero2 = np.broadcast_to(np.float64(escalar), numero1.shape)
+
+    resultados = mapear(caminho_resultado, "r+", tamanho)
+    destino = resultados[inicio:fim]
+    _, erros = calcular_vetorizado(operacao, numero1, numero2, destino)
+    invalidos = erros != 0
+    destino[invalidos] = np.nan
+    resultados.flush()
+
+    return int(np.count_nonzero(invalidos))
+
+
+# Modelo do corpo JSON da rota que cria um trabalho.
+# O trabalho é um lote, com os mesmos campos da rota '/lote'
+# ('operacao', 'numero1' e 'numero2'), ou uma operação sobre um conjunto
+# ('conjunto'), com o segundo operando em outro conjunto
+# ('segundo_conjunto') ou em um número ('escalar').
+class PedidoTrabalho(BaseModel):
+    operacao: str | list[str]
+    numero1: list[float] | None = None
+    numero2: list[float] | None = None
+    conjunto: str | None = None
+    segundo_conjunto: str | None = None
+    escalar: float | None = None
+
+
+# Define a classe 'Trabalho', que guarda o andamento e o resultado de
+# um trabalho. 'mudanca' é um evento do asyncio substituído a cada
+# alteração, que acorda os clientes acompanhando os eventos.
+class Trabalho:
+
+    def __init__(self, tamanho, blocos):
+
+        self.id = uuid.uuid4().hex
+        self.estado = PENDENTE
+        self.tamanho = tamanho
+        self.blocos = blocos
+        self.blocos_concluidos = 0
+        self.quantidade_erros = 0
+        self.erro = None
+        self.resultado = None
+        self.concluido_em = None
+        self.tarefa = None
+        self.mudanca = asyncio.Event()
+
+    # Registra uma alteração e acorda quem aguarda por ela.
+    def notificar(self):
+
+        if self.estado in ESTADOS_FINAIS and self.concluido_em is None:
+            self.concluido_em = time.monotonic()
+        self.mudanca.set()
+        self.mudanca = asyncio.Event()
+
+    # Descreve o andamento do trabalho.
+    def descrever(self):
+
+        descricao = {
+            "id": self.id,
+            "estado": self.estado,
+            "tamanho": self.tamanho,
+            "blocos": self.blocos,
+            "blocos_concluidos": self.blocos_concluidos,
+            "progresso": self.blocos_concluidos / self.blocos if self.blocos else 1.0,
+        }
+        if self.erro is not None:
+            descricao["erro"] = self.erro
+        return descricao
+
+
+# Descarta os trabalhos concluídos há mais tempo que a retenção. Os
+# conjuntos de resultado não são apagados, pois pertencem ao registro
+# de conjuntos.
+def descartar_antigos():
+
+    limite = time.monotonic() - TEMPO_RETENCAO_TRABALHOS
+    for id_trabalho in [t.id for t in trabalhos.values() if t.concluido_em is not None and t.concluido_em < limite]:
+        del trabalhos[id_trabalho]
+
+
+# Retorna um trabalho, levantando 404 se ele não existir.
+def obter_trabalho(id_trabalho):
+
+    trabalho = trabalhos.get(id_trabalho)
+    if trabalho is None:
+        raise HTTPException(status_code=404, detail=f"Trabalho não encontrado: {id_trabalho}")
+    return trabalho
+
+
+# Executa os blocos de um trabalho no pool de processos e atualiza o
+# andamento à medida que cada bloco termina, em qualquer ordem.
+# 'tarefas' é a lista de (inicio, fim, função, argumentos) dos blocos e
+# 'concluir_bloco' recebe o início, o fim e o retorno de cada bloco.
+async def executar(trabalho, tarefas, concluir_bloco):
+
+    laco = asyncio.get_running_loop()
+    pool = obter_executor()
+
+    async def executar_bloco(inicio, fim, funcao, argumentos):
+        return inicio, fim, await laco.run_in_executor(pool, funcao, *argumentos)
+
+    trabalho.estado = EXECUTANDO
+    trabalho.notificar()
+
+    pendentes = [asyncio.ensure_future(executar_bloco(*tarefa)) for tarefa in tarefas]
+    try:
+        for proximo in asyncio.as_completed(pendentes):
+            inicio, fim, retorno = await proximo
+            concluir_bloco(inicio, fim, retorno)
+            trabalho.blocos_concluidos += 1
+            trabalho.notificar()
+    except BaseException:
+        # Cancela os blocos que ainda não começaram; os que já estão em
+        # um processo terminam, mas seu resultado é ignorado.
+        for pendente in pendentes:
+            pendente.cancel()
+        raise
+
+
+# Executa um trabalho com listas de números, juntando os blocos nos
+# arrays de resultados e de códigos de erro.
+async def executar_numeros(trabalho, operacoes, numero1, numero2):
+
+    resultados = np.empty_like(numero1)
+    erros = np.zeros(numero1.shape, dtype=np.uint8)
+
+    def concluir_bloco(inicio, fim, retorno):
+        resultados[inicio:fim], erros[inicio:fim] = retorno
+        trabalho.quantidade_erros += int(np.count_nonzero(retorno[1]))
+
+    # Em um lote misto, cada bloco recebe apenas as suas operações.
+    tarefas = []
+    for inicio in range(0, len(numero1), ELEMENTOS_POR_BLOCO):
+        fim = inicio + ELEMENTOS_POR_BLOCO
+        operacoes_bloco = operacoes[inicio:fim] if isinstance(operacoes, np.ndarray) else operacoes
+        tarefas.append((inicio, fim, calcular_bloco_numeros, (operacoes_bloco, numero1[inicio:fim], numero2[inicio:fim])))
+
+    await executar(trabalho, tarefas, concluir_bloco)
+    trabalho.resultado = (resultados, erros)
+
+
+# Executa um trabalho sobre conjuntos. O conjunto de resultado é criado
+# com o tamanho final antes dos blocos, que o preenchem diretamente, e
+# só recebe o nome definitivo quando todos terminam.
+async def executar_conjuntos(trabalho, operacao, caminho1, caminho2, escalar):
+
+    id_resultado, temporario = novo_conjunto()
+    try:
+        with open(temporario, "wb") as arquivo:
+            arquivo.truncate(trabalho.tamanho * TAMANHO_ELEMENTO)
+
+        def concluir_bloco(inicio, fim, quantidade_erros):
+            trabalho.quantidade_erros += quantidade_erros
+
+        tarefas = [
+            (inicio, inicio + ELEMENTOS_POR_BLOCO, calcular_bloco_conjuntos,
+             (operacao, caminho1, caminho2, escalar, temporario, trabalho.tamanho, inicio, inicio + ELEMENTOS_POR_BLOCO))
+            for inicio in range(0, trabalho.tamanho, ELEMENTOS_POR_BLOCO)
+        ]
+        await executar(trabalho, tarefas, concluir_bloco)
+    except BaseException:
+        os.remove(temporario)
+        raise
+
+    caminho = temporario.removesuffix(".parcial")
+    os.replace(temporario, caminho)
+    trabalho.resultado = descrever(id_resultado, caminho)
+
+
+# Acompanha a execução de um trabalho, registrando o estado final.
+async def acompanhar(trabalho, execucao):
+
+    try:
+        await execucao
+        trabalho.estado = CONCLUIDO
+    except asyncio.CancelledError:
+        trabalho.estado = CANCELADO
+    except Exception as erro:
+        trabalho.estado = FALHOU
+        trabalho.erro = f"{type(erro).__name__}: {erro}"
+    trabalho.notificar()
+
+
+# Cria o trabalho, guarda-o e inicia a sua execução em segundo plano.
+def iniciar(tamanho, execucao):
+
+    descartar_antigos()
+    trabalho = Trabalho(tamanho, -(-tamanho // ELEMENTOS_POR_BLOCO))
+    trabalhos[trabalho.id] = trabalho
+    trabalho.tarefa = asyncio.ensure_future(acompanhar(trabalho, execucao(trabalho)))
+    return trabalho
+
+
+# O decorador '@rotas_trabalhos.post("")' cria a rota que recebe um
+# trabalho. Os operandos são validados antes da resposta, para que os
+# erros do pedido (ex: operação desconhecida) sejam informados logo, e
+# a resposta 202 (Accepted) traz o identificador do trabalho e, no
+# cabeçalho 'Location', o endereço onde acompanhá-lo. A rota é
+# assíncrona porque o trabalho é agendado no loop de eventos; a
+# conversão das listas, demorada em lotes grandes, é feita no pool de
+# threads.
+@rotas_trabalhos.post("", status_code=202)
+async def criar_trabalho(pedido: PedidoTrabalho, response: Response):
+
+    nomes = set(pedido.operacao) if isinstance(pedido.operacao, list) else {pedido.operacao}
+    desconhecidas = nomes - REGISTRO_OPERACOES.keys()
+    if desconhecidas:
+        raise HTTPException(status_code=400, detail=f"Operação desconhecida: {', '.join(sorted(desconhecidas))}")
+
+    # Trabalho sobre conjuntos: a operação é a mesma para todos os
+    # elementos e os números são lidos dos arquivos pelos processos.
+    if pedido.conjunto is not None:
+        if isinstance(pedido.operacao, list):
+            raise HTTPException(status_code=400, detail="Trabalhos sobre conjuntos aceitam uma única operação")
+        if (pedido.segundo_conjunto is None) == (pedido.escalar is None):
+            raise HTTPException(status_code=400, detail="Informe exatamente um entre 'segundo_conjunto' e 'escalar'")
+
+        caminho1 = caminho_conjunto(pedido.conjunto)
+        tamanho = descrever(pedido.conjunto, caminho1)["tamanho"]
+        caminho2 = None
+        if pedido.segundo_conjunto is not None:
+            caminho2 = caminho_conjunto(pedido.segundo_conjunto)
+            if descrever(pedido.segundo_conjunto, caminho2)["tamanho"] != tamanho:
+                raise HTTPException(status_code=400, detail="Os conjuntos devem ter o mesmo tamanho")
+
+        trabalho = iniciar(tamanho, lambda trabalho: executar_conjuntos(
+            trabalho, pedido.operacao, caminho1, caminho2, pedido.escalar,
+        ))
+
+    # Trabalho com listas de números, validadas como na rota '/lote'.
+    else:
+        if pedido.numero1 is None or pedido.numero2 is None:
+            raise HTTPException(status_code=400, detail="Informe 'numero1' e 'numero2' ou um 'conjunto'")
+        if len(pedido.numero1) != len(pedido.numero2):
+            raise HTTPException(status_code=400, detail="As listas 'numero1' e 'numero2' devem ter o mesmo tamanho")
+
+        if isinstance(pedido.operacao, list) and len(pedido.operacao) != len(pedido.numero1):
+            raise HTTPException(status_code=400, detail="A lista 'operacao' deve ter o mesmo tamanho das listas de números")
+
+        def converter():
+            operacoes = np.asarray(pedido.operacao) if isinstance(pedido.operacao, list) else pedido.operacao
+            return operacoes, np.asarray(pedido.numero1, dtype=np.float64), np.asarray(pedido.numero2, dtype=np.float64)
+
+        operacoes, numero1, numero2 = await run_in_threadpool(converter)
+        trabalho = iniciar(len(numero1), lambda trabalho: executar_numeros(trabalho, operacoes, numero1, numero2))
+
+    response.headers["Location"] = f"{rotas_trabalhos.prefix}/{trabalho.id}"
+    return trabalho.descrever()
+
+
+# Descreve o andamento de um trabalho.
+@rotas_trabalhos.get("/{id_trabalho}")
+async def obter_andamento(id_trabalho: str):
+    return obter_trabalho(id_trabalho).descrever()
+
+
+# Acompanha um trabalho por Server-Sent Events: um evento 'progresso'
+# a cada bloco concluído e um evento 'fim' com o estado final, depois
+# do qual a conexão é encerrada. O primeiro evento traz o estado atual,
+# de modo que quem se conecta depois do início não perde nada.
+@rotas_trabalhos.get("/{id_trabalho}/eventos")
+async def acompanhar_eventos(id_trabalho: str):
+
+    trabalho = obter_trabalho(id_trabalho)
+
+    async def gerar_eventos():
+
+        while True:
+            # Guarda o evento da próxima alteração antes de descrever o
+            # trabalho, para não perder uma alteração feita entre os dois.
+            mudanca = trabalho.mudanca
+            final = trabalho.estado in ESTADOS_FINAIS
+            dados = json.dumps(trabalho.descrever(), ensure_ascii=False, separators=(",", ":"))
+            yield f"event: {'fim' if final else 'progresso'}\ndata: {dados}\n\n"
+            if final:
+                return
+
+            # Sem alterações por algum tempo, envia um comentário (linha
+            # iniciada por ':'), ignorado pelos clientes.
+            while not mudanca.is_set():
+                try:
+                    await asyncio.wait_for(mudanca.wait(), INTERVALO_MANTER_CONEXAO)
+                except asyncio.TimeoutError:
+                    yield ": aguardando\n\n"
+
+    return StreamingResponse(gerar_eventos(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
+
+
+# Retorna o resultado de um trabalho concluído. Em um lote, o formato é
+# o mesmo da rota '/lote'; sobre conjuntos, é a descrição do conjunto de
+# resultado, cujos números são obtidos em '/conjuntos/<id>/dados'.
+# Um trabalho ainda em execução, com falha ou cancelado retorna 409.
+@rotas_trabalhos.get("/{id_trabalho}/resultado")
+def obter_resultado(id_trabalho: str):
+
+    trabalho = obter_trabalho(id_trabalho)
+    if trabalho.estado != CONCLUIDO:
+        raise HTTPException(status_code=409, detail=f"Trabalho não concluído: {trabalho.estado}")
+
+    if isinstance(trabalho.resultado, dict):
+        return {"conjunto": trabalho.resultado, "quantidade_erros": trabalho.quantidade_erros}
+
+    lista_resultados, lista_erros = separar_erros(*trabalho.resultado)
+    return {"resultados": lista_resultados, "erros": lista_erros}
+
+
+# Cancela um trabalho em andamento ou descarta um trabalho concluído.
+# Enquanto o cancelamento é aguardado, outro DELETE ou a limpeza dos
+# trabalhos antigos pode já ter removido o trabalho do registro.
+@rotas_trabalhos.delete("/{id_trabalho}", status_code=204)
+async def cancelar_trabalho(id_trabalho: str):
+
+    trabalho = obter_trabalho(id_trabalho)
+    if trabalho.estado not in ESTADOS_FINAIS:
+        trabalho.tarefa.cancel()
+        try:
+            await trabalho.tarefa
+        except asyncio.CancelledError:
+            pass
+    trabalhos.pop(id_trabalho, None)
+    return Response(status_code=204)